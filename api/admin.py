@@ -1,9 +1,23 @@
 from django.contrib import admin
+from django.db.models import Q
 from .models import Transmission
+from . import search
+from .pagination import EstimatedCountPaginator
 
 @admin.register(Transmission)
 class TransmissionAdmin(admin.ModelAdmin):
-    list_display = ('id','timestamp','role','device','status','msg_id')
+    list_display = ('id','timestamp','role','device','target','priority','status','msg_id')
     list_filter = ('role','status')
-    search_fields = ('message','device')
+    search_fields = ('body__text','device')
     ordering = ('-timestamp',)
+    # no COUNT(*) over the whole table on every changelist page
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # message text goes through the full-text index instead of LIKE '%...%'
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        match = search.message_filter(Transmission, search_term) | Q(device__icontains=search_term)
+        return queryset.filter(match), False
@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+class ApiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'api'
+
+    def ready(self):
+        post_migrate.connect(_install_search, sender=self)
+
+
+def _install_search(sender, using='default', **kwargs):
+    from . import search, tables
+    tables.forget()
+    search.install(using=using)
@@ -0,0 +1,74 @@
+"""
+Async versions of the ESP32-facing endpoints, for the ASGI profile
+(telecom_backend.settings_asgi / urls_asgi).
+
+Same URLs, payloads and queue semantics as tx_pending and rx_message in
+api.views. The poll is written against the async ORM, so a slow device
+connection waits on the event loop instead of holding a worker thread; the
+RX report hands its one short transaction to the thread pool. Plain Django
+views: DRF's APIView has no async dispatch.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from .models import Transmission
+from . import changelog, views
+from .views import _queue, _poll_queues, _claim_fields, _pending_payload
+
+
+def json_body(request):
+    """Request JSON as a dict (form posts are accepted too); None if unparseable."""
+    if request.content_type != 'application/json':
+        return request.POST.dict()
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+@require_GET
+async def tx_pending(request):
+    """GET /api/tx/pending/?gateway=GW01&groups=north,coast (see api.views.tx_pending)."""
+    queues = _poll_queues(request.GET)
+    for _ in range(3):
+        now = timezone.now()
+        heads = [p for p in [await _queue(t, now).afirst() for t in queues] if p is not None]
+        if not heads:
+            return JsonResponse({'status': 'no_messages', 'message': None})
+        pending = min(heads, key=lambda p: (-p.priority, p.timestamp))
+        if await claim(pending, now):
+            return JsonResponse(_pending_payload(pending))
+    return JsonResponse({'status': 'no_messages', 'message': None})
+
+
+async def claim(pending, now):
+    """Take a PENDING message as INFLIGHT; False if another poller got it first."""
+    return bool(await changelog.aupdate(Transmission.objects.filter(pk=pending.pk, status='PENDING'),
+                                        **_claim_fields(now)))
+
+
+@csrf_exempt
+@require_POST
+async def rx_message(request):
+    """POST /api/rx/: log the RX and acknowledge its TX (see api.views.rx_message)."""
+    data = json_body(request)
+    if data is None:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    body, status, replayed = await record_rx(request, data)
+    return JsonResponse(body, status=status, headers={'Idempotent-Replayed': 'true'} if replayed else None)
+
+
+async def record_rx(request, data):
+    """
+    Store an RX report and mark its TX as SENT (api.views.record_rx, run in
+    the thread pool: the RX insert and the ack share one transaction, which
+    the async ORM cannot open). Returns (body, status, replayed); shared with
+    the WebSocket gateway (telecom_backend.gateway).
+    """
+    return await sync_to_async(views.record_rx)(request, data)
@@ -0,0 +1,153 @@
+"""
+Timings for the dashboard's analytics endpoints (manage.py benchmark_analytics).
+
+Each case resolves its URL through ROOT_URLCONF and calls the view directly
+with a RequestFactory request, so middleware and the network stay out of the
+numbers. Reported per case: median and p95 wall time over `repeat` runs
+(after one warm-up run), the number of SQL queries, and the database's plan
+for each distinct query, so runs against api.dataset data can be diffed
+before and after a change.
+
+`run_devices()` (manage.py benchmark_devices) instead times each device
+call through the full handler with the test Client: the DRF endpoint under
+/api/ against its lean twin under the device prefix (api.device_views).
+Middleware is part of what is measured there; the rate limits are not.
+"""
+import statistics
+import time
+from urllib.parse import urlencode
+
+from django.db import connections, router
+from unittest import mock
+
+from django.test.client import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponseNotFound
+from django.urls import Resolver404, resolve
+
+from . import ratelimit
+from .models import Transmission
+
+
+def cases(device):
+    return [
+        ("stats", "/api/stats/", {}),
+        ("stats_exact", "/api/stats/", {"exact": "1"}),
+        ("messages", "/api/messages/", {"limit": "50"}),
+        ("messages_search", "/api/messages/", {"q": "flood", "limit": "50"}),
+        ("metrics_device_24h", "/api/repeater/metrics/", {"device": device, "period": "24h"}),
+        ("metrics_device_30d", "/api/repeater/metrics/", {"device": device, "period": "30d"}),
+        ("metrics_fleet_24h", "/api/repeater/metrics/", {"devices": "all", "period": "24h"}),
+        ("history", "/api/repeater/history/", {"device": device}),
+        ("history_exact", "/api/repeater/history/", {"device": device, "exact": "1"}),
+    ]
+
+
+def _explain(connection, sql, params):
+    prefix = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return [" ".join(str(c) for c in row) for row in cursor.fetchall()]
+    except Exception as exc:  # e.g. a statement the backend cannot explain
+        return [f"unavailable: {exc}"]
+
+
+def _call(factory, path, params):
+    try:
+        match = resolve(path)
+    except Resolver404:  # e.g. the repeater cases without the repeaters app
+        return HttpResponseNotFound()
+    response = match.func(factory.get(path, params), *match.args, **match.kwargs)
+    if hasattr(response, "render"):
+        response.render()
+    return response
+
+
+def run(repeat=5, device="SIM0001", only=None, explain=True):
+    """Benchmark every case (or those named in `only`); returns a JSON-able dict."""
+    factory = RequestFactory()
+    connection = connections[router.db_for_read(Transmission)]
+    results = {}
+    for name, path, params in cases(device):
+        if only and name not in only:
+            continue
+        label = f"{path}?{urlencode(params)}" if params else path
+        response = _call(factory, path, params)  # warm-up
+        if response.status_code == 404:
+            results[name] = {"request": label, "status": 404}
+            continue
+
+        with CaptureQueriesContext(connection) as captured:
+            _call(factory, path, params)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            _call(factory, path, params)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+
+        result = {
+            "request": label,
+            "status": response.status_code,
+            "median_ms": round(statistics.median(timings), 2),
+            "p95_ms": round(timings[min(len(timings) - 1, int(0.95 * len(timings)))], 2),
+            "queries": len(captured.captured_queries),
+        }
+        if explain:
+            plans = {}
+            for query in captured.captured_queries:
+                # the logged SQL has its parameters inlined, so it is explained as is
+                sql = query["sql"]
+                if sql not in plans and sql.lstrip().upper().startswith("SELECT"):
+                    plans[sql] = _explain(connection, sql, None)
+            result["plans"] = [{"sql": sql, "plan": plan} for sql, plan in plans.items()]
+        results[name] = result
+    return {"vendor": connection.vendor, "repeat": repeat, "device": device, "cases": results}
+
+
+def device_cases(device):
+    activity = {"device": device, "msg_id": 1, "message": "benchmark", "action": "received", "voltage": "12.10",
+                "signal_strength": 70, "tx_power": 80, "stats": {"rx_total": 1, "tx_total": 1, "failed": 0}}
+    return [
+        ("tx_pending", "get", "tx/pending/", {"gateway": "BENCH-IDLE"}),
+        ("rx", "post", "rx/", {"device": "RXBENCH", "message": "benchmark", "msg_id": 0}),
+        ("repeater_activity", "post", "repeater/activity/", activity),
+    ]
+
+
+def _timed(client, method, path, body, repeat):
+    call = (lambda: client.get(path, body)) if method == "get" else \
+        (lambda: client.post(path, body, content_type="application/json"))
+    response = call()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "status": response.status_code,
+        "median_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(0.95 * len(timings)))], 3),
+    }
+
+
+def run_devices(repeat=200, device="SIM0001", only=None):
+    """Time each device endpoint, DRF vs lean; returns a JSON-able dict. Writes rows (RX, activity)."""
+    from telecom_backend import devices
+
+    client = Client()
+    results = {}
+    with mock.patch.dict(ratelimit.LIMITS, {"device": None, "global": None}):
+        for name, method, path, body in device_cases(device):
+            if only and name not in only:
+                continue
+            drf = _timed(client, method, "/api/" + path, body, repeat)
+            lean = _timed(client, method, devices.PREFIX + path, body, repeat)
+            results[name] = {
+                "drf": drf,
+                "lean": lean,
+                "speedup": round(drf["median_ms"] / lean["median_ms"], 2) if lean["median_ms"] else None,
+            }
+    return {"repeat": repeat, "device": device, "cases": results}
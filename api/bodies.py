@@ -0,0 +1,158 @@
+"""
+Content-addressed message bodies.
+
+An RF message used to be stored as full text on every row that mentions it:
+the TX Transmission, the RX that acknowledged it, and each repeater event.
+Rows now point at one MessageBody per distinct text, keyed by a 128-bit
+BLAKE2b digest, so the text (and the full-text index, see api.search) is kept
+once. The repeaters app keeps its bodies in its own table
+(repeaters.models.MessageBody) through the same functions: the body model is
+the one the row's `body` foreign key points at.
+
+Lookups are cached per process ((body model, digest) -> body id), so a hot
+text costs no query; a new text costs one SELECT and one INSERT. The INSERT ignores
+conflicts, so concurrent writers of the same text end up on the same row.
+Ids are cached only once their transaction commits. Bodies are never
+deleted; rows reference them with PROTECT.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.db import connections, router, transaction
+
+from . import search
+from .models import MessageBody
+
+CACHE_SIZE = 10000  # digests remembered per process
+BATCH = 500  # digests per IN (...) lookup
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def digest(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def body_model(model):
+    """The MessageBody model rows of `model` point at."""
+    return model._meta.get_field("body").related_model
+
+
+def _remember(label, found):
+    with _lock:
+        for key, pk in found.items():
+            _cache[label, key] = pk
+            _cache.move_to_end((label, key))
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def forget():
+    """Drop the cached ids (after the bodies table was emptied, e.g. between tests)."""
+    with _lock:
+        _cache.clear()
+
+
+def intern_many(texts, using=None, model=MessageBody):
+    """{text: body id} for `texts` in body table `model`, creating the bodies that do not exist yet."""
+    using = using or router.db_for_write(model)
+    label = model._meta.label
+    wanted = {digest(t): t for t in set(texts)}
+    with _lock:
+        found = {key: _cache[label, key] for key in wanted if (label, key) in _cache}
+    missing = [key for key in wanted if key not in found]
+    if missing:
+        fetched = {}
+        for _ in range(2):
+            for i in range(0, len(missing), BATCH):
+                fetched.update(model.objects.using(using)
+                               .filter(hash__in=missing[i:i + BATCH]).values_list("hash", "id"))
+            missing = [key for key in missing if key not in fetched]
+            if not missing:
+                break
+            model.objects.using(using).bulk_create(
+                [model(hash=key, text=wanted[key]) for key in missing], ignore_conflicts=True)
+        found.update(fetched)
+        transaction.on_commit(lambda: _remember(label, fetched), using=using)
+    return {text: found[key] for key, text in wanted.items()}
+
+
+def intern(text, using=None, model=MessageBody):
+    """Body id for `text`."""
+    return intern_many([text], using, model)[text]
+
+
+def attach(objs, using=None):
+    """Point unsaved rows at the bodies for their `message` (set via the property)."""
+    pending = [obj for obj in objs if obj.__dict__.get("_message") is not None or obj.body_id is None]
+    if not pending:
+        return
+    model = body_model(type(pending[0]))
+    ids = intern_many([obj.__dict__.get("_message") or "" for obj in pending],
+                      using or router.db_for_write(type(pending[0])), model)
+    for obj in pending:
+        text = obj.__dict__.pop("_message", None) or ""
+        obj.body = model(id=ids[text], hash=digest(text), text=text)
+
+
+def convert(model, batch_size=BATCH * 4, using=None):
+    """
+    Move a table created before message bodies (one with a `message` column)
+    onto them: add body_id, fill it in batches, then drop `message` and its
+    old per-table full-text index. Safe to rerun after an interruption.
+    Returns the rows filled, or None if the table has no `message` column.
+
+    For the repeaters app, which ships no migrations (and whose shard tables
+    are outside them anyway): manage.py migrate_message_bodies. On SQLite
+    body_id stays nullable at the database level (it cannot be altered in place).
+    """
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    bodies = body_model(model)
+    table, body_table = model._meta.db_table, bodies._meta.db_table
+    with connection.cursor() as cursor:
+        columns = {c.name for c in connection.introspection.get_table_description(cursor, table)}
+    if "message" not in columns:
+        return None
+    if body_table not in connection.introspection.table_names():
+        with connection.schema_editor() as editor:
+            editor.create_model(bodies)
+        search.install(bodies, using=using)
+
+    if "body_id" not in columns:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                fts = f"{table}_fts"
+                for suffix in ("_ai", "_ad", "_au"):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {qn(fts + suffix)}")
+                cursor.execute(f"DROP TABLE IF EXISTS {qn(fts)}")
+            cursor.execute(f"ALTER TABLE {qn(table)} ADD COLUMN body_id bigint NULL REFERENCES {qn(body_table)} (id)")
+            cursor.execute(f"CREATE INDEX {qn(table + '_body_id')} ON {qn(table)} (body_id)")
+
+    filled, last = 0, 0
+    while True:
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT id, message FROM {qn(table)} WHERE body_id IS NULL AND id > %s "
+                               f"ORDER BY id LIMIT %s", [last, batch_size])
+                rows = cursor.fetchall()
+            if not rows:
+                break
+            ids = intern_many([text or "" for _, text in rows], using, bodies)
+            by_body = {}
+            for pk, text in rows:
+                by_body.setdefault(ids[text or ""], []).append(pk)
+            for body_id, pks in by_body.items():
+                model._base_manager.using(using).filter(pk__in=pks).update(body=body_id)
+        filled += len(rows)
+        last = rows[-1][0]
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(f"DROP INDEX IF EXISTS {qn(table + '_message_fts')}")
+            cursor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN body_id SET NOT NULL")
+        cursor.execute(f"ALTER TABLE {qn(table)} DROP COLUMN message")
+    return filled
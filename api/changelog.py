@@ -0,0 +1,171 @@
+"""
+Append-only change log (change data capture) for Transmission and
+RepeaterActivity (api's, and the repeaters app's across its shards).
+
+Consumers (alerts, exports, analytics) read ChangeEvent rows in offset order
+from a saved offset instead of re-polling the primary tables by timestamp:
+
+- an insert logs one "insert" event with a snapshot of the new row;
+- a status transition (claim, ack, sweeper retry/fail) logs one "status"
+  event per row with the new status.
+
+Events are inserted in the writing transaction, so they commit or roll back
+with the rows they describe: nothing is lost between the two, and rolled-back
+work never shows up. Offsets are the ChangeEvent ids; on PostgreSQL the first
+append takes an advisory transaction lock, held to commit, which serialises
+logged transactions from that point, and SQLite has a single writer anyway, so
+offsets become visible in increasing order and a consumer that has seen
+offset N will not later find a smaller one. The commit then wakes consumers
+waiting in this process (`wait`); others poll.
+
+Write paths call `inserted(objs)` after creating rows and `update(qs, ...)`
+in place of qs.update(...). With CHANGE_LOG off (the default), both cost
+nothing beyond the plain write. Bulk loads (manage.py generate_dataset) are
+not logged.
+
+Reading: `read(after, limit)` for one batch, or a named `Consumer` whose
+offset is stored in ConsumerOffset (manage.py tail_changes). GET /api/changes/
+serves the same batches over HTTP. `truncate(before)` drops events every
+consumer is past.
+"""
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .models import ChangeEvent, ConsumerOffset
+
+BATCH_SIZE = 500
+LOCK_KEY = 0x43444331  # pg advisory lock held from the first append to commit
+SNAPSHOT = {
+    "api.transmission": ("role", "device", "target", "priority", "msg_id", "status", "message"),
+    "api.repeateractivity": ("device", "msg_id", "action", "message"),
+    "repeaters.repeateractivity": ("timestamp", "device_id", "msg_id", "action", "message", "voltage",
+                                   "signal_strength", "tx_power", "rx_total", "tx_total", "failed"),
+}
+
+
+def enabled():
+    return getattr(settings, "CHANGE_LOG", False)
+
+
+_committed = threading.Condition()
+
+
+def _notify():
+    with _committed:
+        _committed.notify_all()
+
+
+def wait(timeout):
+    """Block until a logged transaction of this process commits, or `timeout` seconds pass."""
+    with _committed:
+        return _committed.wait(timeout)
+
+
+def emit(source, op, entries, using=None):
+    """Log (row id, status, data) `entries` of `source` in the current transaction."""
+    if not enabled() or not entries:
+        return
+    using = using or router.db_for_write(ChangeEvent)
+    now = timezone.now()
+    connection = connections[using]
+    with transaction.atomic(using=using):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [LOCK_KEY])
+        ChangeEvent.objects.using(using).bulk_create(
+            [ChangeEvent(at=now, source=source, op=op, row_id=pk, status=status, data=data)
+             for pk, status, data in entries])
+    transaction.on_commit(_notify, using=using)
+
+
+def inserted(objs, using=None, source=None):
+    """
+    Log an "insert" for each just-created row in `objs` (all of one model),
+    under `source` if given (e.g. one label for every activity shard).
+    """
+    if not enabled() or not objs:
+        return
+    source = source or objs[0]._meta.label_lower
+    fields = SNAPSHOT.get(source, ())
+    emit(source, "insert", [
+        (obj.pk, getattr(obj, "status", None), {name: getattr(obj, name) for name in fields})
+        for obj in objs
+    ], using)
+
+
+def update(qs, **fields):
+    """
+    qs.update(**fields), logging a "status" event for every row it changes
+    when `fields` sets a status. The matching rows are locked and listed
+    first (one extra SELECT) so each event names its row.
+    """
+    if not enabled() or "status" not in fields:
+        return qs.update(**fields)
+    with transaction.atomic(using=qs.db):
+        ids = list(qs.select_for_update().values_list("pk", flat=True))
+        if not ids:
+            return 0
+        count = qs.filter(pk__in=ids).update(**fields)
+        emit(qs.model._meta.label_lower, "status", [(pk, fields["status"], {}) for pk in ids], qs.db)
+    return count
+
+
+async def aupdate(qs, **fields):
+    if not enabled() or "status" not in fields:
+        return await qs.aupdate(**fields)
+    return await sync_to_async(update)(qs, **fields)
+
+
+def as_dict(event):
+    return {
+        "offset": event.id,
+        "at": event.at.isoformat(),
+        "source": event.source,
+        "op": event.op,
+        "row_id": event.row_id,
+        "status": event.status,
+        "data": event.data,
+    }
+
+
+def read(after=0, limit=BATCH_SIZE, sources=None, using=None):
+    """Up to `limit` events past offset `after`, oldest first."""
+    qs = ChangeEvent.objects.using(using or router.db_for_read(ChangeEvent)).filter(id__gt=after)
+    if sources:
+        qs = qs.filter(source__in=sources)
+    return list(qs.order_by("id")[:limit])
+
+
+class Consumer:
+    """A named reader whose position survives restarts."""
+
+    def __init__(self, name, sources=None, using=None):
+        self.name = name
+        self.sources = sources
+        self.using = using or router.db_for_write(ConsumerOffset)
+        self.offset = (ConsumerOffset.objects.using(self.using)
+                       .filter(name=name).values_list("offset", flat=True).first() or 0)
+
+    def poll(self, limit=BATCH_SIZE):
+        """The next batch after the saved offset (not committed until commit())."""
+        return read(self.offset, limit, self.sources, self.using)
+
+    def commit(self, offset):
+        """Record that everything up to `offset` has been processed."""
+        ConsumerOffset.objects.using(self.using).update_or_create(name=self.name, defaults={"offset": offset})
+        self.offset = offset
+
+
+def truncate(before=None, using=None):
+    """
+    Delete events below offset `before`, or below the slowest consumer's
+    offset when not given. Returns rows deleted.
+    """
+    using = using or router.db_for_write(ChangeEvent)
+    if before is None:
+        before = min(ConsumerOffset.objects.using(using).values_list("offset", flat=True), default=0) + 1
+    return ChangeEvent.objects.using(using).filter(id__lt=before).delete()[0]
@@ -0,0 +1,300 @@
+"""
+Synthetic fleet data for load testing (manage.py generate_dataset).
+
+Generates `days` of traffic one day at a time, so memory stays bounded by a
+day's rows whatever the total, and writes each day with multi-row loads
+(executemany, or COPY on Postgres with psycopg 3) instead of model saves:
+
+- Transmission: TX rows over gateway, group and shared queues with a mix of
+  priorities and outcomes, plus the RX row that acknowledged each SENT one.
+- Message bodies for all of them (api.bodies, into each app's body table),
+  interned a day at a time.
+- Repeater activity: a `received` event per relayed message and, most of the
+  time, its `retransmitted` twin a few hundred ms later, with per-device
+  signal, a daily voltage swing and running rx/tx/failed counters. Rows go to
+  the repeaters app (monthly shards included, see repeaters.shards) when it
+  is installed, else to api.RepeaterActivity if that has a table (it has
+  none under the project's migrations, see api.tables); otherwise no
+  activity is loaded.
+- RepeaterStatus: the final state of each generated device.
+
+Traffic follows a day/night curve, and everything derives from `seed`.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.apps import apps
+from django.core.management.color import no_style
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from . import bodies, search, tables
+from .models import MessageBody, Transmission, RepeaterActivity as FlatActivity
+
+# relative traffic per hour of day (UTC), quiet at night
+HOURLY = np.array([2, 1, 1, 1, 1, 2, 4, 7, 9, 10, 10, 10, 9, 10, 10, 10, 9, 9, 8, 7, 6, 5, 4, 3], dtype=float)
+HOURLY /= HOURLY.sum()
+WORDS = np.array("alert weather river flood clear storm ping routine level normal check relay "
+                 "battery solar north coast valley ridge status warning update schedule".split())
+GROUPS = np.array(["north", "coast", "valley"])
+RETRANSMIT_RATE = 0.92
+DEVICE_PREFIX = "SIM"
+
+TX_COLUMNS = ("id", "device", "role", "body_id", "timestamp", "status", "sent_at", "received_at", "msg_id",
+              "target", "priority", "not_before", "attempts", "ack_deadline", "idempotency_key")
+ACTIVITY_COLUMNS = ("device_id", "msg_id", "body_id", "action", "voltage", "signal_strength", "tx_power",
+                    "rx_total", "tx_total", "failed", "timestamp", "idempotency_key")
+FLAT_COLUMNS = ("device",) + ACTIVITY_COLUMNS[1:]
+
+
+def _times(rng, day_start, n, until):
+    """Up to `n` sorted epoch seconds in the day from `day_start`, shaped by HOURLY and before `until`."""
+    hours = rng.choice(24, size=n, p=HOURLY)
+    ts = np.sort(day_start + hours * 3600.0 + rng.random(n) * 3600.0)
+    return ts[ts < until]
+
+
+def _format_times(seconds, vendor):
+    text = np.datetime_as_string((np.asarray(seconds) * 1e6).astype("datetime64[us]"), unit="us")
+    if vendor == "sqlite":
+        return np.char.replace(text, "T", " ").tolist()  # naive UTC, as Django stores it
+    return np.char.add(text, "+00:00").tolist()
+
+
+def _sentences(rng, n):
+    return [" ".join(row) for row in WORDS[rng.integers(0, len(WORDS), size=(n, 3))].tolist()]
+
+
+def _running(device, increment, carry):
+    """
+    Per-device running totals of `increment` over events in time order,
+    continuing from (and updating) `carry`, indexed by device number.
+    """
+    if not len(device):
+        return np.zeros(0, dtype=np.int64)
+    order = np.argsort(device, kind="stable")
+    dev, inc = device[order], increment[order].astype(np.int64)
+    total = np.cumsum(inc)
+    starts = np.r_[0, np.flatnonzero(np.diff(dev)) + 1]
+    group = np.cumsum(np.r_[0, (np.diff(dev) != 0).astype(np.int64)])
+    within = total - (total[starts] - inc[starts])[group]
+    out = np.empty_like(within)
+    out[order] = within + carry[dev]
+    ends = np.r_[starts[1:] - 1, len(dev) - 1]
+    carry[dev[starts]] += within[ends]
+    return out
+
+
+def _load(model, columns, rows, using):
+    """Multi-row load of `rows` (tuples in `columns` order) into `model`'s table."""
+    if not rows:
+        return
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table, cols = qn(model._meta.db_table), ", ".join(qn(c) for c in columns)
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if connection.vendor == "postgresql" and hasattr(raw, "copy"):
+            with raw.copy(f"COPY {table} ({cols}) FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+        else:
+            cursor.executemany(f"INSERT INTO {table} ({cols}) VALUES ({', '.join(['%s'] * len(columns))})", rows)
+
+
+def _drop_fts_triggers(body_model, using):
+    # SQLite: load bodies without per-row index triggers; search.install() recreates them and rebuilds once
+    connection = connections[using]
+    if connection.vendor == "sqlite":
+        fts = search.fts_table(body_model)
+        with connection.cursor() as cursor:
+            for suffix in ("_ai", "_ad", "_au"):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {connection.ops.quote_name(fts + suffix)}")
+
+
+def _max_id(model, using):
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"SELECT MAX(id) FROM {connections[using].ops.quote_name(model._meta.db_table)}")
+        return cursor.fetchone()[0] or 0
+
+
+class _Fleet:
+    """Per-device traits and running state of the simulated repeaters."""
+
+    def __init__(self, rng, size):
+        self.names = np.array([f"{DEVICE_PREFIX}{i:04d}" for i in range(1, size + 1)])
+        weights = rng.lognormal(0.0, 0.6, size)
+        self.weights = weights / weights.sum()
+        self.voltage = np.where(rng.random(size) < 0.05, rng.uniform(10.9, 11.2, size), rng.uniform(11.4, 12.6, size))
+        self.signal = rng.uniform(30, 95, size)
+        self.tx_power = rng.choice([60, 80, 95], size=size)
+        self.rx = np.zeros(size, dtype=np.int64)
+        self.tx = np.zeros(size, dtype=np.int64)
+        self.failed = np.zeros(size, dtype=np.int64)
+        self.count = np.zeros(size, dtype=np.int64)
+        self.last = {}  # device number -> (seconds, voltage, signal); last event seen
+
+    def day(self, rng, day_start, received, until):
+        """Activity columns for one day, in time order."""
+        ts_r = _times(rng, day_start, received, until)
+        received = len(ts_r)
+        dev_r = rng.choice(len(self.names), size=received, p=self.weights)
+        msg_r = _running(dev_r, np.ones(received), self.rx.copy()) % 256
+        text_r = np.array(_sentences(rng, received), dtype=object)
+        relayed = rng.random(received) < RETRANSMIT_RATE
+
+        ts = np.r_[ts_r, ts_r[relayed] + rng.uniform(0.05, 0.8, relayed.sum())]
+        order = np.argsort(ts, kind="stable")
+        ts = ts[order]
+        dev = np.r_[dev_r, dev_r[relayed]][order]
+        msg = np.r_[msg_r, msg_r[relayed]][order]
+        text = np.r_[text_r, text_r[relayed]][order]
+        is_received = np.r_[np.ones(received, bool), np.zeros(relayed.sum(), bool)][order]
+        dropped = np.r_[~relayed, np.zeros(relayed.sum(), bool)][order]
+
+        hour = (ts % 86400) / 3600.0
+        voltage = np.round(self.voltage[dev] + 0.4 * np.sin(2 * np.pi * (hour - 6) / 24)
+                           + rng.normal(0, 0.05, len(ts)), 2)
+        signal = np.clip(np.round(self.signal[dev] + rng.normal(0, 6, len(ts))), 0, 100).astype(np.int64)
+        cols = {
+            "seconds": ts, "device": dev, "msg_id": msg, "message": text,
+            "action": np.where(is_received, "received", "retransmitted"),
+            "voltage": voltage, "signal_strength": signal, "tx_power": self.tx_power[dev],
+            "rx_total": _running(dev, is_received, self.rx),
+            "tx_total": _running(dev, ~is_received, self.tx),
+            "failed": _running(dev, dropped, self.failed),
+        }
+        np.add.at(self.count, dev, 1)
+        _, last = np.unique(dev[::-1], return_index=True)
+        for i in (len(dev) - 1 - last):
+            self.last[int(dev[i])] = (float(ts[i]), float(voltage[i]), int(signal[i]))
+        return cols
+
+
+def _transmissions(rng, day_start, n, until, gateways, first_id, vendor, pending_ok, using):
+    """TX rows for one day and the RX rows acknowledging the SENT ones."""
+    ts = _times(rng, day_start, n, until)
+    n = len(ts)
+    ids = np.arange(first_id, first_id + n)
+    pick = rng.random(n)
+    names = np.array([f"GW{i:02d}" for i in range(1, gateways + 1)])
+    target = np.where(pick < 0.6, names[rng.integers(0, len(names), n)],
+                      np.where(pick < 0.75, GROUPS[rng.integers(0, len(GROUPS), n)], ""))
+    priority = np.where(rng.random(n) < 0.1, 5, 0)
+    priority[rng.random(n) < 0.02] = 9
+    outcome = rng.random(n)
+    status = np.where((outcome >= 0.98) & pending_ok, "PENDING", np.where(outcome < 0.95, "SENT", "FAILED"))
+    attempts = np.where(status == "SENT", 1 + (rng.random(n) < 0.15) + (rng.random(n) < 0.05),
+                        np.where(status == "FAILED", 5, 0))
+    sent = status == "SENT"
+    sent_s = np.minimum(ts + rng.exponential(20.0, n), until - 2.0)
+
+    stamp, sent_at = _format_times(ts, vendor), _format_times(sent_s, vendor)
+    text = _sentences(rng, n)
+    body_ids = bodies.intern_many(text, using)
+    body = [body_ids[t] for t in text]
+    rows = [
+        (int(ids[i]), "", "TX", body[i], stamp[i], str(status[i]), sent_at[i] if sent[i] else None, None,
+         int(ids[i]), str(target[i]), int(priority[i]), None, int(attempts[i]), None, None)
+        for i in range(n)
+    ]
+    acked = np.flatnonzero(sent)
+    rx_at = _format_times(sent_s[acked] + rng.uniform(0.2, 2.0, len(acked)), vendor)
+    rx_dev = rng.integers(1, 10, len(acked))
+    rows += [
+        (int(first_id + n + j), f"RX{rx_dev[j]:03d}", "RX", body[i], rx_at[j], "RECEIVED", None, rx_at[j],
+         int(ids[i]), "", 0, None, 0, None, None)
+        for j, i in enumerate(acked.tolist())
+    ]
+    return rows
+
+
+def generate(days=30, transmissions=10000, activity=100000, devices=50, gateways=8, seed=1,
+             end=None, progress=None):
+    """
+    Load a synthetic dataset ending at `end` (default now). `transmissions`
+    and `activity` are totals over all days. Returns row counts written.
+    """
+    rng = np.random.default_rng(seed)
+    using = router.db_for_write(Transmission)
+    vendor = connections[using].vendor
+    end = (end or timezone.now()).astimezone(dt_timezone.utc)
+    until = end.timestamp()
+    first_day = datetime(end.year, end.month, end.day, tzinfo=dt_timezone.utc) - timedelta(days=days - 1)
+    with_repeaters = apps.is_installed("repeaters")
+    with_activity = with_repeaters or tables.exists(FlatActivity, using)
+    counts = {"transmissions": 0, "activity": 0, "devices": 0}
+
+    fleet = _Fleet(rng, devices)
+    if with_repeaters:
+        from repeaters import shards
+        from repeaters.models import RepeaterDevice
+        RepeaterDevice.objects.bulk_create(
+            [RepeaterDevice(device=name, friendly_name=f"Simulated {name}") for name in fleet.names.tolist()],
+            ignore_conflicts=True)
+        counts["devices"] = devices
+
+    next_tx = _max_id(Transmission, using) + 1
+    indexes = [MessageBody]
+    if with_repeaters:
+        from repeaters.models import MessageBody as ActivityBody
+        indexes.append(ActivityBody)
+    else:
+        ActivityBody = MessageBody
+    for body_model in indexes:
+        _drop_fts_triggers(body_model, using)
+    received_per_day = max(1, round(activity / (1 + RETRANSMIT_RATE) / days))
+    tx_per_day = max(1, round(transmissions / days))
+    try:
+        for d in range(days):
+            day = first_day + timedelta(days=d)
+            day_start = day.timestamp()
+            with transaction.atomic(using=using):
+                rows = _transmissions(rng, day_start, tx_per_day, until, gateways, next_tx, vendor,
+                                      pending_ok=d == days - 1, using=using)
+                _load(Transmission, TX_COLUMNS, rows, using)
+                next_tx += len(rows)
+                counts["transmissions"] += len(rows)
+
+                cols = fleet.day(rng, day_start, int(rng.poisson(received_per_day)), until)
+                # drawn either way, so the TX rows do not depend on where activity goes
+                if with_activity:
+                    model = shards.for_write(day) if with_repeaters else FlatActivity
+                    stamps = _format_times(cols["seconds"], vendor)
+                    devs = fleet.names[cols["device"]].tolist()
+                    texts = cols["message"].tolist()
+                    body_ids = bodies.intern_many(texts, using, ActivityBody)
+                    columns = [devs, cols["msg_id"].tolist(), [body_ids[t] for t in texts], cols["action"].tolist(),
+                               cols["voltage"].tolist(), cols["signal_strength"].tolist(), cols["tx_power"].tolist(),
+                               cols["rx_total"].tolist(), cols["tx_total"].tolist(), cols["failed"].tolist(), stamps,
+                               [None] * len(stamps)]
+                    _load(model, ACTIVITY_COLUMNS if with_repeaters else FLAT_COLUMNS, list(zip(*columns)), using)
+                    counts["activity"] += len(stamps)
+            if progress:
+                progress(d + 1, days, counts)
+    finally:
+        for body_model in indexes:
+            search.install(body_model, using=using)
+    with connections[using].cursor() as cursor:
+        for sql in connections[using].ops.sequence_reset_sql(no_style(), [Transmission]):
+            cursor.execute(sql)
+    if with_repeaters:
+        _save_status(fleet)
+    return counts
+
+
+def _save_status(fleet):
+    from repeaters.models import RepeaterStatus
+    rows = []
+    for i, (seconds, voltage, signal) in sorted(fleet.last.items()):
+        seen = datetime.fromtimestamp(seconds, tz=dt_timezone.utc)
+        rows.append(RepeaterStatus(
+            device_id=fleet.names[i], last_seen=seen, voltage=round(voltage, 2), signal_strength=signal,
+            tx_power=int(fleet.tx_power[i]), rx_total=int(fleet.rx[i]), tx_total=int(fleet.tx[i]),
+            failed=int(fleet.failed[i]), session_started_at=seen - timedelta(hours=6), uptime_seconds=6 * 3600,
+            voltage_ewma=voltage, voltage_var=0.01, signal_ewma=float(signal), signal_var=36.0,
+            fail_delta_ewma=1 - RETRANSMIT_RATE, fail_delta_var=0.07, health_samples=int(fleet.count[i]),
+            activity_count=int(fleet.count[i]),
+        ))
+    update = [f.name for f in RepeaterStatus._meta.concrete_fields if not f.primary_key and f.name != "created_at"]
+    RepeaterStatus.objects.bulk_create(rows, update_conflicts=True, unique_fields=["device"], update_fields=update)
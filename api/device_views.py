@@ -0,0 +1,84 @@
+"""
+Lean device endpoints: the same work as tx_pending, rx_message and
+repeater_activity in api.views, without DRF.
+
+Device firmware sends and expects plain JSON, so there is nothing for
+content negotiation, parser/renderer selection, the Request wrapper or the
+browsable-API exception handling to do. These views read the body once with
+a fast JSON decoder (orjson when installed, else the json module), call the
+shared helpers in api.views, and write the response bytes directly. They are
+served under DEVICE_URL_PREFIX (telecom_backend.device_urls), where
+telecom_backend.devices.DeviceRouteMiddleware answers them before sessions,
+CSRF, auth and the other browser middleware run.
+"""
+import json
+
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.utils.encoders import JSONEncoder
+
+from .views import claim_next, record_rx, record_repeater_activity
+
+try:
+    import orjson
+except ImportError:  # optional; the json module is used instead
+    orjson = None
+
+_encoder = JSONEncoder()  # DRF's, so dates, decimals etc. come out exactly as from the DRF views
+
+
+def loads(raw):
+    """Parsed JSON object from a request body, or None if it is not one."""
+    try:
+        data = orjson.loads(raw or b"{}") if orjson else json.loads(raw or b"{}")
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def dumps(payload):
+    if orjson:
+        return orjson.dumps(payload, default=_encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(payload, cls=JSONEncoder, separators=(",", ":")).encode()
+
+
+def respond(payload, status=200, replayed=False):
+    response = HttpResponse(dumps(payload), status=status, content_type="application/json")
+    if replayed:
+        response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _not_allowed(method):
+    response = respond({"detail": "Method not allowed"}, 405)
+    response["Allow"] = method
+    return response
+
+
+def tx_pending(request):
+    """GET /device/tx/pending/?gateway=GW01&groups=north (see api.views.tx_pending)."""
+    if request.method != "GET":
+        return _not_allowed("GET")
+    return respond(claim_next(request.GET))
+
+
+@csrf_exempt
+def rx_message(request):
+    """POST /device/rx/ (see api.views.rx_message)."""
+    if request.method != "POST":
+        return _not_allowed("POST")
+    data = loads(request.body)
+    if data is None:
+        return respond({"error": "Invalid JSON"}, 400)
+    return respond(*record_rx(request, data))
+
+
+@csrf_exempt
+def repeater_activity(request):
+    """POST /device/repeater/activity/ (see api.views.repeater_activity)."""
+    if request.method != "POST":
+        return _not_allowed("POST")
+    data = loads(request.body)
+    if data is None:
+        return respond({"error": "Invalid JSON"}, 400)
+    return respond(*record_repeater_activity(request, data))
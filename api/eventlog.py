@@ -0,0 +1,137 @@
+"""
+Structured, non-blocking event logging for the request paths.
+
+Views call `event("rx.received", msg_id=..., device=...)` instead of
+print(). Each event is one record on the "api.events" logger carrying its
+name and fields; JsonFormatter writes it as a single JSON line.
+
+Nothing on a request thread waits for I/O: NonBlockingHandler only puts the
+record on a bounded in-memory queue, and a listener thread (one per process,
+started on first use, so after gunicorn forks) does the formatting and the
+write. When the queue is full the record is dropped and counted
+(`dropped()`), rather than blocking or printing a traceback.
+
+High-volume events can be sampled per name with EVENT_LOG_SAMPLING, e.g.
+{"rx.received": 0.1}; a sampled record carries its `sample_rate` so counts
+can be scaled back up. Events are checked against the logger level before
+anything is built, so a disabled level costs one comparison.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+logger = logging.getLogger("api.events")
+
+# attributes every LogRecord has; anything else was passed in `extra`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def sample_rate(name):
+    return getattr(settings, "EVENT_LOG_SAMPLING", {}).get(name, 1.0)
+
+
+def event(name, level=logging.INFO, **fields):
+    """Log event `name` with `fields`, subject to the level and its sampling rate."""
+    if not logger.isEnabledFor(level):
+        return
+    rate = sample_rate(name)
+    if rate < 1.0:
+        if random.random() >= rate:
+            return
+        fields["sample_rate"] = rate
+    logger.log(level, name, extra={"event": name, **fields})
+
+
+def enabled(level):
+    """True when events at `level` would be logged; guard work done only for a log line."""
+    return logger.isEnabledFor(level)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, event/message and the extra fields."""
+
+    def format(self, record):
+        out = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        if not hasattr(record, "event"):
+            out["message"] = record.getMessage()
+        out.update((k, v) for k, v in vars(record).items() if k not in _RECORD_ATTRS)
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str, ensure_ascii=False)
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # only at shutdown: wait for room rather than fail on a full queue
+        self.queue.put(self._sentinel)
+
+
+class NonBlockingHandler(logging.handlers.QueueHandler):
+    """
+    Queue in front of a stream handler. `stream` is the final destination
+    (stdout by default); `capacity` bounds the records held in memory.
+    """
+
+    def __init__(self, stream=None, capacity=10000, level=logging.NOTSET):
+        super().__init__(queue.Queue(capacity))
+        self.setLevel(level)
+        self.target = logging.StreamHandler(stream or sys.stdout)
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._dropped = 0
+
+    def setFormatter(self, fmt):
+        # formatting happens on the listener thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # the record is formatted later, by the target; keep it as is (no early getMessage/str of args)
+        return record
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():  # first use in this process (a forked worker starts its own)
+                self.queue = queue.Queue(self.queue.maxsize)
+                self._listener = _Listener(self.queue, self.target, respect_handler_level=True)
+                self._listener.start()
+                self._pid = os.getpid()
+                atexit.register(self.flush_and_stop)
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._dropped += 1
+
+    def flush_and_stop(self):
+        """Write out what is queued and stop the listener thread (at exit)."""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+    def close(self):
+        self.flush_and_stop()
+        super().close()
+
+
+def dropped():
+    """Records dropped because a queue was full, over the api.events handlers of this process."""
+    return sum(getattr(h, "_dropped", 0) for h in logger.handlers)
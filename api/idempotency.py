@@ -0,0 +1,34 @@
+import hashlib
+from django.core.cache import cache
+
+# How long a replayable response is kept in the recent-key cache. The cache
+# backend bounds the entry count (LocMemCache MAX_ENTRIES by default).
+REPLAY_TTL = 24 * 3600
+
+
+def idempotency_key(request, device, *parts):
+    """
+    Key for a device POST: the client's Idempotency-Key header scoped to the
+    device, or a hash of (device, *parts) when the last part (the device's own
+    clock/uptime) is present. Returns None when neither is available, in which
+    case the request is processed without duplicate suppression.
+    """
+    header = (request.headers.get('Idempotency-Key') or '').strip()
+    if header:
+        raw = f"{device}|key|{header}"
+    elif parts and parts[-1] not in (None, ''):
+        raw = "|".join(str(p) for p in (device, *parts))
+    else:
+        return None
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def replay(scope, key):
+    """(data, status) of the original response, or None if not seen recently."""
+    return cache.get(f"idem:{scope}:{key}") if key else None
+
+
+def remember(scope, key, data, status):
+    if key:
+        cache.set(f"idem:{scope}:{key}", (data, status), REPLAY_TTL)
+
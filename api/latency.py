@@ -0,0 +1,215 @@
+"""
+End-to-end delivery latency, kept as mergeable quantile sketches.
+
+A delivered TX message has four timestamps: queued (timestamp), pulled by a
+gateway (pulled_at, the last claim), relayed (the first repeater
+"retransmitted" event for its msg_id between pull and ack) and received
+(sent_at, set when an RX confirms it). `rollup()` (manage.py rollup_latency)
+reads newly delivered messages past a high-water mark and adds their hop
+latencies to one Sketch per (hour, device, hop):
+
+- queue:      queued -> pulled           (device = target queue)
+- air:        pulled -> received         (device = target queue)
+- total:      queued -> received         (device = target queue)
+- to_relay:   pulled -> relayed          (device = repeater)
+- from_relay: relayed -> received        (device = repeater)
+
+A Sketch keeps counts in logarithmic bins, so any quantile it reports is
+within ACCURACY (relative) of the true one, and two sketches merge by adding
+counts. `percentiles()` therefore answers any window from the hourly rows
+alone, without reading messages again. Rows acknowledged less than SETTLE
+ago are left for the next pass, so an ack committing late is not skipped.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import tables
+from .models import LatencySketch, RepeaterActivity, RollupMark, Transmission
+
+SOURCE = "delivery_latency"
+HOPS = ("queue", "air", "total", "to_relay", "from_relay")
+ACCURACY = 0.01  # relative error of reported quantiles; existing rows assume it never changes
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+SETTLE = timedelta(seconds=getattr(settings, "LATENCY_SETTLE_SECONDS", 5))
+BATCH_SIZE = 2000
+
+
+class Sketch:
+    """
+    Log-binned quantile sketch (the DDSketch layout): a value v >= 1 ms
+    lands in bin ceil(log_gamma(v)), smaller ones in a zero bin.
+    """
+
+    gamma = (1 + ACCURACY) / (1 - ACCURACY)
+    log_gamma = math.log(gamma)
+
+    def __init__(self, bins=None, count=0, total_ms=0.0):
+        bins = dict(bins or {})
+        self.zero = bins.pop("z", 0)
+        self.bins = {int(i): n for i, n in bins.items()}
+        self.count = count
+        self.total_ms = total_ms
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row.bins, row.count, row.total_ms)
+
+    def to_dict(self):
+        return {"z": self.zero, **{str(i): n for i, n in sorted(self.bins.items())}}
+
+    def add_many(self, values_ms):
+        values = np.clip(np.asarray(values_ms, dtype=np.float64), 0, None)  # clock skew -> 0
+        small = values < 1.0
+        self.zero += int(small.sum())
+        idx, counts = np.unique(np.ceil(np.log(values[~small]) / self.log_gamma).astype(np.int64),
+                                return_counts=True)
+        for i, n in zip(idx.tolist(), counts.tolist()):
+            self.bins[i] = self.bins.get(i, 0) + n
+        self.count += len(values)
+        self.total_ms += float(values.sum())
+        return self
+
+    def merge(self, other):
+        self.zero += other.zero
+        for i, n in other.bins.items():
+            self.bins[i] = self.bins.get(i, 0) + n
+        self.count += other.count
+        self.total_ms += other.total_ms
+        return self
+
+    def quantile(self, q):
+        """Latency in ms at quantile `q` (0..1), or None when empty."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero
+        if rank < seen:
+            return 0.0
+        for i in sorted(self.bins):
+            seen += self.bins[i]
+            if rank < seen:
+                return 2 * self.gamma ** i / (self.gamma + 1)  # bin midpoint
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def summary(self, quantiles=QUANTILES):
+        out = {"count": self.count, "mean_ms": round(self.total_ms / self.count, 1) if self.count else None}
+        for q in quantiles:
+            value = self.quantile(q)
+            out[f"p{q * 100:g}"] = round(value, 1) if value is not None else None
+        return out
+
+
+def _ms(later, earlier):
+    return (later - earlier).total_seconds() * 1000
+
+
+def _hour(t):
+    return t.replace(minute=0, second=0, microsecond=0)
+
+
+def _relay_querysets(start, end):
+    # api.RepeaterActivity has no table under the project's migrations (see api.tables)
+    if tables.exists(RepeaterActivity):
+        yield RepeaterActivity.objects.filter(timestamp__range=(start, end))
+    if apps.is_installed("repeaters"):
+        from repeaters import shards
+        for qs in shards.querysets(start, end):
+            yield qs.filter(timestamp__range=(start, end))
+
+
+def _relays(messages):
+    """{tx id: (relayed at, repeater)} for the first relay of each message between its pull and ack."""
+    by_msg = defaultdict(list)
+    for tx in messages:
+        if tx.msg_id is not None:
+            by_msg[tx.msg_id].append(tx)
+    if not by_msg:
+        return {}
+    start = min(tx.pulled_at or tx.timestamp for tx in messages)
+    end = max(tx.sent_at for tx in messages)
+    found = {}
+    for qs in _relay_querysets(start, end):
+        rows = (qs.filter(action="retransmitted", msg_id__in=list(by_msg))
+                .order_by("timestamp").values_list("msg_id", "timestamp", "device"))
+        for msg_id, at, device in rows:
+            for tx in by_msg[msg_id]:
+                if (tx.pulled_at or tx.timestamp) <= at <= tx.sent_at:
+                    if tx.id not in found or at < found[tx.id][0]:
+                        found[tx.id] = (at, device)
+    return found
+
+
+def hop_latencies(messages):
+    """{(hour, device, hop): [ms, ...]} for delivered TX `messages`."""
+    out = defaultdict(list)
+    relays = _relays(messages)
+    for tx in messages:
+        hour = _hour(tx.sent_at)
+        out[(hour, tx.target, "total")].append(_ms(tx.sent_at, tx.timestamp))
+        if tx.pulled_at:
+            out[(hour, tx.target, "queue")].append(_ms(tx.pulled_at, tx.timestamp))
+            out[(hour, tx.target, "air")].append(_ms(tx.sent_at, tx.pulled_at))
+        relay = relays.get(tx.id)
+        if relay:
+            at, repeater = relay
+            if tx.pulled_at:
+                out[(hour, repeater, "to_relay")].append(_ms(at, tx.pulled_at))
+            out[(hour, repeater, "from_relay")].append(_ms(tx.sent_at, at))
+    return out
+
+
+def _merge_into_rows(latencies):
+    buckets = {key[0] for key in latencies}
+    existing = {(row.bucket, row.device, row.hop): row
+                for row in LatencySketch.objects.filter(bucket__in=buckets, hop__in={key[2] for key in latencies})}
+    rows = []
+    for key, values in latencies.items():
+        sketch = Sketch().add_many(values)
+        if key in existing:
+            sketch.merge(Sketch.from_row(existing[key]))
+        rows.append(LatencySketch(bucket=key[0], device=key[1], hop=key[2], count=sketch.count,
+                                  total_ms=sketch.total_ms, bins=sketch.to_dict()))
+    LatencySketch.objects.bulk_create(rows, update_conflicts=True, unique_fields=["bucket", "device", "hop"],
+                                      update_fields=["count", "total_ms", "bins"])
+
+
+def rollup(now=None, batch_size=BATCH_SIZE):
+    """Add messages acknowledged since the last pass to the sketches. Returns messages read."""
+    cutoff = (now or timezone.now()) - SETTLE
+    mark, _ = RollupMark.objects.get_or_create(name=SOURCE)
+    delivered = Transmission.objects.filter(role="TX", sent_at__isnull=False, sent_at__lte=cutoff)
+    done = 0
+    while True:
+        qs = delivered
+        if mark.high_water:
+            qs = qs.filter(Q(sent_at__gt=mark.high_water) | Q(sent_at=mark.high_water, id__gt=mark.last_id))
+        batch = list(qs.order_by("sent_at", "id")[:batch_size])
+        if not batch:
+            break
+        with transaction.atomic():
+            _merge_into_rows(hop_latencies(batch))
+            mark.high_water, mark.last_id = batch[-1].sent_at, batch[-1].id
+            mark.save(update_fields=["high_water", "last_id"])
+        done += len(batch)
+        if len(batch) < batch_size:
+            break
+    return done
+
+
+def percentiles(start, end, device=None, hops=HOPS, quantiles=QUANTILES):
+    """{hop: {count, mean_ms, p50, ...}} over the hours overlapping `start`..`end`."""
+    rows = LatencySketch.objects.filter(bucket__gte=_hour(start), bucket__lte=end, hop__in=hops)
+    if device is not None:
+        rows = rows.filter(device=device)
+    merged = {hop: Sketch() for hop in hops}
+    for row in rows:
+        merged[row.hop].merge(Sketch.from_row(row))
+    return {hop: sketch.summary(quantiles) for hop, sketch in merged.items()}
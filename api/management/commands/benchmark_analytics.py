@@ -0,0 +1,26 @@
+import json
+from django.core.management.base import BaseCommand
+from api.benchmark import run, cases
+
+class Command(BaseCommand):
+    help = "Time the analytics endpoints (median/p95 ms, query counts, query plans) and print JSON for diffing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case")
+        parser.add_argument("--device", default="SIM0001", help="Device for the single-device cases")
+        parser.add_argument("--case", action="append", dest="only", choices=[c[0] for c in cases("")],
+                            help="Only this case (repeatable)")
+        parser.add_argument("--no-explain", action="store_true", help="Skip query plans")
+        parser.add_argument("--output", help="Write the JSON here instead of stdout")
+
+    def handle(self, *args, **opts):
+        report = run(repeat=opts["repeat"], device=opts["device"], only=opts["only"], explain=not opts["no_explain"])
+        text = json.dumps(report, indent=2, sort_keys=True)
+        if opts["output"]:
+            with open(opts["output"], "w") as fh:
+                fh.write(text + "\n")
+            for name, case in report["cases"].items():
+                self.stdout.write(f"{name}: {case.get('median_ms')} ms median, {case.get('p95_ms')} ms p95, "
+                                  f"{case.get('queries')} queries")
+        else:
+            self.stdout.write(text)
@@ -0,0 +1,19 @@
+import json
+from django.core.management.base import BaseCommand
+from api.benchmark import run_devices, device_cases
+
+class Command(BaseCommand):
+    help = "Time the device endpoints through the full stack, DRF (/api/) against lean (device prefix)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=200, help="Timed requests per endpoint and variant")
+        parser.add_argument("--device", default="SIM0001", help="Repeater device id for the activity posts")
+        parser.add_argument("--case", action="append", dest="only", choices=[c[0] for c in device_cases("")],
+                            help="Only this case (repeatable)")
+
+    def handle(self, *args, **opts):
+        report = run_devices(repeat=opts["repeat"], device=opts["device"], only=opts["only"])
+        for name, case in report["cases"].items():
+            self.stderr.write(f"{name}: drf {case['drf']['median_ms']} ms, lean {case['lean']['median_ms']} ms "
+                              f"median (x{case['speedup']})")
+        self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
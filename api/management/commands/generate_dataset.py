@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from api.dataset import generate
+
+class Command(BaseCommand):
+    help = "Load a synthetic TX/RX and repeater activity dataset for load testing (see api.dataset)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30, help="Days of traffic, ending today")
+        parser.add_argument("--tx", type=int, default=1_000_000, help="TX messages in total (plus an RX row per SENT one)")
+        parser.add_argument("--activity", type=int, default=10_000_000, help="Repeater activity rows in total")
+        parser.add_argument("--devices", type=int, default=200, help="Simulated repeaters")
+        parser.add_argument("--gateways", type=int, default=8, help="Gateway queues TX is spread over")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed; the same seed gives the same data")
+
+    def handle(self, *args, **opts):
+        def progress(day, days, counts):
+            self.stdout.write(f"day {day}/{days}: tx={counts['transmissions']} activity={counts['activity']}")
+
+        counts = generate(days=opts["days"], transmissions=opts["tx"], activity=opts["activity"],
+                          devices=opts["devices"], gateways=opts["gateways"], seed=opts["seed"],
+                          progress=progress if opts["verbosity"] > 1 else None)
+        self.stdout.write(
+            f"transmissions={counts['transmissions']} activity={counts['activity']} devices={counts['devices']}"
+        )
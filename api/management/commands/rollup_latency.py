@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand
+from api.latency import rollup, BATCH_SIZE
+
+class Command(BaseCommand):
+    help = "Add newly delivered TX messages to the hourly latency sketches (run once, or forever with --interval)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=0, help="Seconds between passes; 0 runs a single pass")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Messages read per transaction")
+
+    def handle(self, *args, **opts):
+        interval = opts["interval"]
+        while True:
+            done = rollup(batch_size=opts["batch_size"])
+            if done or not interval:
+                self.stdout.write(f"messages={done}")
+            if not interval:
+                break
+            time.sleep(interval)
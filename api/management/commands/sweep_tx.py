@@ -0,0 +1,24 @@
+
+import time
+from django.core.management.base import BaseCommand
+from api.sweeper import sweep_tx, MAX_ATTEMPTS, PENDING_TTL
+
+class Command(BaseCommand):
+    help = "Retry or fail TX messages whose ACK deadline has passed (run once, or forever with --interval)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=0, help="Seconds between passes; 0 runs a single pass")
+        parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS, help="Attempts before a message is marked FAILED")
+        parser.add_argument("--pending-ttl", type=int, default=PENDING_TTL or 0, help="Fail PENDING messages older than this many seconds (0 = never)")
+
+    def handle(self, *args, **opts):
+        interval = opts["interval"]
+        while True:
+            counts = sweep_tx(max_attempts=opts["max_attempts"], pending_ttl=opts["pending_ttl"])
+            if any(counts.values()) or not interval:
+                self.stdout.write(
+                    f"retried={counts['retried']} failed={counts['failed']} expired={counts['expired']}"
+                )
+            if not interval:
+                break
+            time.sleep(interval)
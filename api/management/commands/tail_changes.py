@@ -0,0 +1,32 @@
+import json
+from django.core.management.base import BaseCommand
+from api import changelog
+
+class Command(BaseCommand):
+    help = "Print the change log as JSON lines from a consumer's saved offset, saving it after each batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--consumer", default="tail", help="Name the offset is saved under")
+        parser.add_argument("--source", action="append", help="Only this model label (repeatable), e.g. api.transmission")
+        parser.add_argument("--batch-size", type=int, default=changelog.BATCH_SIZE, help="Events read per batch")
+        parser.add_argument("--from-offset", type=int, default=None, help="Start after this offset instead of the saved one")
+        parser.add_argument("--follow", action="store_true", help="Keep polling for new events")
+        parser.add_argument("--interval", type=float, default=1.0, help="Most seconds between polls with --follow")
+        parser.add_argument("--truncate", action="store_true", help="Afterwards, delete events every consumer has read")
+
+    def handle(self, *args, **opts):
+        consumer = changelog.Consumer(opts["consumer"], opts["source"])
+        if opts["from_offset"] is not None:
+            consumer.commit(opts["from_offset"])
+        while True:
+            batch = consumer.poll(opts["batch_size"])
+            for event in batch:
+                self.stdout.write(json.dumps(changelog.as_dict(event)))
+            if batch:
+                consumer.commit(batch[-1].id)
+            if len(batch) < opts["batch_size"]:
+                if not opts["follow"]:
+                    break
+                changelog.wait(opts["interval"])
+        if opts["truncate"]:
+            self.stderr.write(f"truncated={changelog.truncate()}")
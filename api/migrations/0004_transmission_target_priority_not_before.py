@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_repeaterdevice_repeaterstatus_repeateractivity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transmission',
+            name='not_before',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transmission',
+            name='priority',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='transmission',
+            name='target',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='transmission',
+            index=models.Index(fields=['target', 'status', '-priority', 'timestamp'], name='idx_tx_queue'),
+        ),
+    ]
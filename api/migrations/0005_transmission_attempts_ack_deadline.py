@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_transmission_target_priority_not_before'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transmission',
+            name='ack_deadline',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transmission',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='transmission',
+            name='status',
+            field=models.CharField(blank=True, choices=[('PENDING', 'Pending'), ('INFLIGHT', 'In flight'), ('SENT', 'Sent'), ('RECEIVED', 'Received'), ('FAILED', 'Failed')], max_length=16, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='transmission',
+            index=models.Index(fields=['status', 'ack_deadline'], name='idx_tx_ack_deadline'),
+        ),
+    ]
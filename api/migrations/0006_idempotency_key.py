@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_transmission_attempts_ack_deadline'),
+    ]
+
+    # api.RepeaterActivity's migration state (0003) is the repeaters app's
+    # repeater_activity table, so only Transmission is altered here
+    operations = [
+        migrations.AddField(
+            model_name='transmission',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
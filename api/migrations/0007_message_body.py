@@ -0,0 +1,92 @@
+import hashlib
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH = 2000
+TABLES = ('api_transmission',)
+
+
+def _digest(text):
+    # same as api.bodies.digest
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def drop_message_fts(apps, schema_editor):
+    # the per-table FTS indexes over `message` give way to one over api_messagebody.text
+    connection = schema_editor.connection
+    qn = connection.ops.quote_name
+    if connection.vendor == 'sqlite':
+        for table in TABLES:
+            fts = f'{table}_fts'
+            for suffix in ('_ai', '_ad', '_au'):
+                schema_editor.execute(f'DROP TRIGGER IF EXISTS {qn(fts + suffix)}')
+            schema_editor.execute(f'DROP TABLE IF EXISTS {qn(fts)}')
+    elif connection.vendor == 'postgresql':
+        for table in TABLES:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {qn(table + "_message_fts")}')
+
+
+def fill_bodies(apps, schema_editor):
+    MessageBody = apps.get_model('api', 'MessageBody')
+    using = schema_editor.connection.alias
+    known = {}
+    Transmission = apps.get_model('api', 'Transmission')
+    last = 0
+    while True:
+        rows = list(Transmission.objects.using(using).filter(pk__gt=last).order_by('pk')
+                    .values_list('pk', 'message')[:BATCH])
+        if not rows:
+            break
+        new = {}
+        for _, text in rows:
+            key = _digest(text or '')
+            if key not in known:
+                new[key] = text or ''
+        if new:
+            MessageBody.objects.using(using).bulk_create(
+                [MessageBody(hash=key, text=text) for key, text in new.items()], ignore_conflicts=True)
+            known.update(MessageBody.objects.using(using).filter(hash__in=list(new)).values_list('hash', 'id'))
+        by_body = {}
+        for pk, text in rows:
+            by_body.setdefault(known[_digest(text or '')], []).append(pk)
+        for body_id, pks in by_body.items():
+            Transmission.objects.using(using).filter(pk__in=pks).update(body_id=body_id)
+        last = rows[-1][0]
+
+
+def fill_messages(apps, schema_editor):
+    using = schema_editor.connection.alias
+    MessageBody = apps.get_model('api', 'MessageBody')
+    Transmission = apps.get_model('api', 'Transmission')
+    for body_id, text in MessageBody.objects.using(using).values_list('id', 'text').iterator():
+        Transmission.objects.using(using).filter(body_id=body_id).update(message=text)
+
+
+class Migration(migrations.Migration):
+    # Transmission only: api.RepeaterActivity's migration state (0003) is the
+    # repeaters app's repeater_activity table, which that app moves onto its
+    # own bodies (manage.py migrate_message_bodies)
+
+    dependencies = [
+        ('api', '0006_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageBody',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hash', models.CharField(max_length=32, unique=True)),
+                ('text', models.TextField()),
+            ],
+        ),
+        migrations.RunPython(drop_message_fts, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='transmission',
+            name='body',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+',
+                                    to='api.messagebody'),
+        ),
+        migrations.RunPython(fill_bodies, fill_messages),
+    ]
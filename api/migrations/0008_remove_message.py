@@ -0,0 +1,24 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # separate from 0007 so the backfill commits before these ALTERs (Postgres
+    # refuses to alter a table with pending deferred-constraint checks)
+
+    dependencies = [
+        ('api', '0007_message_body'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='transmission',
+            name='message',
+        ),
+        migrations.AlterField(
+            model_name='transmission',
+            name='body',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+',
+                                    to='api.messagebody'),
+        ),
+    ]
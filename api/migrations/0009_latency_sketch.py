@@ -0,0 +1,43 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_remove_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transmission',
+            name='pulled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='transmission',
+            index=models.Index(fields=['sent_at'], name='idx_tx_sent_at'),
+        ),
+        migrations.CreateModel(
+            name='LatencySketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('device', models.CharField(blank=True, default='', max_length=64)),
+                ('hop', models.CharField(max_length=16)),
+                ('count', models.IntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('bins', models.JSONField(default=dict)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('bucket', 'device', 'hop'), name='uniq_latency_sketch')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupMark',
+            fields=[
+                ('name', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('high_water', models.DateTimeField(blank=True, null=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 ROLE_CHOICES = (
@@ -8,16 +9,115 @@ ROLE_CHOICES = (
 
 STATUS_CHOICES = (
     ('PENDING', 'Pending'),
+    ('INFLIGHT', 'In flight'),  # pulled by a gateway, waiting for RX ack
     ('SENT', 'Sent'),
     ('RECEIVED', 'Received'),
     ('FAILED', 'Failed'),
 )
 
 
-class Transmission(models.Model):
+class MessageBody(models.Model):
+    """One distinct message text, shared by every row that carries it (see api.bodies)."""
+    hash = models.CharField(max_length=32, unique=True)  # bodies.digest(text)
+    text = models.TextField()
+
+    def __str__(self):
+        return self.text[:50]
+
+
+class BodyQuerySet(models.QuerySet):
+    """
+    Lets callers keep using `message` in filter()/exclude() (keywords and Q
+    objects), values()/values_list(), order_by(), update() and bulk_create();
+    it is mapped onto the shared body row.
+    """
+
+    @staticmethod
+    def _lookup(name):
+        return 'body__text' + name[len('message'):] if name == 'message' or name.startswith('message__') else name
+
+    def _q(self, q):
+        children = [self._q(c) if isinstance(c, models.Q) else
+                    (self._lookup(c[0]), c[1]) if isinstance(c, tuple) else c for c in q.children]
+        return models.Q(*children, _connector=q.connector, _negated=q.negated)
+
+    def _lookups(self, args, kwargs):
+        return ([self._q(a) if isinstance(a, models.Q) else a for a in args],
+                {self._lookup(k): v for k, v in kwargs.items()})
+
+    def filter(self, *args, **kwargs):
+        args, kwargs = self._lookups(args, kwargs)
+        return super().filter(*args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        args, kwargs = self._lookups(args, kwargs)
+        return super().exclude(*args, **kwargs)
+
+    def values(self, *fields, **expressions):
+        if 'message' in fields:
+            fields = [f for f in fields if f != 'message']
+            expressions['message'] = models.F('body__text')
+        return super().values(*fields, **expressions)
+
+    def values_list(self, *fields, **kwargs):
+        return super().values_list(*[self._lookup(f) if isinstance(f, str) else f for f in fields], **kwargs)
+
+    def order_by(self, *fields):
+        return super().order_by(*['-' + self._lookup(f[1:]) if isinstance(f, str) and f.startswith('-') else
+                                  self._lookup(f) if isinstance(f, str) else f for f in fields])
+
+    def update(self, **kwargs):
+        if 'message' in kwargs:
+            from . import bodies
+            kwargs['body'] = bodies.intern(kwargs.pop('message'), using=self.db, model=bodies.body_model(self.model))
+        return super().update(**kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from . import bodies
+        objs = list(objs)
+        bodies.attach(objs, using=self.db)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class BodyManager(models.Manager.from_queryset(BodyQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().select_related('body')
+
+
+class WithMessageBody(models.Model):
+    """
+    Rows whose text lives in MessageBody. `message` reads and writes it like
+    the column it replaced; the body row is looked up or created on save.
+    Subclasses may point `body` at another body model (repeaters does).
+    """
+    body = models.ForeignKey(MessageBody, on_delete=models.PROTECT, related_name='+')
+
+    objects = BodyManager()
+
+    class Meta:
+        abstract = True
+
+    @property
+    def message(self):
+        pending = self.__dict__.get('_message')
+        if pending is not None:
+            return pending
+        return self.body.text if self.body_id else ''
+
+    @message.setter
+    def message(self, value):
+        self._message = value
+
+    def save(self, *args, **kwargs):
+        if self.__dict__.get('_message') is not None or self.body_id is None:
+            from . import bodies
+            bodies.attach([self], using=kwargs.get('using') or self._state.db)
+        super().save(*args, **kwargs)
+
+
+class Transmission(WithMessageBody):
     device = models.CharField(max_length=64, blank=True, default='')
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
-    message = models.TextField(blank=True, default='')
     timestamp = models.DateTimeField(auto_now_add=True)
 
     # Optional but useful fields (dashboards tolerate if null)
@@ -26,12 +126,32 @@ class Transmission(models.Model):
     received_at = models.DateTimeField(null=True, blank=True)
     msg_id = models.IntegerField(null=True, blank=True)  # RF message id (1..255)
 
+    # TX routing: '' is the shared queue, otherwise a gateway id or group name
+    target = models.CharField(max_length=64, blank=True, default='')
+    priority = models.IntegerField(default=0)  # higher goes first
+    not_before = models.DateTimeField(null=True, blank=True)
+
+    # ACK tracking: attempts counts gateway pulls, ack_deadline is set while INFLIGHT
+    attempts = models.IntegerField(default=0)
+    ack_deadline = models.DateTimeField(null=True, blank=True)
+    pulled_at = models.DateTimeField(null=True, blank=True)  # last claim by a gateway (see api.latency)
+
+    # Duplicate suppression for device retries (see api.idempotency)
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, unique=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['target', 'status', '-priority', 'timestamp'], name='idx_tx_queue'),
+            models.Index(fields=['status', 'ack_deadline'], name='idx_tx_ack_deadline'),
+            models.Index(fields=['sent_at'], name='idx_tx_sent_at'),
+        ]
+
     def __str__(self):
         return f"[{self.role}] {self.device} @ {self.timestamp:%Y-%m-%d %H:%M:%S}"
 
 
 # NEW: per-event log for the repeater
-class RepeaterActivity(models.Model):
+class RepeaterActivity(WithMessageBody):
     ACTION_CHOICES = (
         ('received', 'Received'),
         ('retransmitted', 'Retransmitted'),
@@ -41,7 +161,6 @@ class RepeaterActivity(models.Model):
 
     device = models.CharField(max_length=64, blank=True, default='')  # e.g. "RPT001"
     msg_id = models.IntegerField(null=True, blank=True)
-    message = models.TextField(blank=True, default='')
 
     action = models.CharField(max_length=16, choices=ACTION_CHOICES)
 
@@ -55,8 +174,62 @@ class RepeaterActivity(models.Model):
     tx_total = models.IntegerField(null=True, blank=True)
     failed = models.IntegerField(null=True, blank=True)
 
+    # Duplicate suppression for device retries (see api.idempotency)
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, unique=True)
+
     class Meta:
         ordering = ['-timestamp']
 
     def __str__(self):
         return f"{self.device} {self.action} msg#{self.msg_id} @ {self.timestamp:%Y-%m-%d %H:%M:%S}"
+
+
+class LatencySketch(models.Model):
+    """Quantile sketch of one delivery hop, per hour and device (see api.latency)."""
+    bucket = models.DateTimeField()  # start of the hour
+    device = models.CharField(max_length=64, blank=True, default='')  # gateway queue, or relay for relay hops
+    hop = models.CharField(max_length=16)
+    count = models.IntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    bins = models.JSONField(default=dict)  # latency.Sketch.to_dict()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'device', 'hop'], name='uniq_latency_sketch'),
+        ]
+
+    def __str__(self):
+        return f"{self.hop} {self.device} @ {self.bucket:%Y-%m-%d %H:00} ({self.count})"
+
+
+class RollupMark(models.Model):
+    """How far an incremental rollup has read its source (see api.latency)."""
+    name = models.CharField(primary_key=True, max_length=64)
+    high_water = models.DateTimeField(null=True, blank=True)
+    last_id = models.BigIntegerField(default=0)  # tie-break among rows at high_water
+
+    def __str__(self):
+        return f"{self.name} @ {self.high_water}"
+
+
+class ChangeEvent(models.Model):
+    """One committed insert or status change, in commit order (see api.changelog). id is the offset."""
+    at = models.DateTimeField()
+    source = models.CharField(max_length=32)  # model label, e.g. "api.transmission"
+    op = models.CharField(max_length=8)  # "insert" or "status"
+    row_id = models.BigIntegerField()
+    status = models.CharField(max_length=16, null=True, blank=True)
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+
+    def __str__(self):
+        return f"#{self.id} {self.op} {self.source}:{self.row_id}"
+
+
+class ConsumerOffset(models.Model):
+    """Last change-log offset a named consumer has processed."""
+    name = models.CharField(primary_key=True, max_length=64)
+    offset = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.offset}"
@@ -0,0 +1,56 @@
+"""
+Cheap row counts for large tables.
+
+`estimated_count` reads planner statistics instead of running COUNT(*):
+Postgres keeps an estimate in pg_class.reltuples, SQLite's MAX(rowid) is an
+upper bound for append-only tables. Small tables (and other backends) are
+still counted exactly. `EstimatedCountPaginator` uses it for unfiltered admin
+changelists.
+"""
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections, router
+from django.utils.functional import cached_property
+
+# below this many rows an exact COUNT(*) is cheap enough
+EXACT_BELOW = getattr(settings, "ESTIMATED_COUNT_EXACT_BELOW", 10000)
+
+
+def _estimate(model, using):
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)", [table])
+        elif connection.vendor == "sqlite":
+            qn = connection.ops.quote_name
+            cursor.execute(f"SELECT MAX({qn(model._meta.pk.column)}) FROM {qn(table)}")
+        else:
+            return None
+        row = cursor.fetchone()
+    # reltuples is -1 (or 0) until the table has been analyzed
+    return row[0] if row and row[0] is not None and row[0] > 0 else None
+
+
+def estimated_count(model, using=None):
+    """Approximate number of rows in `model`'s table; exact when the table is small."""
+    using = using or router.db_for_read(model)
+    estimate = _estimate(model, using)
+    if estimate is None or estimate < EXACT_BELOW:
+        return model._default_manager.using(using).count()
+    return estimate
+
+
+def wants_exact(request):
+    return request.query_params.get("exact") in ("1", "true", "yes")
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that estimates the count of unfiltered querysets."""
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if getattr(qs, "query", None) is not None and not qs.query.where and not qs.query.is_sliced:
+            return estimated_count(qs.model, qs.db)
+        return super().count
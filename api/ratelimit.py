@@ -0,0 +1,182 @@
+"""
+Token-bucket admission control for device ingest.
+
+RateLimitMiddleware sits near the top of MIDDLEWARE and checks each POST to
+INGEST_RATE_LIMIT_PATHS against two buckets before the body is read, CSRF or
+sessions run, or a view touches the database:
+
+- one per device: its key (X-Device-Key, sent by repeaters on every call
+  and by gateways on the socket), else an X-Device header or ?device=. The
+  key is hashed before it names a bucket. A request naming no device counts
+  against the global bucket only: behind a proxy or NAT every such device
+  shares one address, so bucketing by address would starve the whole fleet.
+  Set INGEST_RATE_LIMIT_BY_ADDRESS when REMOTE_ADDR is the device's own;
+- one global bucket shared by every device.
+
+A request is admitted only if both buckets have a token, and only then are
+tokens taken, so a device that is being refused does not also drain the
+global bucket. Refused requests get a small 429 JSON response with
+Retry-After, and bump a per-scope counter (rejected_counts(), shown by
+/api/stats/).
+
+Buckets are kept in the INGEST_RATE_LIMIT_CACHE cache alias in GCRA form: one
+"theoretical arrival time" per bucket, which behaves exactly like a token
+bucket of `burst` tokens refilled at `rate` per second. Limits hold across
+gunicorn workers only when that cache is shared: the project settings use a
+file-based "ratelimit" cache, shared by the workers of one host (point it at
+Redis or Memcached when several hosts serve ingest); with a LocMemCache they
+are per process. The update is a get then a set, so
+workers racing on the same bucket can each admit a request: a small
+overshoot, never a wrongly refused one.
+
+INGEST_RATE_LIMITS = {"device": (rate, burst), "global": (rate, burst)};
+a scope set to None is not limited.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+DEFAULT_LIMITS = {"device": (10.0, 50), "global": (1000.0, 2000)}
+LIMITS = {**DEFAULT_LIMITS, **getattr(settings, "INGEST_RATE_LIMITS", {})}
+_DEVICE = getattr(settings, "DEVICE_URL_PREFIX", "/device/")
+PATHS = tuple(getattr(settings, "INGEST_RATE_LIMIT_PATHS", ("/api/rx/", "/api/repeater/activity/",
+                                                         f"{_DEVICE}rx/", f"{_DEVICE}repeater/activity/")))
+CACHE_ALIAS = getattr(settings, "INGEST_RATE_LIMIT_CACHE", "default")
+BY_ADDRESS = getattr(settings, "INGEST_RATE_LIMIT_BY_ADDRESS", False)
+
+
+def client_id(request):
+    """Who a device request counts against, from headers and query string only; None if it names no one."""
+    key = request.headers.get("X-Device-Key")
+    if key:
+        return key_id(key)
+    return (request.headers.get("X-Device") or request.GET.get("device")
+            or (request.META.get("REMOTE_ADDR") if BY_ADDRESS else None))
+
+
+def key_id(key):
+    """Bucket name for a device key; the key itself is never stored."""
+    return "key:" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def _keys(device):
+    scopes = [(scope, LIMITS.get(scope)) for scope in (("device", "global") if device else ("global",))]
+    return [(scope, f"rl:{scope}:{device}" if scope == "device" else "rl:global", limit)
+            for scope, limit in scopes if limit]
+
+
+def _decide(buckets, state, now):
+    """
+    GCRA step for each (scope, key, (rate, burst)) in `buckets` against the
+    stored arrival times in `state`. Returns (updates, retry_after, scope):
+    updates to store if admitted, else None and the refusal.
+    """
+    updates = {}
+    for scope, key, (rate, burst) in buckets:
+        interval = 1.0 / rate
+        tat = max(state.get(key) or now, now) + interval
+        wait = tat - now - burst * interval
+        if wait > 0:
+            return None, wait, scope
+        updates[key] = tat
+    return updates, 0.0, None
+
+
+def _ttl(buckets):
+    return max(math.ceil(burst / rate) for _, _, (rate, burst) in buckets) + 1
+
+
+def check(device, now=None):
+    """
+    Take a token for `device` (None: the global bucket only); returns
+    (allowed, retry_after_seconds, refusing scope).
+    """
+    buckets = _keys(device)
+    if not buckets:
+        return True, 0.0, None
+    cache = caches[CACHE_ALIAS]
+    now = now or time.time()
+    updates, wait, scope = _decide(buckets, cache.get_many([k for _, k, _ in buckets]), now)
+    if updates is None:
+        _count(cache, scope)
+        return False, wait, scope
+    cache.set_many(updates, _ttl(buckets))
+    return True, 0.0, None
+
+
+async def acheck(device, now=None):
+    buckets = _keys(device)
+    if not buckets:
+        return True, 0.0, None
+    cache = caches[CACHE_ALIAS]
+    now = now or time.time()
+    updates, wait, scope = _decide(buckets, await cache.aget_many([k for _, k, _ in buckets]), now)
+    if updates is None:
+        await _acount(cache, scope)
+        return False, wait, scope
+    await cache.aset_many(updates, _ttl(buckets))
+    return True, 0.0, None
+
+
+def _count(cache, scope):
+    key = f"rl:rejected:{scope}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+async def _acount(cache, scope):
+    key = f"rl:rejected:{scope}"
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        if not await cache.aadd(key, 1, None):
+            await cache.aincr(key)
+
+
+def rejected_counts():
+    """Requests refused so far, per scope (since the cache was last cleared)."""
+    cache = caches[CACHE_ALIAS]
+    found = cache.get_many([f"rl:rejected:{scope}" for scope in DEFAULT_LIMITS])
+    return {scope: found.get(f"rl:rejected:{scope}", 0) for scope in DEFAULT_LIMITS}
+
+
+def too_many(wait, scope):
+    return JsonResponse({"detail": "Rate limit exceeded", "scope": scope, "retry_after": round(wait, 3)},
+                        status=429, headers={"Retry-After": str(max(1, math.ceil(wait)))})
+
+
+class RateLimitMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _limited(self, request):
+        return request.method == "POST" and request.path in PATHS
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self._limited(request):
+            allowed, wait, scope = check(client_id(request))
+            if not allowed:
+                return too_many(wait, scope)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self._limited(request):
+            allowed, wait, scope = await acheck(client_id(request))
+            if not allowed:
+                return too_many(wait, scope)
+        return await self.get_response(request)
@@ -0,0 +1,97 @@
+"""
+Full-text search over message bodies.
+
+Message text lives once per distinct body in MessageBody (see api.bodies), so
+that is the table indexed. SQLite: an external-content FTS5 table
+(<table>_fts) over `text`, kept in sync by INSERT/UPDATE/DELETE triggers, so
+bulk_create and raw SQL writes are indexed too. Postgres: a GIN index on
+to_tsvector('simple', text). Other backends fall back to icontains. Rows of
+any model with a `body` foreign key are matched through it. The functions
+take the body model, so the repeaters app indexes its own body table
+(repeaters.models.MessageBody) with them too. The index is created after
+migrate (see ApiConfig.ready and RepeatersConfig.ready).
+"""
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import MessageBody
+
+_installed = {}  # (db alias, table) -> bool
+
+
+def fts_table(model=MessageBody):
+    return f"{model._meta.db_table}_fts"
+
+
+def install(model=MessageBody, using="default"):
+    """Create the full-text index for `model` (its `text` column) if its table exists. Idempotent."""
+    connection = connections[using]
+    table = model._meta.db_table
+    if table not in connection.introspection.table_names():
+        return False
+    qn = connection.ops.quote_name
+    pk = model._meta.pk.column
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            fts = fts_table(model)
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN (%s, %s, %s)",
+                [fts + "_ai", fts + "_ad", fts + "_au"])
+            # table rebuilds during migrate drop the triggers, so check them rather than the FTS table
+            if cursor.fetchone()[0] < 3:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {qn(fts)} "
+                    f"USING fts5(text, content={qn(table)}, content_rowid={qn(pk)})")
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {qn(fts + '_ai')} AFTER INSERT ON {qn(table)} BEGIN "
+                    f"INSERT INTO {qn(fts)}(rowid, text) VALUES (new.{qn(pk)}, new.text); END")
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {qn(fts + '_ad')} AFTER DELETE ON {qn(table)} BEGIN "
+                    f"INSERT INTO {qn(fts)}({qn(fts)}, rowid, text) VALUES ('delete', old.{qn(pk)}, old.text); END")
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {qn(fts + '_au')} AFTER UPDATE OF text ON {qn(table)} BEGIN "
+                    f"INSERT INTO {qn(fts)}({qn(fts)}, rowid, text) VALUES ('delete', old.{qn(pk)}, old.text); "
+                    f"INSERT INTO {qn(fts)}(rowid, text) VALUES (new.{qn(pk)}, new.text); END")
+                # (re)index rows written while the triggers were missing
+                cursor.execute(f"INSERT INTO {qn(fts)}({qn(fts)}) VALUES ('rebuild')")
+        elif connection.vendor == "postgresql":
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {qn(table + '_text_fts')} "
+                f"ON {qn(table)} USING GIN (to_tsvector('simple', text))")
+        else:
+            return False
+    _installed[(using, table)] = True
+    return True
+
+
+def _has_index(model, using):
+    key = (using, model._meta.db_table)
+    if key not in _installed:
+        connection = connections[using]
+        if connection.vendor == "sqlite":
+            _installed[key] = fts_table(model) in connection.introspection.table_names()
+        else:
+            _installed[key] = connection.vendor == "postgresql"
+    return _installed[key]
+
+
+def _fts5_query(q):
+    # every whitespace-separated term must match; quoting keeps FTS5 operators literal
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in q.split())
+
+
+def message_filter(model, q):
+    """Q() selecting rows of `model` whose message matches the search text `q`."""
+    using = router.db_for_read(model)
+    body = model._meta.get_field("body").related_model
+    if not q.split() or not _has_index(body, using):
+        return Q(body__text__icontains=q)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    if connection.vendor == "sqlite":
+        fts = qn(fts_table(body))
+        return Q(body__in=RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", [_fts5_query(q)]))
+    return Q(body__in=RawSQL(
+        f"SELECT {qn(body._meta.pk.column)} FROM {qn(body._meta.db_table)} "
+        f"WHERE to_tsvector('simple', text) @@ plainto_tsquery('simple', %s)", [q]))
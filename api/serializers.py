@@ -15,6 +15,9 @@ class TransmissionSerializer(serializers.ModelSerializer):
             "sent_at",
             "received_at",
             "msg_id",
+            "target",
+            "priority",
+            "not_before",
         ]
         read_only_fields = fields
 
@@ -22,4 +25,18 @@ class TransmissionSerializer(serializers.ModelSerializer):
 class RepeaterActivitySerializer(serializers.ModelSerializer):
     class Meta:
         model = RepeaterActivity
-        fields = "__all__"
+        fields = [
+            "id",
+            "timestamp",
+            "device",
+            "msg_id",
+            "message",
+            "action",
+            "voltage",
+            "signal_strength",
+            "tx_power",
+            "rx_total",
+            "tx_total",
+            "failed",
+            "idempotency_key",
+        ]
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent after TX rows are committed to the queue, with targets=set of queue
+# names; lets push consumers (telecom_backend.gateway) skip their poll wait.
+tx_enqueued = Signal()
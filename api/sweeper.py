@@ -0,0 +1,54 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import changelog
+from .models import Transmission
+
+# Tunables (override in settings.py)
+ACK_TIMEOUT = timedelta(seconds=getattr(settings, 'TX_ACK_TIMEOUT_SECONDS', 60))
+MAX_ATTEMPTS = getattr(settings, 'TX_MAX_ATTEMPTS', 5)
+RETRY_BACKOFF = timedelta(seconds=getattr(settings, 'TX_RETRY_BACKOFF_SECONDS', 15))
+PENDING_TTL = getattr(settings, 'TX_PENDING_TTL_SECONDS', None)  # None = PENDING never expires
+
+
+def backoff_for(attempts):
+    """Delay before retry number `attempts + 1`: base, 2x base, 4x base, ..."""
+    return RETRY_BACKOFF * (2 ** max(attempts - 1, 0))
+
+
+def sweep_tx(now=None, max_attempts=None, pending_ttl=None):
+    """
+    One sweeper pass over TX messages whose ACK deadline has passed.
+
+    Every step is a set-based UPDATE driven by a range scan on
+    idx_tx_ack_deadline (status, ack_deadline):
+      - INFLIGHT rows that used their last attempt -> FAILED
+      - other expired INFLIGHT rows -> PENDING, with not_before pushed out by
+        an exponential backoff (one UPDATE per attempt count, so at most
+        max_attempts - 1 statements)
+      - optionally, PENDING rows older than pending_ttl -> FAILED
+    Returns a dict of row counts per outcome.
+    """
+    now = now or timezone.now()
+    max_attempts = max_attempts or MAX_ATTEMPTS
+    pending_ttl = PENDING_TTL if pending_ttl is None else pending_ttl
+
+    expired = Transmission.objects.filter(role='TX', status='INFLIGHT', ack_deadline__lte=now)
+    counts = {'failed': 0, 'retried': 0, 'expired': 0}
+    with transaction.atomic():
+        counts['failed'] = changelog.update(
+            expired.filter(attempts__gte=max_attempts), status='FAILED', ack_deadline=None)
+        for attempts in range(1, max_attempts):
+            counts['retried'] += changelog.update(
+                expired.filter(attempts=attempts),
+                status='PENDING', ack_deadline=None, not_before=now + backoff_for(attempts))
+        if pending_ttl:
+            counts['expired'] = changelog.update(Transmission.objects.filter(
+                Q(not_before__isnull=True) | Q(not_before__lte=now),
+                role='TX', status='PENDING',
+                timestamp__lt=now - timedelta(seconds=pending_ttl),
+            ), status='FAILED')
+    return counts
@@ -0,0 +1,24 @@
+"""
+Whether a model's table exists.
+
+api.RepeaterActivity has no table under the project's migrations: the
+repeaters app owns repeater activity, and the api model is only created
+where the schema is built from the models (tests with migrations disabled,
+older databases). Code that reads or loads it checks here first. Answers
+are cached per database alias until the next migrate (see ApiConfig.ready).
+"""
+from django.db import connections, router
+
+_known = {}  # (db alias, table) -> bool
+
+
+def exists(model, using=None):
+    using = using or router.db_for_read(model)
+    key = (using, model._meta.db_table)
+    if key not in _known:
+        _known[key] = model._meta.db_table in connections[using].introspection.table_names()
+    return _known[key]
+
+
+def forget():
+    _known.clear()
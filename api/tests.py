@@ -0,0 +1,452 @@
+
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from .models import MessageBody, Transmission
+
+class TxQueueAPITest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_tx_message_sets_msg_id(self):
+        r = self.client.post("/api/tx/", {"message": "hello"}, format="json")
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.data["msg_id"], r.data["id"])
+        self.assertEqual(Transmission.objects.get(pk=r.data["id"]).msg_id, r.data["id"])
+
+    def test_tx_batch_targets(self):
+        r = self.client.post("/api/tx/batch/", {"message": "alert", "targets": ["GW01", "GW02", "GW03"]}, format="json")
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.data["count"], 3)
+        self.assertEqual(r.data["ids"], r.data["msg_ids"])
+        rows = Transmission.objects.filter(pk__in=r.data["ids"]).order_by("id")
+        self.assertEqual([t.target for t in rows], ["GW01", "GW02", "GW03"])
+        self.assertTrue(all(t.msg_id == t.id and t.status == "PENDING" for t in rows))
+
+    def test_tx_batch_rejects_empty_entry(self):
+        r = self.client.post("/api/tx/batch/", {"messages": [{"message": "a"}, {"message": " "}]}, format="json")
+        self.assertEqual(r.status_code, 400)
+        self.assertEqual(Transmission.objects.count(), 0)
+
+    def test_tx_pending_per_gateway_queue(self):
+        self.client.post("/api/tx/", {"message": "shared"}, format="json")
+        self.client.post("/api/tx/", {"message": "other", "target": "GW02", "priority": 9}, format="json")
+        self.client.post("/api/tx/", {"message": "later", "target": "GW01", "priority": 5,
+                                      "not_before": "2999-01-01T00:00:00Z"}, format="json")
+        self.client.post("/api/tx/", {"message": "urgent", "target": "north", "priority": 3}, format="json")
+
+        r = self.client.get("/api/tx/pending/?gateway=GW01&groups=north")
+        self.assertEqual(r.data["message"], "urgent")
+        r = self.client.get("/api/tx/pending/")
+        self.assertEqual(r.data["message"], "shared")
+
+    def test_tx_pending_claims_message_until_acked(self):
+        r = self.client.post("/api/tx/", {"message": "once"}, format="json")
+        first = self.client.get("/api/tx/pending/")
+        self.assertEqual(first.data["id"], r.data["id"])
+        self.assertEqual(first.data["attempt"], 1)
+        self.assertEqual(self.client.get("/api/tx/pending/").data["status"], "no_messages")
+
+        ack = self.client.post("/api/rx/", {"message": "once", "msg_id": r.data["msg_id"]}, format="json")
+        self.assertEqual(ack.data["tx_updated"], 1)
+
+    def test_rx_retry_with_idempotency_key_is_deduplicated(self):
+        from django.core.cache import cache
+        tx = self.client.post("/api/tx/", {"message": "dup"}, format="json")
+        body = {"device": "RX001", "message": "dup", "msg_id": tx.data["msg_id"]}
+        r1 = self.client.post("/api/rx/", body, format="json", HTTP_IDEMPOTENCY_KEY="rx-dup-1")
+        r2 = self.client.post("/api/rx/", body, format="json", HTTP_IDEMPOTENCY_KEY="rx-dup-1")
+        self.assertEqual((r1.data["tx_updated"], r1.data), (1, r2.data))
+        cache.clear()  # a retry that reaches another worker: rebuilt from the stored rows
+        r3 = self.client.post("/api/rx/", body, format="json", HTTP_IDEMPOTENCY_KEY="rx-dup-1")
+        self.assertEqual((r3.data, r3["Idempotent-Replayed"]), (r1.data, "true"))
+        self.assertEqual(Transmission.objects.filter(role="RX").count(), 1)
+
+
+class TxSweeperTest(TestCase):
+    def test_sweep_retries_with_backoff_then_fails(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .sweeper import sweep_tx, backoff_for
+
+        now = timezone.now()
+        retry = Transmission.objects.create(role="TX", message="a", status="INFLIGHT",
+                                            attempts=2, ack_deadline=now - timedelta(seconds=1))
+        done = Transmission.objects.create(role="TX", message="b", status="INFLIGHT",
+                                           attempts=3, ack_deadline=now - timedelta(seconds=1))
+        waiting = Transmission.objects.create(role="TX", message="c", status="INFLIGHT",
+                                              attempts=1, ack_deadline=now + timedelta(seconds=30))
+
+        counts = sweep_tx(now=now, max_attempts=3)
+        self.assertEqual((counts["retried"], counts["failed"]), (1, 1))
+        retry.refresh_from_db(); done.refresh_from_db(); waiting.refresh_from_db()
+        self.assertEqual(retry.status, "PENDING")
+        self.assertEqual(retry.not_before, now + backoff_for(2))
+        self.assertEqual(done.status, "FAILED")
+        self.assertEqual(waiting.status, "INFLIGHT")
+
+
+class MessageSearchTest(TestCase):
+    def test_messages_full_text_query(self):
+        from . import search
+        client = APIClient()
+        client.post("/api/tx/batch/", {"messages": ["flood warning river", "all clear", "river level normal"]},
+                    format="json")
+        self.assertTrue(search._has_index(MessageBody, "default"))
+
+        r = client.get("/api/messages/?q=river")
+        self.assertEqual(sorted(m["message"] for m in r.data), ["flood warning river", "river level normal"])
+        r = client.get("/api/messages/?q=river flood")
+        self.assertEqual([m["message"] for m in r.data], ["flood warning river"])
+
+        Transmission.objects.filter(message="all clear").update(message="river clear")
+        r = client.get('/api/messages/?q=clear')
+        self.assertEqual([m["message"] for m in r.data], ["river clear"])
+
+    def test_repeated_text_is_stored_once(self):
+        client = APIClient()
+        client.post("/api/tx/batch/", {"message": "net check", "targets": ["GW01", "GW02"]}, format="json")
+        client.post("/api/rx/", {"message": "net check"}, format="json")
+        self.assertEqual(MessageBody.objects.filter(text="net check").count(), 1)
+        self.assertEqual(Transmission.objects.filter(message="net check").count(), 3)
+
+    def test_message_maps_onto_body_in_q_values_and_order_by(self):
+        from django.db.models import Q
+
+        Transmission.objects.create(role="TX", message="bravo", device="GW01")
+        Transmission.objects.create(role="TX", message="alpha", device="GW02")
+        qs = Transmission.objects.filter(Q(message="alpha") | ~Q(message__startswith="b"))
+        self.assertEqual(list(qs.values_list("message", flat=True)), ["alpha"])
+        self.assertEqual(list(Transmission.objects.order_by("-message").values("device", "message")),
+                         [{"device": "GW01", "message": "bravo"}, {"device": "GW02", "message": "alpha"}])
+
+
+class MessageBodyMigrationTest(TransactionTestCase):
+    def test_bodies_leave_the_repeaters_activity_table_alone(self):
+        from unittest import SkipTest
+        from django.db import connection
+        from django.db.migrations.executor import MigrationExecutor
+
+        executor = MigrationExecutor(connection)
+        if "api" not in executor.loader.migrated_apps:
+            raise SkipTest("api migrations are disabled")
+        latest = executor.loader.graph.leaf_nodes("api")
+        executor.migrate([("api", "0006_idempotency_key")])
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("INSERT INTO repeater_device (device, friendly_name, enabled, created_at, updated_at) "
+                               "VALUES ('RPT001', '', 1, '2026-01-01', '2026-01-01')")
+                cursor.execute("INSERT INTO repeater_activity (msg_id, message, action, rx_total, tx_total, failed, "
+                               "timestamp, device_id) VALUES (1, 'relay', 'received', 0, 0, 0, '2026-01-01', 'RPT001')")
+            executor = MigrationExecutor(connection)
+            executor.loader.build_graph()
+            executor.migrate(latest)
+        finally:
+            MigrationExecutor(connection).migrate(latest)  # no-op unless the forward run failed
+        with connection.cursor() as cursor:
+            columns = {c.name for c in connection.introspection.get_table_description(cursor, "repeater_activity")}
+            cursor.execute("SELECT message FROM repeater_activity")
+            self.assertEqual(cursor.fetchall(), [("relay",)])
+        self.assertIn("message", columns)
+        self.assertFalse({"body_id", "idempotency_key"} & columns)
+
+
+class EstimatedCountTest(TestCase):
+    def test_paginator_estimates_only_unfiltered_querysets(self):
+        from unittest import mock
+        from . import pagination
+        Transmission.objects.bulk_create([Transmission(role="TX", message=str(i)) for i in range(5)])
+        Transmission.objects.filter(message="0").delete()
+
+        self.assertEqual(pagination.estimated_count(Transmission), 4)  # small tables are counted exactly
+        with mock.patch.object(pagination, "EXACT_BELOW", 2):
+            self.assertEqual(pagination.estimated_count(Transmission), 5)  # MAX(id) upper bound on SQLite
+            qs = Transmission.objects.order_by("id")
+            self.assertEqual(pagination.EstimatedCountPaginator(qs, 2).count, 5)
+            self.assertEqual(pagination.EstimatedCountPaginator(qs.filter(role="TX"), 2).count, 4)
+
+
+class WarmupTest(TestCase):
+    def test_warmup_runs_every_step(self):
+        from telecom_backend import warmup
+        timings = warmup.run()
+        self.assertEqual(set(timings), {"imports", "database", "caches"})
+
+
+@override_settings(ROOT_URLCONF="telecom_backend.urls_asgi")
+class AsyncDeviceViewsTest(TestCase):
+    async def test_async_poll_and_ack(self):
+        from django.test import AsyncClient
+        client = AsyncClient()
+        tx = await Transmission.objects.acreate(role="TX", message="async", status="PENDING", target="GW01")
+
+        r = await client.get("/api/tx/pending/?gateway=GW01")
+        self.assertEqual((r.json()["id"], r.json()["attempt"]), (tx.id, 1))
+        r = await client.get("/api/tx/pending/?gateway=GW01")
+        self.assertEqual(r.json()["status"], "no_messages")
+
+        body = {"device": "RX001", "message": "async", "msg_id": tx.id}
+        r1 = await client.post("/api/rx/", body, content_type="application/json", headers={"Idempotency-Key": "a1"})
+        r2 = await client.post("/api/rx/", body, content_type="application/json", headers={"Idempotency-Key": "a1"})
+        self.assertEqual(r1.status_code, 201)
+        self.assertEqual(r1.json(), r2.json())
+        self.assertEqual(r1.json()["tx_updated"], 1)
+        self.assertEqual((await Transmission.objects.aget(pk=tx.pk)).status, "SENT")
+
+
+class GatewaySocketTest(TestCase):
+    async def test_push_on_credit_and_ack_on_same_socket(self):
+        import asyncio
+        import json
+        from unittest import mock
+        from django.db import DatabaseError
+        from telecom_backend import gateway
+
+        inbox, outbox = asyncio.Queue(), asyncio.Queue()
+        scope = {"type": "websocket", "path": "/ws/gateway/", "query_string": b"gateway=GW01", "headers": []}
+
+        async def next_out():
+            event = await asyncio.wait_for(outbox.get(), 5)
+            return json.loads(event["text"]) if "text" in event else event
+
+        real_dispatch, passes = gateway.Hub.dispatch, []
+
+        async def flaky_dispatch(hub):
+            passes.append(1)
+            if len(passes) == 1:
+                raise DatabaseError("connection lost")  # the dispatcher must survive this
+            await real_dispatch(hub)
+
+        with mock.patch.object(gateway, "TICK", 0.05), mock.patch.object(gateway.Hub, "dispatch", flaky_dispatch), \
+                self.assertLogs("telecom_backend.gateway", "ERROR"):
+            app = asyncio.ensure_future(gateway.application(scope, inbox.get, outbox.put))
+            await inbox.put({"type": "websocket.connect"})
+            self.assertEqual((await next_out())["type"], "websocket.accept")
+
+            tx = await Transmission.objects.acreate(role="TX", message="pushed", status="PENDING", target="GW01")
+            await inbox.put({"type": "websocket.receive", "text": json.dumps({"type": "ready", "credit": 1})})
+            push = await next_out()
+            self.assertEqual((push["type"], push["id"], push["attempt"]), ("tx", tx.id, 1))
+
+            ack = {"type": "rx", "ref": 7, "device": "RX001", "message": "pushed", "msg_id": push["msg_id"]}
+            await inbox.put({"type": "websocket.receive", "text": json.dumps(ack)})
+            reply = await next_out()
+            self.assertEqual((reply["type"], reply["ref"], reply["tx_updated"]), ("rx_ok", 7, 1))
+
+            await inbox.put({"type": "websocket.disconnect"})
+            await asyncio.wait_for(app, 5)
+        self.assertEqual((await Transmission.objects.aget(pk=tx.pk)).status, "SENT")
+
+
+class DatasetBenchmarkTest(TestCase):
+    def test_generate_then_benchmark(self):
+        from django.apps import apps
+        from api import benchmark, dataset, tables
+        from .models import RepeaterActivity
+
+        counts = dataset.generate(days=3, transmissions=60, activity=600, devices=4, seed=7)
+        self.assertEqual(Transmission.objects.count(), counts["transmissions"])
+        acked = Transmission.objects.filter(role="TX", status="SENT")
+        self.assertEqual(Transmission.objects.filter(role="RX", msg_id__in=acked.values("msg_id")).count(), acked.count())
+        with_activity = apps.is_installed("repeaters") or tables.exists(RepeaterActivity)
+        if with_activity:
+            self.assertGreater(counts["activity"], 300)
+        else:
+            self.assertEqual(counts["activity"], 0)  # no table for it under the project's migrations
+
+        only = {"messages_search", "metrics_device_24h"} if apps.is_installed("repeaters") else {"messages_search"}
+        report = benchmark.run(repeat=2, device="SIM0001", only=only)
+        self.assertEqual(set(report["cases"]), only)
+        for case in report["cases"].values():
+            self.assertEqual(case["status"], 200)
+            self.assertGreaterEqual(case["queries"], 1)
+            self.assertTrue(case["plans"])
+
+
+class IngestRateLimitTest(TestCase):
+    def setUp(self):
+        from django.core.cache import caches
+        from api import ratelimit
+        caches[ratelimit.CACHE_ALIAS].clear()
+        self.client = APIClient()
+
+    def test_device_bucket_refuses_with_retry_after(self):
+        from unittest import mock
+        from api import ratelimit
+
+        limits = {"device": (1.0, 2), "global": (100.0, 100)}
+        with mock.patch.dict(ratelimit.LIMITS, limits):
+            codes = [self.client.post("/api/rx/", {"message": "hi"}, format="json",
+                                      HTTP_X_DEVICE_KEY="key-rx009").status_code for _ in range(3)]
+            self.assertEqual(codes, [201, 201, 429])
+            r = self.client.post("/api/rx/", {"message": "hi"}, format="json", HTTP_X_DEVICE_KEY="key-rx009")
+            self.assertEqual(r["Retry-After"], "1")
+            # other devices keep their own bucket, even from the same address; GETs are not limited
+            self.assertEqual(self.client.post("/api/rx/", {"message": "hi"}, format="json",
+                                              HTTP_X_DEVICE_KEY="key-rx010").status_code, 201)
+            self.assertEqual(self.client.get("/api/stats/").data["rate_limited"], {"device": 2, "global": 0})
+            # a device that names itself nowhere is not bucketed by (a possibly shared) address
+            codes = [self.client.post("/api/rx/", {"message": "hi"}, format="json").status_code for _ in range(3)]
+            self.assertEqual(codes, [201, 201, 201])
+        self.assertEqual(Transmission.objects.filter(role="RX").count(), 6)
+
+
+class DeliveryLatencyTest(TestCase):
+    def test_rollup_then_percentiles_per_hop(self):
+        from datetime import timedelta
+        from django.apps import apps
+        from django.utils import timezone
+        from . import latency, tables
+        from .models import RepeaterActivity
+
+        client = APIClient()
+        base = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=2)
+        # relays are read from the repeaters app's tables, else api's if it has one
+        if apps.is_installed("repeaters"):
+            from repeaters import shards
+            from repeaters.models import RepeaterDevice
+            relays, repeater = shards.for_write(base), RepeaterDevice.objects.create(device="RPT001")
+        else:
+            relays, repeater = RepeaterActivity if tables.exists(RepeaterActivity) else None, "RPT001"
+        for i in range(10):
+            r = client.post("/api/tx/", {"message": f"m{i}", "target": "GW01"}, format="json")
+            pulled = client.get("/api/tx/pending/?gateway=GW01").data
+            client.post("/api/rx/", {"message": f"m{i}", "msg_id": pulled["msg_id"]}, format="json")
+            queued = base + timedelta(minutes=i)
+            Transmission.objects.filter(pk=r.data["id"]).update(
+                timestamp=queued, pulled_at=queued + timedelta(seconds=2),
+                sent_at=queued + timedelta(seconds=2, milliseconds=100 * (i + 1)))
+            if relays:
+                relays.objects.create(device=repeater, msg_id=pulled["msg_id"], message=f"m{i}",
+                                      action="retransmitted")
+                relays.objects.filter(msg_id=pulled["msg_id"]).update(
+                    timestamp=queued + timedelta(seconds=2, milliseconds=50))
+
+        self.assertEqual(latency.rollup(batch_size=4), 10)
+        self.assertEqual(latency.rollup(), 0)  # high-water mark: nothing is counted twice
+
+        r = client.get("/api/latency/?period=24h&device=GW01")
+        hops = r.data["hops"]
+        self.assertEqual(hops["total"]["count"], 10)
+        self.assertAlmostEqual(hops["queue"]["p50"], 2000, delta=2000 * latency.ACCURACY)
+        self.assertAlmostEqual(hops["air"]["p50"], 500, delta=500 * latency.ACCURACY)
+        self.assertEqual(hops["to_relay"]["count"], 0)  # relay hops are keyed by repeater
+        relay = client.get("/api/latency/?hop=to_relay,from_relay&device=RPT001").data["hops"]
+        if relays:
+            self.assertAlmostEqual(relay["to_relay"]["p50"], 50, delta=50 * latency.ACCURACY)
+            self.assertEqual(relay["from_relay"]["count"], 10)
+        else:
+            self.assertEqual(relay["from_relay"]["count"], 0)
+        self.assertEqual(client.get("/api/latency/?hop=bogus").status_code, 400)
+
+
+class EventLogTest(TestCase):
+    def test_events_are_sampled(self):
+        with self.assertLogs("api.events", "INFO") as logs, \
+                override_settings(EVENT_LOG_SAMPLING={"rx.received": 0.0}):
+            APIClient().post("/api/rx/", {"message": "hi", "msg_id": 999}, format="json")
+        self.assertEqual([(r.event, r.msg_id) for r in logs.records], [("rx.unmatched", 999)])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        import io
+        import logging
+        import threading
+        from . import eventlog
+
+        gate = threading.Event()
+
+        class SlowStream(io.StringIO):
+            def write(self, s):
+                gate.wait(5)
+                return super().write(s)
+
+        stream = SlowStream()
+        handler = eventlog.NonBlockingHandler(stream=stream, capacity=2)
+        handler.setFormatter(eventlog.JsonFormatter())
+        record = logging.LogRecord("api.events", logging.INFO, __file__, 0, "tx.queued", None, None)
+        record.event = "tx.queued"
+        for _ in range(10):
+            handler.handle(record)  # the listener is stuck writing the first one
+        self.assertIn(handler._dropped, (7, 8))
+        gate.set()
+        handler.close()
+        self.assertIn('"event": "tx.queued"', stream.getvalue())
+
+
+class ChangeLogTest(TestCase):
+    def test_inserts_and_status_transitions_in_commit_order(self):
+        from . import changelog
+
+        client = APIClient()
+        with override_settings(CHANGE_LOG=True), self.captureOnCommitCallbacks(execute=True):
+            tx = client.post("/api/tx/", {"message": "cdc", "target": "GW01"}, format="json").data
+            client.get("/api/tx/pending/?gateway=GW01")
+            rx = client.post("/api/rx/", {"message": "cdc", "msg_id": tx["msg_id"]}, format="json").data
+        try:
+            r = client.get("/api/changes/?after=0")
+            self.assertEqual([(c["op"], c["row_id"], c["status"]) for c in r.data["changes"]],
+                             [("insert", tx["id"], "PENDING"), ("status", tx["id"], "INFLIGHT"),
+                              ("insert", rx["id"], "RECEIVED"), ("status", tx["id"], "SENT")])
+            self.assertEqual(r.data["changes"][0]["data"]["message"], "cdc")
+
+            consumer = changelog.Consumer("alerts", sources=["api.transmission"])
+            first = consumer.poll(limit=3)
+            consumer.commit(first[-1].id)
+            self.assertEqual([e.status for e in changelog.Consumer("alerts").poll()], ["SENT"])
+            self.assertEqual(client.get(f"/api/changes/?after={r.data['next']}").data["changes"], [])
+        finally:
+            from . import bodies
+            bodies.forget()  # ids remembered by the on-commit callbacks above are rolled back
+
+    def test_events_commit_and_roll_back_with_their_rows(self):
+        from django.db import transaction
+        from . import changelog
+
+        with override_settings(CHANGE_LOG=True):
+            with transaction.atomic():
+                tx = Transmission.objects.create(role="TX", message="kept", status="PENDING")
+                changelog.inserted([tx])
+                self.assertEqual([e.row_id for e in changelog.read()], [tx.id])  # no on-commit hook needed
+            try:
+                with transaction.atomic():
+                    lost = Transmission.objects.create(role="TX", message="lost", status="PENDING")
+                    changelog.inserted([lost])
+                    raise RuntimeError("rolled back")
+            except RuntimeError:
+                pass
+        self.assertEqual([e.row_id for e in changelog.read()], [tx.id])
+
+
+class LeanDeviceEndpointsTest(TestCase):
+    def test_device_prefix_matches_drf_views(self):
+        from django.test import Client
+
+        api = APIClient()
+        tx = api.post("/api/tx/", {"message": "lean", "target": "GW01"}, format="json").data
+        client = Client()
+        r = client.get("/device/tx/pending/", {"gateway": "GW01"})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual((r.json()["id"], r.json()["message"], r.json()["attempt"]), (tx["id"], "lean", 1))
+        self.assertNotIn("X-Frame-Options", r)  # answered before the browser middleware
+        self.assertEqual(client.get("/device/tx/pending/", {"gateway": "GW01"}).json()["status"], "no_messages")
+
+        r = client.post("/device/rx/", {"message": "lean", "msg_id": tx["msg_id"]}, content_type="application/json",
+                        HTTP_IDEMPOTENCY_KEY="lean-1")
+        self.assertEqual((r.status_code, r.json()["tx_updated"]), (201, 1))
+        again = client.post("/device/rx/", {"message": "lean", "msg_id": tx["msg_id"]},
+                            content_type="application/json", HTTP_IDEMPOTENCY_KEY="lean-1")
+        self.assertEqual((again.json(), again["Idempotent-Replayed"]), (r.json(), "true"))
+        self.assertEqual(Transmission.objects.get(pk=tx["id"]).status, "SENT")
+
+        self.assertEqual(client.post("/device/rx/", "{", content_type="application/json").status_code, 400)
+        self.assertEqual(client.get("/device/rx/").status_code, 405)
+        self.assertEqual(client.get("/device/nope/").status_code, 404)
+
+    async def test_device_prefix_under_asgi(self):
+        from django.test import AsyncClient
+
+        tx = await Transmission.objects.acreate(role="TX", message="lean", status="PENDING", target="GW01")
+        client = AsyncClient()
+        r = await client.get("/device/tx/pending/", {"gateway": "GW01"})
+        self.assertEqual((r.status_code, r.json()["id"]), (200, tx.id))
+        self.assertNotIn("X-Frame-Options", r)  # still answered before the browser middleware
+        self.assertEqual((await client.get("/device/nope/")).status_code, 404)
@@ -6,6 +6,7 @@ urlpatterns = [
 
     # Web UI -> TX queue
     path('tx/', views.tx_message, name='tx_message'),
+    path('tx/batch/', views.tx_batch, name='tx_batch'),
     # ESP32 TX
     path('tx/pending/', views.tx_pending, name='tx_pending'),
     # This has been removed to cater for the new logic
@@ -20,4 +21,6 @@ urlpatterns = [
     # Queries
     path('messages/', views.list_messages, name='list_messages'),
     path('stats/', views.stats, name='stats'),
+    path('latency/', views.delivery_latency, name='delivery_latency'),
+    path('changes/', views.changes, name='changes'),
 ]
@@ -1,12 +1,23 @@
+import logging
+from datetime import timedelta
 
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils import timezone
-from django.db.models import Count, Q
+from django.utils.dateparse import parse_datetime
+from django.db import transaction, IntegrityError
+from django.db.models import Count, Q, F
+from django.db.models.functions import Coalesce
 
 from .models import Transmission, RepeaterActivity
 from .serializers import TransmissionSerializer, RepeaterActivitySerializer
+from .sweeper import ACK_TIMEOUT
+from .idempotency import idempotency_key, replay, remember
+from . import changelog, eventlog, latency, search, ratelimit, tables
+from .eventlog import event
+from .pagination import estimated_count, wants_exact
+from .signals import tx_enqueued
 
 VALID_ROLES = {"TX", "RX", "RELAY"}
 
@@ -15,56 +26,241 @@ def health(request):
     return Response({"ok": True, "app": "api"}, status=200)
 
 # ---------- Web UI queues TX ----------
+MAX_TX_BATCH = 500
+
+
+def _tx_routing(data):
+    """
+    Parse optional routing fields (target, priority, not_before) from a
+    request body or batch entry. Returns (fields, error).
+    """
+    target = str(data.get('target') or '').strip()
+    try:
+        priority = int(data.get('priority') or 0)
+    except (TypeError, ValueError):
+        return None, 'priority must be an integer'
+    not_before = data.get('not_before')
+    if not_before:
+        not_before = parse_datetime(str(not_before))
+        if not_before is None:
+            return None, 'not_before must be an ISO 8601 datetime'
+        if timezone.is_naive(not_before):
+            not_before = timezone.make_aware(not_before)
+    else:
+        not_before = None
+    return {'target': target, 'priority': priority, 'not_before': not_before}, None
+
+
+def _enqueue_tx(items):
+    """
+    Queue TX rows from dicts of Transmission fields (device, message, routing).
+
+    All rows go in with one bulk INSERT, then msg_id is copied from id with
+    one set-based UPDATE, so the cost is two statements whatever the batch size.
+    """
+    rows = [Transmission(role='TX', status='PENDING', **item) for item in items]
+    with transaction.atomic():
+        Transmission.objects.bulk_create(rows)
+        Transmission.objects.filter(pk__in=[r.pk for r in rows]).update(msg_id=F('id'))
+        for r in rows:
+            r.msg_id = r.pk
+        changelog.inserted(rows)
+        targets = {r.target for r in rows}
+        transaction.on_commit(lambda: tx_enqueued.send(sender=Transmission, targets=targets))
+    return rows
+
+
 @api_view(['POST'])
 def tx_message(request):
     msg = (request.data.get('message') or "").strip()
     dev = request.data.get('device', 'WebUI')
     if not msg:
         return Response({'error': 'Message cannot be empty'}, status=status.HTTP_400_BAD_REQUEST)
+    routing, err = _tx_routing(request.data)
+    if err:
+        return Response({'error': err}, status=status.HTTP_400_BAD_REQUEST)
 
-    tx = Transmission.objects.create(
-        device=dev,
-        role='TX',
-        message=msg,
-        status='PENDING'
-    )
-    
-    # CRITICAL: Set msg_id to the auto-generated ID so RX can match it later
-    tx.msg_id = tx.id
-    tx.save()
-    
-    print(f"📤 Queued TX message #{tx.id} (msg_id={tx.msg_id}): {msg[:50]}")
+    # msg_id mirrors the auto-generated ID so RX can match it later
+    tx, = _enqueue_tx([dict(device=dev, message=msg, **routing)])
+
+    event("tx.queued", id=tx.id, msg_id=tx.msg_id, device=dev, target=tx.target, text=msg[:50])
 
     return Response({
         'status': 'ok',
         'id': tx.id,
         'msg_id': tx.msg_id,
+        'target': tx.target,
         'message': 'Message queued for transmission'
     }, status=201)
 
 
-# ---------- ESP32 TX pulls one pending ----------
-@api_view(['GET'])
-def tx_pending(request):
-    pending = (Transmission.objects.filter(role='TX', status='PENDING')
-               .order_by('timestamp').first())
-    if not pending:
-        return Response({'status': 'no_messages', 'message': None}, status=200)
-    
-    # Ensure msg_id is set (backwards compatibility)
-    if not pending.msg_id:
-        pending.msg_id = pending.id
-        pending.save()
-    
+@api_view(['POST'])
+def tx_batch(request):
+    """
+    Queue many TX messages in one request. Accepts either:
+      {"messages": [{"message": "...", "target": "...", "priority": 0}, ...]}
+      {"message": "...", "targets": ["GW01", "north", ...], "priority": 0}
+    Each target gets its own row in that gateway's (or group's) queue.
+    """
+    dev = request.data.get('device', 'WebUI')
+    items = []
+
+    if 'messages' in request.data:
+        entries = request.data.get('messages')
+        if not isinstance(entries, list):
+            return Response({'error': "'messages' must be a list"}, status=400)
+        for i, entry in enumerate(entries):
+            if isinstance(entry, str):
+                entry = {'message': entry}
+            if not isinstance(entry, dict):
+                return Response({'error': f'messages[{i}] must be an object or string'}, status=400)
+            msg = (entry.get('message') or "").strip()
+            if not msg:
+                return Response({'error': f'messages[{i}]: Message cannot be empty'}, status=400)
+            routing, err = _tx_routing(entry)
+            if err:
+                return Response({'error': f'messages[{i}]: {err}'}, status=400)
+            items.append(dict(device=entry.get('device', dev), message=msg, **routing))
+    else:
+        msg = (request.data.get('message') or "").strip()
+        targets = request.data.get('targets')
+        if not msg:
+            return Response({'error': 'Message cannot be empty'}, status=400)
+        if not isinstance(targets, list) or not targets:
+            return Response({'error': "Provide 'messages' or 'message' with a non-empty 'targets' list"}, status=400)
+        routing, err = _tx_routing(request.data)
+        if err:
+            return Response({'error': err}, status=400)
+        items = [dict(device=dev, message=msg, **dict(routing, target=str(t).strip())) for t in targets]
+
+    if not items:
+        return Response({'error': 'No messages to queue'}, status=400)
+    if len(items) > MAX_TX_BATCH:
+        return Response({'error': f'Batch too large (max {MAX_TX_BATCH})'}, status=400)
+
+    rows = _enqueue_tx(items)
+    event("tx.batch_queued", count=len(rows), first_id=rows[0].id, last_id=rows[-1].id, device=dev)
+
     return Response({
+        'status': 'ok',
+        'count': len(rows),
+        'ids': [r.id for r in rows],
+        'msg_ids': [r.msg_id for r in rows],
+        'message': 'Messages queued for transmission'
+    }, status=201)
+
+
+# ---------- ESP32 TX pulls one pending ----------
+def _queue(target, now):
+    """
+    Due messages of one queue in send order: a range scan on idx_tx_queue
+    (target, status, -priority, timestamp); take .first() for the head.
+    """
+    return (Transmission.objects
+            .filter(target=target, status='PENDING', role='TX')
+            .filter(Q(not_before__isnull=True) | Q(not_before__lte=now))
+            .order_by('-priority', 'timestamp'))
+
+
+def _next_pending(target, now):
+    return _queue(target, now).first()
+
+
+def _poll_queues(params):
+    """Queues a poll covers: the gateway's own, its groups', then the shared one."""
+    gateway = (params.get('gateway') or '').strip()
+    groups = [g.strip() for g in (params.get('groups') or '').split(',') if g.strip()]
+    return list(dict.fromkeys([gateway, *groups, '']))
+
+
+def _claim_fields(now):
+    """UPDATE that takes a PENDING head for this poller (applied with status='PENDING')."""
+    return {
+        'status': 'INFLIGHT',
+        'attempts': F('attempts') + 1,
+        'ack_deadline': now + ACK_TIMEOUT,
+        'pulled_at': now,
+        'msg_id': Coalesce('msg_id', 'id'),  # backwards compatibility for rows without msg_id
+    }
+
+
+def _pending_payload(pending):
+    pending.msg_id = pending.msg_id or pending.id
+    pending.attempts += 1
+    return {
         'id': pending.id,
         'msg_id': pending.msg_id,  # Include msg_id in response
         'message': pending.message,
+        'target': pending.target,
+        'priority': pending.priority,
+        'attempt': pending.attempts,
         'timestamp': pending.timestamp.isoformat() if pending.timestamp else None,
-    }, status=200)
+    }
+
+
+@api_view(['GET'])
+def tx_pending(request):
+    """
+    GET /api/tx/pending/?gateway=GW01&groups=north,coast
+
+    A gateway polls its own queue, the queues of any groups it belongs to,
+    and the shared untargeted queue. Each queue is one indexed probe, so a
+    poll costs the same however many other gateways are queued for.
+    Without parameters this is the legacy global (untargeted) queue.
+    """
+    return Response(claim_next(request.query_params), status=200)
+
+
+def claim_next(params):
+    """Claim the next message for a poll with `params`; the response body (see tx_pending)."""
+    queues = _poll_queues(params)
+    # Claim the head as INFLIGHT so other pollers skip it until it is ACKed
+    # or the sweeper (api.sweeper.sweep_tx) re-queues it after ACK_TIMEOUT.
+    # A lost race just means trying the next head.
+    for _ in range(3):
+        now = timezone.now()
+        heads = [p for p in (_next_pending(t, now) for t in queues) if p is not None]
+        if not heads:
+            break
+        pending = min(heads, key=lambda p: (-p.priority, p.timestamp))
+        claimed = changelog.update(Transmission.objects.filter(pk=pending.pk, status='PENDING'), **_claim_fields(now))
+        if claimed:
+            return _pending_payload(pending)
+    return {'status': 'no_messages', 'message': None}
 
 
 # ---------- ESP32 RX posts received ----------
+def _ack_updates(msg_id, now):
+    """
+    (queryset, fields) updates that mark the TX acknowledged by an RX, tried
+    in order until one matches: by msg_id first, then by id (backwards
+    compatibility for TX rows without msg_id). `now` is the RX's received_at,
+    so a replay can find the rows it acknowledged (see _rx_replay_body).
+    """
+    open_tx = Transmission.objects.filter(role='TX', status__in=('PENDING', 'INFLIGHT'))
+    sent = {'status': 'SENT', 'sent_at': now, 'ack_deadline': None}
+    return [
+        (open_tx.filter(msg_id=msg_id), sent),
+        (open_tx.filter(id=msg_id), {**sent, 'msg_id': msg_id}),  # Set msg_id if it was missing
+    ]
+
+
+def _rx_body(rx_id, updated):
+    return {'status': 'ok', 'id': rx_id, 'message': 'Message received and logged', 'tx_updated': updated}
+
+
+def _rx_replay_body(rx):
+    """
+    The response of the call that stored `rx`, rebuilt for a retry that
+    missed the replay cache: the TX rows it acknowledged carry its msg_id
+    and got sent_at == rx.received_at.
+    """
+    updated = 0
+    if rx.msg_id is not None:
+        updated = Transmission.objects.filter(role='TX', msg_id=rx.msg_id, sent_at=rx.received_at).count()
+    return _rx_body(rx.id, updated)
+
+
 @api_view(['POST'])
 def rx_message(request):
     """
@@ -72,70 +268,86 @@ def rx_message(request):
     1. Logs the received RF message as an RX record (for the Dashboard).
     2. Marks the matching TX message as SENT (to stop TX from retrying).
     """
-    msg = (request.data.get('message') or "").strip()
-    dev = request.data.get('device', 'RX001')
-    msg_id = request.data.get('msg_id')
+    data, status_code, replayed = record_rx(request, request.data)
+    return Response(data, status=status_code, headers={'Idempotent-Replayed': 'true'} if replayed else None)
+
+
+def record_rx(request, data):
+    """
+    The work of rx_message for a parsed body `data`. Returns (body, status,
+    replayed); shared with the async and lean device views (api.async_views,
+    api.device_views).
+    """
+    msg = (data.get('message') or "").strip()
+    dev = data.get('device', 'RX001')
+    msg_id = data.get('msg_id')
 
     if not msg:
-        return Response({'error': 'Message cannot be empty'}, status=400)
-
-    # STEP 1: Create RX record showing we received this message
-    rx = Transmission.objects.create(
-        device=dev,
-        role='RX',
-        message=msg,
-        msg_id=msg_id,
-        status='RECEIVED',
-        received_at=timezone.now()
-    )
-    
-    print(f"📥 RX received msg_id={msg_id}: {msg[:50]}")
+        return {'error': 'Message cannot be empty'}, 400, False
 
-    # STEP 2: Mark the matching TX message as SENT (so TX stops retrying)
-    updated = 0
-    if msg_id is not None:
-        try:
-            msg_id_int = int(msg_id)
-            
-            # Try matching by msg_id first
-            updated = Transmission.objects.filter(
-                role='TX',
-                status='PENDING',
-                msg_id=msg_id_int
-            ).update(
-                status='SENT',
-                sent_at=timezone.now()
+    # STEP 0: A retried POST (lost HTTP response) replays the original answer
+    key = idempotency_key(request, dev, msg_id, 'rx', data.get('device_time'))
+    hit = replay('rx', key)
+    if hit:
+        return hit[0], hit[1], True
+
+    # STEP 1: Create RX record showing we received this message, and
+    # STEP 2: mark the matching TX message as SENT (so TX stops retrying),
+    # in one transaction so a duplicate that waited on the key sees both
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            rx = Transmission.objects.create(
+                device=dev,
+                role='RX',
+                message=msg,
+                msg_id=msg_id,
+                status='RECEIVED',
+                received_at=now,
+                idempotency_key=key,
             )
-            
-            # If msg_id didn't work, try matching by id (backwards compatibility)
-            if updated == 0:
-                updated = Transmission.objects.filter(
-                    role='TX',
-                    status='PENDING',
-                    id=msg_id_int
-                ).update(
-                    status='SENT',
-                    sent_at=timezone.now(),
-                    msg_id=msg_id_int  # Set msg_id if it was missing
-                )
-            
-            if updated > 0:
-                print(f"✅ Marked TX message #{msg_id_int} as SENT (RX confirmed)")
-            else:
-                print(f"⚠️ No matching PENDING TX found for msg_id={msg_id_int}")
-                # Debug: Show what TX records exist
-                all_tx = Transmission.objects.filter(role='TX').values('id', 'msg_id', 'status')[:5]
-                print(f"   Recent TX records: {list(all_tx)}")
-                
-        except (TypeError, ValueError) as e:
-            print(f"⚠️ Invalid msg_id format: {msg_id} - {e}")
+            changelog.inserted([rx])
+            event("rx.received", id=rx.id, msg_id=msg_id, device=dev, text=msg[:50])
+            updated = _ack_tx(msg_id, dev, now)
+    except IntegrityError:
+        if not key:
+            raise
+        # Duplicate that missed the cache (other worker / evicted): the unique
+        # key already points at the original row
+        body = _rx_replay_body(Transmission.objects.get(idempotency_key=key))
+        remember('rx', key, body, 201)
+        return body, 201, True
+
+    body = _rx_body(rx.id, updated)
+    remember('rx', key, body, 201)
+    return body, 201, False
+
+
+def _ack_tx(msg_id, dev, now):
+    """Mark the TX acknowledged by an RX with `msg_id` as SENT; returns the rows updated."""
+    if msg_id is None:
+        return 0
+    try:
+        msg_id_int = int(msg_id)
+    except (TypeError, ValueError) as e:
+        event("rx.bad_msg_id", logging.WARNING, msg_id=msg_id, device=dev, error=str(e))
+        return 0
 
-    return Response({
-        'status': 'ok',
-        'id': rx.id,
-        'message': 'Message received and logged',
-        'tx_updated': updated
-    }, status=201)
+    updated = 0
+    for match, fields in _ack_updates(msg_id_int, now):
+        updated = changelog.update(match, **fields)
+        if updated:
+            break
+
+    if updated > 0:
+        event("tx.acked", msg_id=msg_id_int, device=dev)
+    else:
+        event("rx.unmatched", logging.WARNING, msg_id=msg_id_int, device=dev)
+        if eventlog.enabled(logging.DEBUG):
+            # Debug: Show what TX records exist (an extra query, so only at DEBUG)
+            all_tx = Transmission.objects.filter(role='TX').values('id', 'msg_id', 'status')[:5]
+            event("rx.unmatched.recent_tx", logging.DEBUG, msg_id=msg_id_int, recent=list(all_tx))
+    return updated
 
 
 # ---------- List recent messages ----------
@@ -143,6 +355,7 @@ def rx_message(request):
 def list_messages(request):
     role = request.query_params.get('role')
     status_filter = request.query_params.get('status')
+    q = (request.query_params.get('q') or '').strip()
 
     raw_limit = request.query_params.get('limit', 50)
     try:
@@ -162,6 +375,9 @@ def list_messages(request):
         if status_filter:
             qs = qs.filter(status=str(status_filter).upper().strip())
 
+        if q:
+            qs = qs.filter(search.message_filter(Transmission, q))
+
         qs = qs.order_by('-timestamp')[:limit]
         data = TransmissionSerializer(qs, many=True).data
         return Response(data, status=200)
@@ -169,76 +385,8 @@ def list_messages(request):
     except Exception as e:
         return Response({'detail': f'messages endpoint error: {str(e)}'}, status=400)
 
-# ---------- Stats for dashboards ----------
-@api_view(['GET'])
-def stats(request):
-    try:
-        today = timezone.now().date()
-        qs = Transmission.objects.all()
-
-        total_messages = qs.count()
-        sent_today = qs.filter(role='TX', timestamp__date=today).count()
-        received_today = qs.filter(role='RX', timestamp__date=today).count()
-
-        pending_tx = qs.filter(role='TX').filter(
-            Q(status='PENDING') | Q(status__isnull=True)
-        ).count()
-
-        by_role = dict(qs.values('role').annotate(count=Count('id')).values_list('role', 'count'))
-        by_status = dict(qs.values('status').annotate(count=Count('id')).values_list('status', 'count'))
-
-        return Response({
-            'total_messages': total_messages,
-            'sent_today': sent_today,
-            'received_today': received_today,
-            'pending_tx': pending_tx,
-            'by_role': by_role,
-            'by_status': by_status,
-        }, status=200)
-
-    except Exception as e:
-        return Response({'detail': f'stats endpoint error: {str(e)}'}, status=400)
-
 # ================== NEW: Repeater Endpoints ==================
 
-@api_view(['POST'])
-def repeater_activity(request):
-    try:
-        ser = RepeaterActivityCreateSerializer(data=request.data)
-        ser.is_valid(raise_exception=True)
-        data = ser.validated_data
-
-        device, _ = RepeaterDevice.objects.get_or_create(device=data['device'])
-
-        activity = RepeaterActivity.objects.create(
-            device=device,
-            msg_id=data['msg_id'],
-            message=data['message'],
-            action=data['action'],
-            voltage=data.get('voltage'),
-            signal_strength=data.get('signal_strength'),
-            tx_power=data.get('tx_power'),
-            rx_total=data['stats']['rx_total'],
-            tx_total=data['stats']['tx_total'],
-            failed=data['stats']['failed'],
-        )
-
-        status_obj, _ = RepeaterStatus.objects.get_or_create(device=device)
-        status_obj.last_seen = timezone.now()
-        if data.get('voltage') is not None: status_obj.voltage = data.get('voltage')
-        if data.get('signal_strength') is not None: status_obj.signal_strength = data.get('signal_strength')
-        if data.get('tx_power') is not None: status_obj.tx_power = data.get('tx_power')
-        status_obj.rx_total = data['stats']['rx_total']
-        status_obj.tx_total = data['stats']['tx_total']
-        status_obj.failed = data['stats']['failed']
-        status_obj.uptime_seconds = (status_obj.uptime_seconds or 0) + 2
-        status_obj.save()
-
-        return Response({'status': 'success', 'activity_id': activity.id, 'timestamp': activity.timestamp.isoformat()})
-    except Exception as e:
-        return Response({'status': 'error', 'message': str(e)}, status=400)
-
-
 @api_view(['GET'])
 def repeater_status(request):
     device_id = request.GET.get('device')
@@ -421,41 +569,12 @@ def repeater_config(request):
 def repeater_activity(request):
     """
     POST  /api/repeater/activity/   (called by ESP32 repeater)
-    GET   /api/repeater/activity/?limit=50   (optional: list recent events)
+    GET   /api/repeater/activity/?limit=50&q=text   (optional: list recent events)
     """
 
     if request.method == "POST":
-        device = request.data.get("device", "RPT001")
-        msg_id = request.data.get("msg_id")
-        message = (request.data.get("message") or "").strip()
-        action = (request.data.get("action") or "received").lower().strip()
-
-        if action not in ("received", "retransmitted"):
-            action = "received"
-
-        # optional nested stats dict
-        stats_payload = request.data.get("stats") or {}
-        rx_total = stats_payload.get("rx_total")
-        tx_total = stats_payload.get("tx_total")
-        failed = stats_payload.get("failed")
-
-        activity = RepeaterActivity.objects.create(
-            device=device,
-            msg_id=msg_id,
-            message=message,
-            action=action,
-            voltage=request.data.get("voltage"),
-            signal_strength=request.data.get("signal_strength"),
-            tx_power=request.data.get("tx_power"),
-            rx_total=rx_total,
-            tx_total=tx_total,
-            failed=failed,
-        )
-
-        return Response(
-            {"status": "success", "activity_id": activity.id, "timestamp": activity.timestamp},
-            status=201,
-        )
+        data, status_code, replayed = record_repeater_activity(request, request.data)
+        return Response(data, status=status_code, headers={"Idempotent-Replayed": "true"} if replayed else None)
 
     # GET: list recent activity
     raw_limit = request.query_params.get("limit", 50)
@@ -465,34 +584,94 @@ def repeater_activity(request):
         limit = 50
     limit = max(1, min(limit, 500))
 
-    qs = RepeaterActivity.objects.all().order_by("-timestamp")[:limit]
+    qs = RepeaterActivity.objects.all()
+    q = (request.query_params.get("q") or "").strip()
+    if q:
+        qs = qs.filter(search.message_filter(RepeaterActivity, q))
+    qs = qs.order_by("-timestamp")[:limit]
     data = RepeaterActivitySerializer(qs, many=True).data
     return Response(data, status=200)
 
+
+def record_repeater_activity(request, data):
+    """
+    The POST work of repeater_activity for a parsed body `data`. Returns
+    (body, status, replayed); shared with the lean device view (api.device_views).
+    """
+    device = data.get("device", "RPT001")
+    msg_id = data.get("msg_id")
+    message = (data.get("message") or "").strip()
+    action = (data.get("action") or "received").lower().strip()
+
+    if action not in ("received", "retransmitted"):
+        action = "received"
+
+    # optional nested stats dict
+    stats_payload = data.get("stats") or {}
+    rx_total = stats_payload.get("rx_total")
+    tx_total = stats_payload.get("tx_total")
+    failed = stats_payload.get("failed")
+
+    key = idempotency_key(request, device, msg_id, action, data.get("device_time"))
+    hit = replay("activity", key)
+    if hit:
+        return hit[0], hit[1], True
+
+    replayed = False
+    try:
+        with transaction.atomic():
+            activity = RepeaterActivity.objects.create(
+                device=device,
+                msg_id=msg_id,
+                message=message,
+                action=action,
+                voltage=data.get("voltage"),
+                signal_strength=data.get("signal_strength"),
+                tx_power=data.get("tx_power"),
+                rx_total=rx_total,
+                tx_total=tx_total,
+                failed=failed,
+                idempotency_key=key,
+            )
+            changelog.inserted([activity])
+    except IntegrityError:
+        if not key:
+            raise
+        activity = RepeaterActivity.objects.get(idempotency_key=key)
+        replayed = True
+
+    body = {"status": "success", "activity_id": activity.id, "timestamp": activity.timestamp}
+    remember("activity", key, body, 201)
+    return body, 201, replayed
+
+# ---------- Stats for dashboards ----------
 @api_view(['GET'])
 def stats(request):
     try:
         today = timezone.now().date()
         qs = Transmission.objects.all()
+        exact = wants_exact(request)
 
-        total_messages = qs.count()
+        total_messages = qs.count() if exact else estimated_count(Transmission)
         sent_today = qs.filter(role='TX', timestamp__date=today).count()
         received_today = qs.filter(role='RX', timestamp__date=today).count()
 
         pending_tx = qs.filter(role='TX').filter(
-            Q(status='PENDING') | Q(status__isnull=True)
+            Q(status__in=('PENDING', 'INFLIGHT')) | Q(status__isnull=True)
         ).count()
 
         by_role = dict(qs.values('role').annotate(count=Count('id')).values_list('role', 'count'))
         by_status = dict(qs.values('status').annotate(count=Count('id')).values_list('status', 'count'))
 
-        # NEW: repeater summary
-        rpt_qs = RepeaterActivity.objects.all()
-        repeater = {
-            "events": rpt_qs.count(),
-            "received": rpt_qs.filter(action="received").count(),
-            "retransmitted": rpt_qs.filter(action="retransmitted").count(),
-        }
+        # NEW: repeater summary (null where api.RepeaterActivity has no table, see api.tables)
+        repeater = None
+        if tables.exists(RepeaterActivity):
+            rpt_qs = RepeaterActivity.objects.all()
+            repeater = {
+                "events": rpt_qs.count() if exact else estimated_count(RepeaterActivity),
+                "received": rpt_qs.filter(action="received").count(),
+                "retransmitted": rpt_qs.filter(action="retransmitted").count(),
+            }
 
         return Response({
             'total_messages': total_messages,
@@ -502,7 +681,72 @@ def stats(request):
             'by_role': by_role,
             'by_status': by_status,
             'repeater': repeater,
+            'rate_limited': ratelimit.rejected_counts(),
+            'log_dropped': eventlog.dropped(),
+            'exact': exact,
         }, status=200)
 
     except Exception as e:
         return Response({'detail': f'stats endpoint error: {str(e)}'}, status=400)
+
+
+# ---------- Delivery latency percentiles ----------
+LATENCY_PERIODS = {"1h": timedelta(hours=1), "24h": timedelta(hours=24), "7d": timedelta(days=7), "30d": timedelta(days=30)}
+
+
+@api_view(['GET'])
+def delivery_latency(request):
+    """
+    GET /api/latency/?period=24h&device=GW01&hop=total,air
+    GET /api/latency/?start=<iso>&end=<iso>
+
+    Percentiles per delivery hop, merged from the hourly sketches written by
+    manage.py rollup_latency (see api.latency); raw messages are not read.
+    """
+    now = timezone.now()
+    period = request.GET.get('period', '24h')
+    start = parse_datetime(request.GET.get('start') or '')
+    end = parse_datetime(request.GET.get('end') or '') or now
+    if start is None:
+        period = period if period in LATENCY_PERIODS else '24h'
+        start = end - LATENCY_PERIODS[period]
+    else:
+        period = None
+    hops = [h for h in (request.GET.get('hop') or '').split(',') if h] or list(latency.HOPS)
+    unknown = set(hops) - set(latency.HOPS)
+    if unknown:
+        return Response({'error': f"unknown hop: {', '.join(sorted(unknown))}", 'hops': latency.HOPS}, status=400)
+    device = request.GET.get('device')
+    return Response({
+        'device': device,
+        'period': period,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'accuracy': latency.ACCURACY,
+        'hops': latency.percentiles(start, end, device, hops),
+    })
+
+
+# ---------- Change log for downstream consumers ----------
+@api_view(['GET'])
+def changes(request):
+    """
+    GET /api/changes/?after=1200&limit=500&source=api.transmission
+
+    The next batch of the change log (see api.changelog) after offset
+    `after`. Pass the returned `next` as `after` to continue; an empty batch
+    means the consumer is caught up.
+    """
+    try:
+        after = int(request.query_params.get('after', 0))
+        limit = int(request.query_params.get('limit', changelog.BATCH_SIZE))
+    except (TypeError, ValueError):
+        return Response({'error': 'after and limit must be integers'}, status=400)
+    limit = max(1, min(limit, 5000))
+    sources = [s for s in (request.query_params.get('source') or '').split(',') if s]
+    batch = changelog.read(after, limit, sources)
+    return Response({
+        'changes': [changelog.as_dict(e) for e in batch],
+        'next': batch[-1].id if batch else after,
+        'enabled': changelog.enabled(),
+    })
@@ -0,0 +1,16 @@
+# gunicorn -c gunicorn.conf.py telecom_backend.wsgi
+# Imports and URL compilation happen once in the master (see telecom_backend.warmup);
+# each worker then opens its own connections and fills its caches before serving.
+preload_app = True
+
+
+def pre_fork(server, worker):
+    # connections opened while preloading must not be shared with the children
+    from django.db import connections
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    # each step's timing is logged by the telecom_backend logger (settings.LOGGING)
+    from telecom_backend import warmup
+    warmup.run(warmup.WORKER_STEPS)
@@ -1,19 +1,58 @@
 
 from django.contrib import admin
-from .models import RepeaterDevice, RepeaterStatus, RepeaterActivity
+from django.db.models import Q
+from .auth import forget_device
+from api import search
+from . import config
+from api.pagination import EstimatedCountPaginator
+from .models import RepeaterDevice, RepeaterStatus, RepeaterActivity, RepeaterSession, RepeaterConfig
 
 @admin.register(RepeaterDevice)
 class RepeaterDeviceAdmin(admin.ModelAdmin):
-    list_display = ("device", "friendly_name", "enabled", "created_at", "updated_at")
+    list_display = ("device", "friendly_name", "enabled", "config_version", "created_at", "updated_at")
     search_fields = ("device", "friendly_name")
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        forget_device(obj.device)
+
 @admin.register(RepeaterStatus)
 class RepeaterStatusAdmin(admin.ModelAdmin):
-    list_display = ("device", "last_seen", "voltage", "signal_strength", "tx_power", "rx_total", "tx_total", "failed", "uptime_seconds")
+    list_display = ("device", "last_seen", "voltage", "signal_strength", "tx_power", "rx_total", "tx_total", "failed", "uptime_seconds", "activity_count")
     search_fields = ("device__device",)
 
 @admin.register(RepeaterActivity)
 class RepeaterActivityAdmin(admin.ModelAdmin):
     list_display = ("device", "msg_id", "action", "timestamp", "signal_strength", "tx_power", "rx_total", "tx_total", "failed")
     list_filter = ("action", "device")
-    search_fields = ("device__device", "message")
+    search_fields = ("device__device", "body__text")
+    # no COUNT(*) over the whole table on every changelist page
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        # message text goes through the full-text index instead of LIKE '%...%'
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        match = search.message_filter(RepeaterActivity, search_term) | Q(device__device__icontains=search_term)
+        return queryset.filter(match), False
+
+@admin.register(RepeaterSession)
+class RepeaterSessionAdmin(admin.ModelAdmin):
+    list_display = ("device", "started_at", "ended_at")
+    list_filter = ("device",)
+
+@admin.register(RepeaterConfig)
+class RepeaterConfigAdmin(admin.ModelAdmin):
+    list_display = ("device", "version", "hash", "created_at")
+    search_fields = ("device__device",)
+    fields = ("device", "config")
+
+    def has_change_permission(self, request, obj=None):
+        return False  # versions are immutable; add a new one instead
+
+    def save_model(self, request, obj, form, change):
+        # goes through publish() so the version and device hash stay consistent
+        published = config.publish(obj.device_id, obj.config)
+        obj.pk, obj.version, obj.hash = published.pk, published.version, published.hash
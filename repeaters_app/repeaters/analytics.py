@@ -0,0 +1,93 @@
+"""
+Analytics copy of repeater activity.
+
+When REPEATER_ANALYTICS_DB names a database alias, `sync()` (manage.py
+sync_analytics) copies new activity rows into ActivityFact there, in id order
+from a high-water mark, so dashboards read a separate database with wider
+indexes instead of competing with ESP32 ingest. Activity ids only grow, across
+shards too (see repeaters.shards), so one mark covers every source table.
+
+Metrics and history read through `activity_querysets()`: the analytics copy
+while its last completed pass is within REPEATER_ANALYTICS_MAX_LAG_SECONDS,
+the primary tables otherwise. AnalyticsRouter (repeaters.routers) keeps the
+analytics models in that database.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import shards
+from .models import ActivityFact, EtlWatermark
+
+SOURCE = "repeater_activity"
+MAX_LAG = timedelta(seconds=getattr(settings, "REPEATER_ANALYTICS_MAX_LAG_SECONDS", 60))
+# rows younger than this are left for the next pass, so a slow ingest transaction
+# holding a lower id cannot commit behind the mark
+SETTLE = timedelta(seconds=getattr(settings, "REPEATER_ANALYTICS_SETTLE_SECONDS", 5))
+BATCH_SIZE = 2000
+
+FACT_FIELDS = ("msg_id", "message", "action", "voltage", "signal_strength", "tx_power",
+               "rx_total", "tx_total", "failed", "timestamp")
+
+
+def alias():
+    """The analytics database alias, or None when the feature is off."""
+    return getattr(settings, "REPEATER_ANALYTICS_DB", None)
+
+
+def _fact(activity):
+    fact = ActivityFact(id=activity.id, device_id=activity.device_id, friendly_name=activity.device.friendly_name)
+    for name in FACT_FIELDS:
+        setattr(fact, name, getattr(activity, name))
+    return fact
+
+
+def sync(batch_size=BATCH_SIZE, now=None):
+    """Copy activity past the high-water mark into the analytics database. Returns rows copied."""
+    target = alias()
+    if not target:
+        return 0
+    cutoff = (now or timezone.now()) - SETTLE
+    mark, _ = EtlWatermark.objects.using(target).get_or_create(name=SOURCE)
+    copied = 0
+    for qs in shards.querysets():
+        while True:
+            batch = list(qs.filter(id__gt=mark.high_water).select_related("device").order_by("id")[:batch_size])
+            ready = []
+            for activity in batch:
+                if activity.timestamp > cutoff:
+                    break
+                ready.append(activity)
+            if ready:
+                with transaction.atomic(using=target):
+                    ActivityFact.objects.using(target).bulk_create([_fact(a) for a in ready], ignore_conflicts=True)
+                    mark.high_water = ready[-1].id
+                    mark.save(using=target, update_fields=["high_water"])
+                copied += len(ready)
+            if len(ready) < batch_size:
+                break
+        if len(ready) < len(batch):
+            break  # stopped at unsettled rows; newer tables can only be newer
+    mark.synced_at = cutoff
+    mark.save(using=target, update_fields=["synced_at"])
+    return copied
+
+
+def read_alias(now=None):
+    """Analytics alias if its copy is fresh enough to serve reads, else None."""
+    target = alias()
+    if not target:
+        return None
+    synced_at = EtlWatermark.objects.using(target).filter(name=SOURCE).values_list("synced_at", flat=True).first()
+    if synced_at is None or (now or timezone.now()) - synced_at > MAX_LAG:
+        return None
+    return target
+
+
+def activity_querysets(start=None, end=None):
+    """Like shards.querysets(), served from the analytics copy when it is fresh."""
+    target = read_alias()
+    if target:
+        return [ActivityFact.objects.using(target).all()]
+    return shards.querysets(start, end)
@@ -1,7 +1,17 @@
 
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 class RepeatersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "repeaters"
     verbose_name = "RF Repeaters"
+
+    def ready(self):
+        post_migrate.connect(_install_search, sender=self)
+
+
+def _install_search(sender, using="default", **kwargs):
+    from api import search
+    from .models import MessageBody
+    search.install(MessageBody, using=using)
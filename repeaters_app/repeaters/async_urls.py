@@ -0,0 +1,7 @@
+from django.urls import path
+from .async_views import repeater_activity
+
+# ASGI deployments: include before repeaters.urls so devices hit the async view
+urlpatterns = [
+    path("api/repeater/activity/", repeater_activity, name="repeater_activity_async"),
+]
@@ -0,0 +1,43 @@
+"""
+Async version of the repeater activity POST, for ASGI deployments (mount
+repeaters.async_urls before repeaters.urls).
+
+Parsing and validation run on the event loop. The device lookup, the
+idempotency cache and the ingest transaction (repeaters.views.record) are one
+short blocking section handed to the thread pool, since Django's async ORM
+has no transactions. Responses match RepeaterActivityView.
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.device_views import loads
+from .serializers import RepeaterActivityCreateSerializer
+from . import views
+
+
+@csrf_exempt
+@require_POST
+async def repeater_activity(request):
+    body = loads(request.body)
+    if body is None:
+        return JsonResponse({"detail": "Invalid JSON"}, status=400)
+    payload, status, replayed = await record(request, body)
+    return JsonResponse(payload, status=status, headers={"Idempotent-Replayed": "true"} if replayed else None)
+
+
+async def record(request, body):
+    """
+    Validate one activity, then authenticate and ingest it (repeaters.views.record)
+    in the thread pool. Returns (payload, status, replayed); shared with the
+    WebSocket gateway (telecom_backend.gateway).
+    """
+    serializer = RepeaterActivityCreateSerializer(data=body)
+    if not serializer.is_valid():
+        return serializer.errors, 400, False
+    try:
+        return await sync_to_async(views.record)(request, serializer.validated_data)
+    except AuthenticationFailed as exc:
+        return {"detail": str(exc.detail)}, exc.status_code, False
@@ -1,9 +1,16 @@
 
 import hmac, hashlib
+from django.core.cache import cache
 from django.utils.deprecation import MiddlewareMixin
 from rest_framework.exceptions import AuthenticationFailed
 from .models import RepeaterDevice
 
+# Devices and verified keys are cached briefly so the ingest path skips the
+# device SELECT and the PBKDF2 check on every event. Edits made through the
+# admin or the management command call forget_device(); anything else is
+# picked up within DEVICE_CACHE_TTL seconds.
+DEVICE_CACHE_TTL = 60
+
 def verify_api_key(device: RepeaterDevice, presented_key: str) -> bool:
     if not device.api_key_hash or not device.salt:
         # If no key set, allow (useful for POC)
@@ -11,15 +18,43 @@ def verify_api_key(device: RepeaterDevice, presented_key: str) -> bool:
     dk = hashlib.pbkdf2_hmac('sha256', presented_key.encode('utf-8'), bytes.fromhex(device.salt), 120000, dklen=32).hex()
     return hmac.compare_digest(dk, device.api_key_hash)
 
+def get_device(device_id: str) -> RepeaterDevice:
+    device = cache.get(f"rptdev:{device_id}")
+    if device is None:
+        device = RepeaterDevice.objects.get(pk=device_id)  # DoesNotExist propagates
+        cache.set(f"rptdev:{device_id}", device, DEVICE_CACHE_TTL)
+    return device
+
+def warm_devices(limit: int) -> int:
+    # worker start-up (telecom_backend.warmup): one query instead of one per first event
+    devices = list(RepeaterDevice.objects.order_by("-updated_at")[:limit])
+    cache.set_many({f"rptdev:{d.device}": d for d in devices}, DEVICE_CACHE_TTL)
+    return len(devices)
+
+def forget_device(device_id: str):
+    cache.delete(f"rptdev:{device_id}")
+
+def _verified(device: RepeaterDevice, presented_key: str) -> bool:
+    if not device.api_key_hash or not device.salt:
+        return True
+    # keyed on the stored hash too, so rotating the key invalidates it
+    memo = "rptkey:" + hashlib.sha256(f"{device.device}|{device.api_key_hash}|{presented_key}".encode('utf-8')).hexdigest()
+    if cache.get(memo):
+        return True
+    ok = verify_api_key(device, presented_key)
+    if ok:
+        cache.set(memo, True, DEVICE_CACHE_TTL)
+    return ok
+
 def require_device_key(request, device_id: str):
     # Header names: X-Device and X-Device-Key (or 'device' in JSON body for POSTs)
     key = request.headers.get("X-Device-Key") or request.META.get("HTTP_X_DEVICE_KEY")
     device = None
     try:
-        device = RepeaterDevice.objects.get(pk=device_id)
+        device = get_device(device_id)
     except RepeaterDevice.DoesNotExist:
         raise AuthenticationFailed("Unknown device")
-    if not verify_api_key(device, key or ""):
+    if not _verified(device, key or ""):
         raise AuthenticationFailed("Invalid device key")
     if not device.enabled:
         raise AuthenticationFailed("Device disabled")
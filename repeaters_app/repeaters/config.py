@@ -0,0 +1,62 @@
+"""
+Versioned device configuration.
+
+Publishing a config stores a new RepeaterConfig version and records its
+content hash on the device. Devices learn about changes for free: the hash is
+in every activity response (the device row is already cached for auth), and
+they fetch GET /api/repeater/config/ with If-None-Match only when it differs,
+getting 304 while nothing changed.
+"""
+import hashlib
+import json
+
+from django.db import transaction
+from django.utils import timezone
+
+from .auth import forget_device
+from .models import RepeaterConfig, RepeaterDevice
+
+
+def config_hash(config):
+    """Short content hash of a config; key order and whitespace do not matter."""
+    canonical = json.dumps(config, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+def publish(device_id, config):
+    """
+    Make `config` the device's current configuration. Publishing the current
+    content again is a no-op. Returns the current RepeaterConfig.
+    """
+    digest = config_hash(config)
+    with transaction.atomic():
+        device = RepeaterDevice.objects.select_for_update().get(pk=device_id)
+        if device.config_version and device.config_hash == digest:
+            return device.configs.get(version=device.config_version)
+        version = device.config_version + 1
+        current = RepeaterConfig.objects.create(device=device, version=version, config=config, hash=digest)
+        RepeaterDevice.objects.filter(pk=device.pk).update(
+            config_version=version, config_hash=digest, updated_at=timezone.now())
+    forget_device(device_id)
+    return current
+
+
+def current(device):
+    """The device's current RepeaterConfig, or None if none was published."""
+    if not device.config_version:
+        return None
+    return device.configs.filter(version=device.config_version).first()
+
+
+def etag(digest):
+    return f'"{digest}"'
+
+
+def matches(if_none_match, digest):
+    """True if an If-None-Match header value names `digest`."""
+    if not if_none_match or not digest:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return any(t.removeprefix("W/").strip('"') == digest for t in tags)
@@ -0,0 +1,151 @@
+"""
+Lean repeater activity POST, without DRF (served under the device URL
+prefix, see api.device_views and telecom_backend.device_urls).
+
+`validate_activity` is a hand-written RepeaterActivityCreateSerializer: the
+same fields, coercions and limits, and the same error messages and shape, so
+devices see identical 400s from either endpoint (the tests check the two
+agree). The rest is RepeaterActivityView's own work (repeaters.views.record),
+and the JSON in and out goes through api.device_views' loads and respond.
+"""
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.device_views import loads, respond
+from .views import record
+
+ACTIONS = ("received", "retransmitted")
+REQUIRED = "This field is required."
+NULL = "This field may not be null."
+_trailing_zeros = re.compile(r"\.0*\s*$")  # as DRF's IntegerField: "42.0" -> 42
+
+
+def _string(value, max_length=None):
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return None, "Not a valid string."
+    value = str(value).strip()
+    if not value:
+        return None, "This field may not be blank."
+    if max_length is not None and len(value) > max_length:
+        return None, f"Ensure this field has no more than {max_length} characters."
+    return value, None
+
+
+def _integer(value, min_value=None, max_value=None):
+    try:
+        value = int(_trailing_zeros.sub("", str(value)))
+    except (TypeError, ValueError):
+        return None, "A valid integer is required."
+    if min_value is not None and value < min_value:
+        return None, f"Ensure this value is greater than or equal to {min_value}."
+    if max_value is not None and value > max_value:
+        return None, f"Ensure this value is less than or equal to {max_value}."
+    return value, None
+
+
+def _decimal(value, max_digits=5, decimal_places=2):
+    if isinstance(value, bool) or len(str(value).strip()) > 1000:
+        return None, "A valid number is required."
+    try:
+        value = Decimal(str(value).strip())
+    except InvalidOperation:
+        return None, "A valid number is required."
+    if not value.is_finite():
+        return None, "A valid number is required."
+    sign, digits, exponent = value.as_tuple()
+    if exponent >= 0:
+        total, places = len(digits) + exponent, 0
+    elif len(digits) > abs(exponent):
+        total, places = len(digits), abs(exponent)
+    else:
+        total, places = abs(exponent), abs(exponent)
+    whole = total - places
+    if total > max_digits:
+        return None, f"Ensure that there are no more than {max_digits} digits in total."
+    if places > decimal_places:
+        return None, f"Ensure that there are no more than {decimal_places} decimal places."
+    if whole > max_digits - decimal_places:
+        return None, f"Ensure that there are no more than {max_digits - decimal_places} digits before the decimal point."
+    return value.quantize(Decimal(1).scaleb(-decimal_places)), None
+
+
+def validate_activity(body):
+    """(validated data, None) or (None, errors) for an activity POST body, as the serializer would."""
+    data, errors = {}, {}
+
+    def field(name, parse, *args, required=True):
+        if name not in body:
+            if required:
+                errors[name] = [REQUIRED]
+            return
+        if body[name] is None:
+            errors[name] = [NULL]
+            return
+        value, error = parse(body[name], *args)
+        if error:
+            errors[name] = [error]
+        else:
+            data[name] = value
+
+    field("device", _string, 20)
+    field("msg_id", _integer)
+    field("message", _string)
+    if "action" not in body:
+        errors["action"] = [REQUIRED]
+    elif body["action"] is None:
+        errors["action"] = [NULL]
+    elif str(body["action"]) not in ACTIONS:
+        errors["action"] = [f'"{body["action"]}" is not a valid choice.']
+    else:
+        data["action"] = str(body["action"])
+    field("voltage", _decimal, required=False)
+    field("signal_strength", _integer, 0, 100, required=False)
+    field("tx_power", _integer, 0, 100, required=False)
+
+    stats = body.get("stats")
+    if "stats" not in body:
+        errors["stats"] = [REQUIRED]
+    elif stats is None:
+        errors["stats"] = [NULL]
+    elif not isinstance(stats, dict):
+        errors["stats"] = {"non_field_errors": [f"Invalid data. Expected a dictionary, but got {type(stats).__name__}."]}
+    else:
+        stat_values, stat_errors = {}, {}
+        for name in ("rx_total", "tx_total", "failed"):
+            if name not in stats or stats[name] is None:
+                stat_errors[name] = [REQUIRED if name not in stats else NULL]
+                continue
+            value, error = _integer(stats[name])
+            if error:
+                stat_errors[name] = [error]
+            else:
+                stat_values[name] = value
+        if stat_errors:
+            errors["stats"] = stat_errors
+        else:
+            data["stats"] = stat_values
+    field("device_time", _string, 32, required=False)
+    return (None, errors) if errors else (data, None)
+
+
+@csrf_exempt
+def repeater_activity(request):
+    """POST /device/repeater/activity/ (see RepeaterActivityView)."""
+    if request.method != "POST":
+        # DRF's wording, as the DRF endpoint answers
+        response = respond({"detail": f'Method "{request.method}" not allowed.'}, 405)
+        response["Allow"] = "POST"
+        return response
+    body = loads(request.body)
+    if body is None:
+        return respond({"detail": "Invalid JSON"}, 400)
+    data, errors = validate_activity(body)
+    if errors:
+        return respond(errors, 400)
+    try:
+        return respond(*record(request, data))
+    except AuthenticationFailed as exc:
+        return respond({"detail": str(exc.detail)}, exc.status_code)
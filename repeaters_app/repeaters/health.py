@@ -0,0 +1,88 @@
+
+"""
+Incremental per-device telemetry health.
+
+Each activity updates an exponentially weighted mean and variance of the
+device's voltage, signal strength and failure delta (growth of the `failed`
+counter since the previous report) stored on RepeaterStatus. Updates are
+O(1) per event, and alert checks read only RepeaterStatus, so they never need
+to rescan RepeaterActivity.
+"""
+import math
+from django.conf import settings
+from django.db.models import Q
+
+ALPHA = getattr(settings, "REPEATER_HEALTH_ALPHA", 0.1)
+
+DEFAULT_THRESHOLDS = {
+    "voltage_min": 11.0,        # V, EWMA below this -> sagging supply
+    "signal_min": 30.0,         # %, EWMA below this -> weak link
+    "fail_rate_max": 0.2,       # failures per event, EWMA above this -> failing relay
+}
+THRESHOLDS = {**DEFAULT_THRESHOLDS, **getattr(settings, "REPEATER_ALERT_THRESHOLDS", {})}
+
+
+def ewma(mean, var, x, alpha=ALPHA):
+    """Fold sample x into an exponentially weighted (mean, variance) pair."""
+    if mean is None:
+        return float(x), 0.0
+    diff = x - mean
+    incr = alpha * diff
+    return mean + incr, (1 - alpha) * ((var or 0.0) + diff * incr)
+
+
+def apply_sample(status, voltage=None, signal_strength=None, failed=None):
+    """
+    Update the running statistics on `status` (a RepeaterStatus) from one
+    activity. Must run before status.failed is overwritten with the new counter.
+    """
+    if voltage is not None:
+        status.voltage_ewma, status.voltage_var = ewma(status.voltage_ewma, status.voltage_var, float(voltage))
+    if signal_strength is not None:
+        status.signal_ewma, status.signal_var = ewma(status.signal_ewma, status.signal_var, float(signal_strength))
+    if failed is not None:
+        previous = status.failed or 0
+        # a counter that went backwards means the repeater rebooted
+        delta = failed - previous if failed >= previous else failed
+        if status.health_samples:
+            status.fail_delta_ewma, status.fail_delta_var = ewma(status.fail_delta_ewma, status.fail_delta_var, float(delta))
+        else:
+            # first report: the counter's absolute value is not a delta
+            status.fail_delta_ewma, status.fail_delta_var = 0.0, 0.0
+    status.health_samples = (status.health_samples or 0) + 1
+
+
+def alert_filter(thresholds):
+    """Q() matching statuses outside any threshold (backed by columns on repeater_status)."""
+    return (
+        Q(voltage_ewma__lt=thresholds["voltage_min"])
+        | Q(signal_ewma__lt=thresholds["signal_min"])
+        | Q(fail_delta_ewma__gt=thresholds["fail_rate_max"])
+    )
+
+
+def describe(status, thresholds):
+    """Reasons a status is in alert, plus its running statistics."""
+    reasons = []
+    if status.voltage_ewma is not None and status.voltage_ewma < thresholds["voltage_min"]:
+        reasons.append("low_voltage")
+    if status.signal_ewma is not None and status.signal_ewma < thresholds["signal_min"]:
+        reasons.append("weak_signal")
+    if status.fail_delta_ewma is not None and status.fail_delta_ewma > thresholds["fail_rate_max"]:
+        reasons.append("failure_rate")
+
+    def stat(mean, var):
+        return {
+            "ewma": round(mean, 3) if mean is not None else None,
+            "stddev": round(math.sqrt(var), 3) if var is not None else None,
+        }
+
+    return {
+        "device": status.device_id,
+        "last_seen": status.last_seen.isoformat(),
+        "reasons": reasons,
+        "voltage": stat(status.voltage_ewma, status.voltage_var),
+        "signal_strength": stat(status.signal_ewma, status.signal_var),
+        "failure_rate": stat(status.fail_delta_ewma, status.fail_delta_var),
+        "samples": status.health_samples,
+    }
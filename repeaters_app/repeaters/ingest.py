@@ -0,0 +1,183 @@
+
+"""
+Repeater activity ingest.
+
+One event is one short transaction with two statements: the activity
+INSERT, and an INSERT ... ON CONFLICT DO UPDATE of the device's
+RepeaterStatus. The upsert's SET clause does the session (repeaters.uptime),
+health (repeaters.health) and activity-count bookkeeping in SQL against the
+existing row, so the status never has to be read first, and only the columns
+the payload carries are assigned. Backends without ON CONFLICT ... RETURNING
+fall back to the ORM read-modify-write using the same Python helpers.
+"""
+from datetime import timezone as dt_timezone
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api import changelog
+from . import health, uptime, shards, recent
+from .models import RepeaterActivity, RepeaterStatus, RepeaterSession
+
+UPSERT_VENDORS = ("sqlite", "postgresql")
+
+
+def record_activity(device, data, idempotency_key=None):
+    """
+    Store one validated activity (RepeaterActivityCreateSerializer data) for
+    `device` and fold it into its status. Returns the stored activity.
+    Raises IntegrityError if idempotency_key was already used.
+    """
+    now = timezone.now()
+    model = shards.for_write(now)  # RepeaterActivity, or this month's shard (see repeaters.shards)
+    with transaction.atomic():
+        activity = model.objects.create(
+            device=device,
+            msg_id=data["msg_id"],
+            message=data["message"],
+            action=data["action"],
+            voltage=data.get("voltage"),
+            signal_strength=data.get("signal_strength"),
+            tx_power=data.get("tx_power"),
+            rx_total=data["stats"]["rx_total"],
+            tx_total=data["stats"]["tx_total"],
+            failed=data["stats"]["failed"],
+            idempotency_key=idempotency_key,
+        )
+        if connection.vendor in UPSERT_VENDORS:
+            closed = _upsert_status(device.pk, data, now)
+        else:
+            closed = _save_status(device, data, now)
+        if closed:
+            RepeaterSession.objects.create(device=device, started_at=closed[0], ended_at=closed[1])
+        recent.record(activity)
+        changelog.inserted([activity], source=RepeaterActivity._meta.label_lower)  # whichever shard holds it
+    return activity
+
+
+def _save_status(device, data, now):
+    """ORM fallback: read, update in Python, save."""
+    status, _ = RepeaterStatus.objects.get_or_create(device=device)
+    closed = uptime.heartbeat(status, now)
+    health.apply_sample(status, data.get("voltage"), data.get("signal_strength"), data["stats"]["failed"])
+    for name in ("voltage", "signal_strength", "tx_power"):
+        if data.get(name) is not None:
+            setattr(status, name, data[name])
+    status.rx_total = data["stats"]["rx_total"]
+    status.tx_total = data["stats"]["tx_total"]
+    status.failed = data["stats"]["failed"]
+    status.activity_count += 1
+    status.save()
+    return closed
+
+
+def _seconds_between(later, earlier):
+    if connection.vendor == "postgresql":
+        return f"EXTRACT(EPOCH FROM ({later} - {earlier}))"
+    return f"((julianday({later}) - julianday({earlier})) * 86400.0)"
+
+
+def _floor_int(expr):
+    if connection.vendor == "postgresql":
+        return f"FLOOR({expr})::integer"
+    return f"CAST({expr} AS INTEGER)"  # truncation == floor for the non-negative gaps used here
+
+
+def _ewma_sql(t, mean, var, x, alpha, first=None):
+    """SET fragments mirroring health.ewma(); `first` is an optional reset condition."""
+    reset = f"WHEN {first} THEN 0.0 " if first else ""
+    return [
+        f"{mean} = CASE {reset}WHEN {t}.{mean} IS NULL THEN {x} "
+        f"ELSE {t}.{mean} + {alpha} * ({x} - {t}.{mean}) END",
+        f"{var} = CASE {reset}WHEN {t}.{mean} IS NULL THEN 0.0 "
+        f"ELSE {1 - alpha} * (COALESCE({t}.{var}, 0.0) + {alpha} * ({x} - {t}.{mean}) * ({x} - {t}.{mean})) END",
+    ]
+
+
+def _as_datetime(value):
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value is not None and timezone.is_naive(value):
+        value = value.replace(tzinfo=dt_timezone.utc)
+    return value
+
+
+def _upsert_status(device_id, data, now):
+    """Single-statement status upsert. Returns the closed session interval, if any."""
+    qn = connection.ops.quote_name
+    t = qn(RepeaterStatus._meta.db_table)
+    fields = {f.column: f for f in RepeaterStatus._meta.concrete_fields}
+    stats = data["stats"]
+    voltage, signal, tx_power = data.get("voltage"), data.get("signal_strength"), data.get("tx_power")
+
+    # row for a device seen for the first time
+    row = {
+        "device_id": device_id,
+        "last_seen": now,
+        "session_started_at": now,
+        "uptime_seconds": 0,
+        "voltage": voltage,
+        "signal_strength": signal,
+        "tx_power": tx_power,
+        "rx_total": stats["rx_total"],
+        "tx_total": stats["tx_total"],
+        "failed": stats["failed"],
+        "voltage_ewma": float(voltage) if voltage is not None else None,
+        "voltage_var": 0.0 if voltage is not None else None,
+        "signal_ewma": float(signal) if signal is not None else None,
+        "signal_var": 0.0 if signal is not None else None,
+        "fail_delta_ewma": 0.0,
+        "fail_delta_var": 0.0,
+        "health_samples": 1,
+        "activity_count": 1,
+        "created_at": now,
+        "updated_at": now,
+    }
+    columns = list(row)
+    params = [fields[c].get_db_prep_save(row[c], connection) for c in columns]
+
+    gap = _seconds_between("excluded.last_seen", f"{t}.last_seen")
+    limit = uptime.SESSION_GAP.total_seconds()
+    closes = f"({t}.session_started_at IS NOT NULL AND {gap} > {limit})"
+    alpha = float(health.ALPHA)
+    fail_delta = f"(CASE WHEN excluded.failed >= {t}.failed THEN excluded.failed - {t}.failed ELSE excluded.failed END)"
+
+    assignments = [
+        "last_seen = excluded.last_seen",
+        f"session_started_at = CASE WHEN {t}.session_started_at IS NULL OR {closes} "
+        f"THEN excluded.last_seen ELSE {t}.session_started_at END",
+        f"uptime_seconds = CASE WHEN {t}.session_started_at IS NULL OR {closes} "
+        f"THEN {t}.uptime_seconds ELSE {t}.uptime_seconds + {_floor_int(gap)} END",
+        f"last_session_started_at = CASE WHEN {closes} THEN {t}.session_started_at ELSE {t}.last_session_started_at END",
+        f"last_session_ended_at = CASE WHEN {closes} THEN {t}.last_seen ELSE {t}.last_session_ended_at END",
+        "rx_total = excluded.rx_total",
+        "tx_total = excluded.tx_total",
+        "failed = excluded.failed",
+        f"health_samples = COALESCE({t}.health_samples, 0) + 1",
+        f"activity_count = COALESCE({t}.activity_count, 0) + 1",
+        "updated_at = excluded.updated_at",
+    ]
+    assignments += _ewma_sql(t, "fail_delta_ewma", "fail_delta_var", fail_delta, alpha,
+                             first=f"COALESCE({t}.health_samples, 0) = 0")
+    if voltage is not None:
+        assignments.append("voltage = excluded.voltage")
+        assignments += _ewma_sql(t, "voltage_ewma", "voltage_var", "excluded.voltage", alpha)
+    if signal is not None:
+        assignments.append("signal_strength = excluded.signal_strength")
+        assignments += _ewma_sql(t, "signal_ewma", "signal_var", "excluded.signal_strength", alpha)
+    if tx_power is not None:
+        assignments.append("tx_power = excluded.tx_power")
+
+    sql = (
+        f"INSERT INTO {t} ({', '.join(qn(c) for c in columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT (device_id) DO UPDATE SET {', '.join(assignments)} "
+        f"RETURNING session_started_at, last_seen, last_session_started_at, last_session_ended_at"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        session_started, last_seen, started, ended = cursor.fetchone()
+    # a session was closed by this event iff a new one opened now and a previous one exists
+    if ended is not None and _as_datetime(session_started) == _as_datetime(last_seen):
+        return _as_datetime(started), _as_datetime(ended)
+    return None
@@ -2,6 +2,7 @@
 from django.core.management.base import BaseCommand
 from repeaters.models import RepeaterDevice
 from repeaters.utils import hash_new_api_key
+from repeaters.auth import forget_device
 import secrets
 
 class Command(BaseCommand):
@@ -32,6 +33,7 @@ class Command(BaseCommand):
                 "enabled": True,
             }
         )
+        forget_device(device_id)
         if created:
             self.stdout.write(self.style.SUCCESS(f"Created device {device_id}"))
         else:
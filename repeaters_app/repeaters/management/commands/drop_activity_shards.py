@@ -0,0 +1,28 @@
+from datetime import datetime, timezone as dt_timezone
+from django.core.management.base import BaseCommand, CommandError
+from repeaters import shards
+
+class Command(BaseCommand):
+    help = "Drop monthly repeater activity shards older than a given month (lists shards without --before)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--before", type=str, help="Drop every shard for a month before this one, e.g. 2026-01")
+        parser.add_argument("--dry-run", action="store_true", help="Only print the shards that would be dropped")
+
+    def handle(self, *args, **opts):
+        months = shards.months()
+        if not opts["before"]:
+            for month in months:
+                self.stdout.write(month.strftime("%Y-%m"))
+            return
+        try:
+            cutoff = datetime.strptime(opts["before"], "%Y-%m").replace(tzinfo=dt_timezone.utc)
+        except ValueError:
+            raise CommandError("--before must look like YYYY-MM")
+
+        for month in months:
+            if month >= cutoff:
+                continue
+            if not opts["dry_run"]:
+                shards.drop(month)
+            self.stdout.write(self.style.WARNING(f"Dropped {month:%Y-%m}") if not opts["dry_run"] else f"Would drop {month:%Y-%m}")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from api import bodies
+from repeaters import shards
+
+class Command(BaseCommand):
+    help = "Move activity tables (base and shards) from a message column onto shared message bodies."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000, help="Rows filled per transaction")
+
+    def handle(self, *args, **opts):
+        for qs in shards.querysets():
+            table = qs.model._meta.db_table
+            filled = bodies.convert(qs.model, batch_size=opts["batch_size"])
+            if filled is None:
+                self.stdout.write(f"{table}: already on message bodies")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{table}: {filled} rows moved to message bodies"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from repeaters import pagination
+
+class Command(BaseCommand):
+    help = "Backfill RepeaterStatus.activity_count from the stored activity (all tables and shards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("devices", nargs="*", help="Device IDs (default: every device with a status)")
+
+    def handle(self, *args, **opts):
+        counts = pagination.recount_activity(opts["devices"] or None)
+        for device, n in counts.items():
+            self.stdout.write(f"{device}: {n}")
+        self.stdout.write(self.style.SUCCESS(f"Recounted {len(counts)} device(s)"))
@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from repeaters import analytics
+
+class Command(BaseCommand):
+    help = "Copy new repeater activity into the analytics database (run once, or forever with --interval)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=0, help="Seconds between passes; 0 runs a single pass")
+        parser.add_argument("--batch-size", type=int, default=analytics.BATCH_SIZE, help="Rows per insert")
+
+    def handle(self, *args, **opts):
+        if not analytics.alias():
+            raise CommandError("REPEATER_ANALYTICS_DB is not set")
+        interval = opts["interval"]
+        while True:
+            copied = analytics.sync(batch_size=opts["batch_size"])
+            if copied or not interval:
+                self.stdout.write(f"copied={copied}")
+            if not interval:
+                break
+            time.sleep(interval)
@@ -2,6 +2,9 @@
 from django.db import models
 from django.utils import timezone
 
+from api import models as api_models
+
+
 class RepeaterDevice(models.Model):
     device = models.CharField(primary_key=True, max_length=20)  # e.g., RPT001
     friendly_name = models.CharField(max_length=64, blank=True, default="")
@@ -11,6 +14,9 @@ class RepeaterDevice(models.Model):
     # Optional location for map overlays
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Current RepeaterConfig (see repeaters.config); the hash rides on activity responses
+    config_version = models.IntegerField(default=0)
+    config_hash = models.CharField(max_length=16, blank=True, default="")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -21,6 +27,25 @@ class RepeaterDevice(models.Model):
         return self.device
 
 
+class RepeaterConfig(models.Model):
+    """One published version of a device's configuration; rows are never edited."""
+    id = models.BigAutoField(primary_key=True)
+    device = models.ForeignKey(RepeaterDevice, on_delete=models.CASCADE, related_name="configs")
+    version = models.IntegerField()
+    config = models.JSONField(default=dict)
+    hash = models.CharField(max_length=16)  # repeaters.config.config_hash(config)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "repeater_config"
+        constraints = [
+            models.UniqueConstraint(fields=["device", "version"], name="uniq_config_device_version"),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id} v{self.version} ({self.hash})"
+
+
 class RepeaterStatus(models.Model):
     device = models.OneToOneField(RepeaterDevice, on_delete=models.CASCADE, primary_key=True, related_name="status")
     last_seen = models.DateTimeField(default=timezone.now)
@@ -30,15 +55,68 @@ class RepeaterStatus(models.Model):
     rx_total = models.IntegerField(default=0)
     tx_total = models.IntegerField(default=0)
     failed = models.IntegerField(default=0)
-    uptime_seconds = models.IntegerField(default=0)
+    uptime_seconds = models.IntegerField(default=0)  # total time inside heartbeat sessions
+    session_started_at = models.DateTimeField(null=True, blank=True)  # open session (see repeaters.uptime)
+    last_session_started_at = models.DateTimeField(null=True, blank=True)  # most recently closed session
+    last_session_ended_at = models.DateTimeField(null=True, blank=True)
+    # Running health statistics, maintained at ingest (see repeaters.health)
+    voltage_ewma = models.FloatField(null=True, blank=True)
+    voltage_var = models.FloatField(null=True, blank=True)
+    signal_ewma = models.FloatField(null=True, blank=True)
+    signal_var = models.FloatField(null=True, blank=True)
+    fail_delta_ewma = models.FloatField(null=True, blank=True)
+    fail_delta_var = models.FloatField(null=True, blank=True)
+    health_samples = models.IntegerField(default=0)
+    activity_count = models.BigIntegerField(default=0)  # rows in repeater_activity, for cheap totals
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = "repeater_status"
+        indexes = [
+            models.Index(fields=["last_seen"], name="idx_status_last_seen"),
+        ]
+
+
+class RepeaterSession(models.Model):
+    """A closed uptime session: heartbeats no further apart than the session gap."""
+    id = models.BigAutoField(primary_key=True)
+    device = models.ForeignKey(RepeaterDevice, on_delete=models.CASCADE, related_name="sessions")
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+
+    class Meta:
+        db_table = "repeater_session"
+        indexes = [
+            models.Index(fields=["device", "started_at"], name="idx_session_device_start"),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id} {self.started_at} -> {self.ended_at}"
+
+
+class MessageBody(models.Model):
+    """One distinct message text, shared by every row that carries it (see api.bodies)."""
+    id = models.BigAutoField(primary_key=True)
+    hash = models.CharField(max_length=32, unique=True)  # bodies.digest(text)
+    text = models.TextField()
+
+    class Meta:
+        db_table = "repeater_message_body"
+
+    def __str__(self):
+        return self.text[:50]
 
 
-class RepeaterActivity(models.Model):
+class WithMessageBody(api_models.WithMessageBody):
+    """api.models.WithMessageBody, with the text in this app's MessageBody table."""
+    body = models.ForeignKey(MessageBody, on_delete=models.PROTECT, related_name="+")
+
+    class Meta:
+        abstract = True
+
+
+class RepeaterActivity(WithMessageBody):
     ACTION_CHOICES = (
         ("received", "received"),
         ("retransmitted", "retransmitted"),
@@ -46,7 +124,6 @@ class RepeaterActivity(models.Model):
     id = models.BigAutoField(primary_key=True)
     device = models.ForeignKey(RepeaterDevice, on_delete=models.CASCADE, related_name="activities")
     msg_id = models.IntegerField()
-    message = models.TextField()
     action = models.CharField(max_length=16, choices=ACTION_CHOICES)
     voltage = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
     signal_strength = models.IntegerField(null=True, blank=True)
@@ -55,6 +132,8 @@ class RepeaterActivity(models.Model):
     tx_total = models.IntegerField(default=0)
     failed = models.IntegerField(default=0)
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Duplicate suppression for device retries (see api.idempotency)
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, unique=True)
 
     class Meta:
         db_table = "repeater_activity"
@@ -66,3 +145,51 @@ class RepeaterActivity(models.Model):
 
     def __str__(self):
         return f"{self.device_id} #{self.msg_id} {self.action} @ {self.timestamp}"
+
+
+class ActivityFact(models.Model):
+    """
+    Read-optimized copy of a repeater activity in the analytics database (see
+    repeaters.analytics). Same field names as RepeaterActivity so the metrics
+    and history code can query either; the device is denormalized and not a
+    real foreign key, since it lives in the other database.
+    """
+    id = models.BigIntegerField(primary_key=True)  # RepeaterActivity / shard id
+    device = models.ForeignKey(RepeaterDevice, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+")
+    friendly_name = models.CharField(max_length=64, blank=True, default="")
+    msg_id = models.IntegerField()
+    message = models.TextField()
+    action = models.CharField(max_length=16)
+    voltage = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    signal_strength = models.IntegerField(null=True, blank=True)
+    tx_power = models.IntegerField(null=True, blank=True)
+    rx_total = models.IntegerField(default=0)
+    tx_total = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        db_table = "repeater_activity_fact"
+        # covering indexes: metrics read every column they need from the index alone
+        indexes = [
+            models.Index(fields=["device", "timestamp", "action", "failed", "voltage", "signal_strength", "tx_power"],
+                         name="idx_fact_device_ts"),
+            models.Index(fields=["timestamp", "device", "action", "failed", "voltage", "signal_strength", "tx_power"],
+                         name="idx_fact_ts"),
+        ]
+
+    def __str__(self):
+        return f"{self.device_id} #{self.msg_id} {self.action} @ {self.timestamp}"
+
+
+class EtlWatermark(models.Model):
+    """High-water mark of an incremental copy into the analytics database."""
+    name = models.CharField(primary_key=True, max_length=64)
+    high_water = models.BigIntegerField(default=0)  # last source id copied
+    synced_at = models.DateTimeField(null=True, blank=True)  # end of the last completed pass
+
+    class Meta:
+        db_table = "repeater_etl_watermark"
+
+    def __str__(self):
+        return f"{self.name} @ {self.high_water}"
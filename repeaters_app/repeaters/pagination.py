@@ -0,0 +1,43 @@
+"""
+Per-device activity totals.
+
+They come from the counter maintained on RepeaterStatus at ingest (see
+repeaters.ingest) and lowered when a shard is dropped; `recount_activity`
+(manage.py recount_activity) sets it from the tables, for rows stored before
+the counter existed. Table-wide counts and the admin paginator are
+api.pagination's.
+"""
+from django.db import router, transaction
+
+from api.pagination import EXACT_BELOW
+from . import shards
+from .models import RepeaterStatus
+
+
+def device_activity_count(device, exact=False):
+    """Number of activities stored for `device`, and whether it is an estimate."""
+    if not exact:
+        counted = getattr(getattr(device, "status", None), "activity_count", None)
+        if counted is not None and counted >= EXACT_BELOW:
+            return counted, True
+    return shards.count([qs.filter(device=device) for qs in shards.querysets()]), False
+
+
+def recount_activity(devices=None):
+    """
+    Set RepeaterStatus.activity_count to the rows actually stored, for
+    `devices` (ids) or every device with a status. Each device is counted
+    with its status row locked, so concurrent ingest is neither lost nor
+    counted twice. Returns {device: count}.
+    """
+    using = router.db_for_write(RepeaterStatus)
+    if devices is None:
+        devices = list(RepeaterStatus.objects.using(using).order_by("pk").values_list("pk", flat=True))
+    counts = {}
+    for device in devices:
+        with transaction.atomic(using=using):
+            if not RepeaterStatus.objects.using(using).select_for_update().filter(pk=device).exists():
+                continue
+            counts[device] = shards.count([qs.filter(device=device) for qs in shards.querysets()])
+            RepeaterStatus.objects.using(using).filter(pk=device).update(activity_count=counts[device])
+    return counts
@@ -0,0 +1,237 @@
+"""
+In-process columnar ring buffer of recent repeater activity.
+
+Short-period metrics (1h, 24h) are most of the dashboard's traffic, and the
+rows they aggregate are the same from one request to the next. This keeps
+the last REPEATER_RECENT_SECONDS of activity in fixed-size NumPy arrays (id,
+timestamp, device index, action, failed, voltage, signal, tx_power) and
+hands repeaters.timeline the same columns load_columns() would, filtered with
+boolean masks instead of a query.
+
+Filling it:
+- at startup, or on first use, one query over the window (`bootstrap`);
+- the ingest path adds each activity once its transaction commits, unless
+  it is already held (the ids held last are kept in a dict, so this is a
+  lookup, not a scan of the buffer);
+- rows written by other processes are pulled with a short tail query
+  (timestamp >= newest seen - SETTLE) at most every REFRESH seconds, and
+  dropped if their id is already held.
+
+Rows are kept in arrival order; when the ring wraps, the oldest rows are
+overwritten and `complete_from` moves past them, so a window the buffer no
+longer fully holds falls back to SQL. Disabled unless REPEATER_RECENT_SECONDS
+is set. Deletes are not seen: retention only drops months outside the window.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import shards, timeline
+
+CAPACITY = getattr(settings, "REPEATER_RECENT_CAPACITY", 500_000)  # rows; about 50 bytes each
+REFRESH = getattr(settings, "REPEATER_RECENT_REFRESH_SECONDS", 1.0)
+SETTLE = 5.0  # seconds a commit may lag its timestamp (as in repeaters.analytics)
+ACTIONS = {"received": 1, "retransmitted": 2}
+
+
+def window():
+    """Seconds of activity held; 0 disables the buffer."""
+    return getattr(settings, "REPEATER_RECENT_SECONDS", 0)
+
+
+class RecentActivity:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.lock = threading.Lock()
+        self.id = np.zeros(capacity, dtype=np.int64)
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.device = np.zeros(capacity, dtype=np.int32)
+        self.action = np.zeros(capacity, dtype=np.int8)
+        self.values = {name: np.full(capacity, np.nan) for name in ("failed", "voltage", "signal_strength", "tx_power")}
+        self.size = 0
+        self.head = 0  # next slot written
+        self.names = []  # device index -> device id
+        self.index = {}
+        self.complete_from = None  # epoch seconds from which every committed row is held; None until loaded
+        self.high_water = None  # newest timestamp pulled from the database
+        self.seen = {}  # id -> timestamp of the rows held last, oldest first (see _seen)
+        self.refreshed = 0.0
+
+    def _device_index(self, names):
+        out = np.empty(len(names), dtype=np.int32)
+        for i, name in enumerate(names):
+            idx = self.index.get(name)
+            if idx is None:
+                idx = self.index[name] = len(self.names)
+                self.names.append(name)
+            out[i] = idx
+        return out
+
+    def _write(self, rows):
+        """Append rows of (id, timestamp, device, action, failed, voltage, signal, tx_power). Lock held."""
+        if len(rows) > self.capacity:
+            self.complete_from = max(self.complete_from, rows[-self.capacity - 1][1].timestamp())
+            rows = rows[-self.capacity:]
+        k = len(rows)
+        if not k:
+            return
+        ids, stamps, devices, actions, failed, voltage, signal, txp = zip(*rows)
+        slots = (self.head + np.arange(k)) % self.capacity
+        overwritten = slots[slots < self.size]
+        if len(overwritten):
+            self.complete_from = max(self.complete_from, float(self.ts[overwritten].max()))
+        self.id[slots] = ids
+        self.ts[slots] = [t.timestamp() for t in stamps]
+        self.device[slots] = self._device_index(devices)
+        self.action[slots] = [ACTIONS.get(a, 0) for a in actions]
+        for name, column in zip(self.values, (failed, voltage, signal, txp)):
+            self.values[name][slots] = np.array(column, dtype=np.float64)  # None -> NaN, Decimal -> float
+        self.head = int((self.head + k) % self.capacity)
+        self.size = min(self.capacity, self.size + k)
+
+    def add(self, activity):
+        """Hold one just-committed activity row, unless a refresh already pulled it."""
+        with self.lock:
+            if self.complete_from is None:
+                return
+            if activity.id in self.seen:
+                return
+            self._write([(activity.id, activity.timestamp, activity.device_id, activity.action, activity.failed,
+                          activity.voltage, activity.signal_strength, activity.tx_power)])
+            self._seen(activity.id, activity.timestamp.timestamp())
+
+    def bootstrap(self, now=None):
+        """(Re)load the whole window from the database."""
+        now = now or timezone.now()
+        start = now - timedelta(seconds=window())
+        rows = _fetch(start)
+        with self.lock:
+            self.size = self.head = 0
+            self.complete_from = start.timestamp()
+            self.high_water = max([r[1].timestamp() for r in rows[-1:]] + [self.complete_from])
+            self._write(rows)
+            self.seen = {}
+            self._pulled(rows)
+            self.refreshed = time.monotonic()
+
+    def refresh(self):
+        """Pull rows other processes committed since the last pull; bootstraps first if needed."""
+        if self.complete_from is None:
+            return self.bootstrap()
+        if time.monotonic() - self.refreshed < REFRESH:
+            return
+        since = self.high_water - SETTLE
+        rows = _fetch(datetime.fromtimestamp(since, tz=dt_timezone.utc))
+        with self.lock:
+            held = self.id[:self.size][self.ts[:self.size] >= since - SETTLE]
+            fresh = np.isin(np.array([r[0] for r in rows], dtype=np.int64), held, invert=True)
+            self._write([r for r, keep in zip(rows, fresh) if keep])
+            if rows:
+                self.high_water = max(self.high_water, max(r[1].timestamp() for r in rows))
+            self._pulled(rows)
+            self.refreshed = time.monotonic()
+
+    def _pulled(self, rows):
+        """Note the ids just pulled near high_water, so a late add() skips them. Lock held."""
+        horizon = self.high_water - 2 * SETTLE
+        for pk, stamp, *_ in rows:
+            if stamp.timestamp() >= horizon:
+                self._seen(pk, stamp.timestamp())
+
+    def _seen(self, pk, ts):
+        """
+        Note a held id, and forget the oldest ones once no duplicate of them
+        can still arrive (2 * SETTLE behind). Ids come in nearly time order,
+        so this is amortised O(1). Lock held.
+        """
+        self.seen[pk] = ts
+        horizon = ts - 2 * SETTLE
+        while self.seen:
+            oldest = next(iter(self.seen))
+            if self.seen[oldest] >= horizon:
+                break
+            del self.seen[oldest]
+
+    def columns(self, start, end, devices=None):
+        """
+        timeline columns for activity between `start` and `end`, optionally
+        only for `devices`; None if the buffer does not hold the whole range.
+        """
+        lo, hi = start.timestamp(), end.timestamp()
+        with self.lock:
+            if self.complete_from is None or lo < self.complete_from:
+                return None
+            ts = self.ts[:self.size]
+            mask = (ts >= lo) & (ts <= hi)
+            if devices is not None:
+                wanted = [self.index[d] for d in devices if d in self.index]
+                mask &= np.isin(self.device[:self.size], wanted)
+            sel = np.flatnonzero(mask)
+            sel = sel[np.argsort(ts[sel], kind="stable")]  # arrival order is nearly time order
+            action = self.action[sel]
+            return {
+                "ts": ts[sel],
+                "device": np.array(self.names, dtype=str)[self.device[sel]] if self.names else np.empty(0, dtype=str),
+                "received": action == ACTIONS["received"],
+                "retransmitted": action == ACTIONS["retransmitted"],
+                **{name: values[sel] for name, values in self.values.items()},
+            }
+
+
+def _fetch(start):
+    """Activity rows from `start` on, oldest first, in RecentActivity._write order."""
+    rows = []
+    for qs in shards.querysets(start, None):
+        rows += qs.filter(timestamp__gte=start).order_by("timestamp").values_list("id", *timeline.COLUMNS)
+    rows.sort(key=lambda row: row[1])
+    return rows
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def buffer():
+    """This process's buffer, or None when disabled."""
+    global _buffer
+    if not window():
+        return None
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = RecentActivity(CAPACITY)
+    return _buffer
+
+
+def reset():
+    """Forget everything held; the next use bootstraps again."""
+    global _buffer
+    with _buffer_lock:
+        _buffer = None
+
+
+def load_columns(start, end, devices=None):
+    """Columns from the buffer when it covers `start`..`end`, else None (query instead)."""
+    buf = buffer()
+    if buf is None:
+        return None
+    buf.refresh()
+    return buf.columns(start, end, devices)
+
+
+def record(activity):
+    """Called by the ingest path: hold `activity` once its transaction commits."""
+    buf = buffer()
+    if buf is not None:
+        transaction.on_commit(lambda: buf.add(activity))
+
+
+def warm():
+    buf = buffer()
+    if buf is not None:
+        buf.refresh()
@@ -0,0 +1,43 @@
+"""
+Database router for the analytics copy (see repeaters.analytics).
+
+Add "repeaters.routers.AnalyticsRouter" to DATABASE_ROUTERS and set
+REPEATER_ANALYTICS_DB to the alias. Then run
+`manage.py migrate --database <alias> --run-syncdb` to create the analytics
+tables, and only those, in that database.
+"""
+from django.conf import settings
+
+ANALYTICS_MODELS = {"activityfact", "etlwatermark"}
+
+
+def _is_analytics(app_label, model_name):
+    return app_label == "repeaters" and model_name in ANALYTICS_MODELS
+
+
+class AnalyticsRouter:
+    def _alias(self):
+        return getattr(settings, "REPEATER_ANALYTICS_DB", None)
+
+    def db_for_read(self, model, **hints):
+        if _is_analytics(model._meta.app_label, model._meta.model_name):
+            return self._alias()
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # facts point at devices in the primary database without a constraint
+        if any(_is_analytics(o._meta.app_label, o._meta.model_name) for o in (obj1, obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        alias = self._alias()
+        if not alias:
+            return None
+        if _is_analytics(app_label, model_name):
+            return db == alias
+        if db == alias:
+            return False
+        return None
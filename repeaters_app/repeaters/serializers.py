@@ -16,6 +16,7 @@ class RepeaterActivityCreateSerializer(serializers.Serializer):
     signal_strength = serializers.IntegerField(required=False, min_value=0, max_value=100)
     tx_power = serializers.IntegerField(required=False, min_value=0, max_value=100)
     stats = ActivityStatsSerializer()
+    device_time = serializers.CharField(max_length=32, required=False)  # device clock/uptime, for idempotency
 
 class RepeaterStatusSerializer(serializers.ModelSerializer):
     device = serializers.CharField(source="device.device")
@@ -0,0 +1,196 @@
+"""
+Monthly time shards for repeater activity.
+
+With REPEATER_ACTIVITY_SHARDS = True, new activity is written to a table per
+calendar month (repeater_activity_YYYYMM) with the same columns and indexes
+as repeater_activity, created on first write. Reads go through `querysets()`,
+which returns the base table (rows from before sharding was enabled) plus only
+the shards overlapping the requested time range, so index size and range
+scans are bounded by a month. Retiring a month is a DROP TABLE (`drop()`,
+manage.py drop_activity_shards) instead of a DELETE; the per-device
+RepeaterStatus.activity_count is lowered by the rows dropped.
+
+Shard ids start at YYYYMM * 10**10, so ids stay unique across shards.
+Shards are plain tables on every backend (the app has no migrations, so the
+base table cannot be turned into a Postgres partitioned table in place);
+pruning happens here rather than in the planner.
+"""
+import re
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DatabaseError, connections, models, router, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import RepeaterActivity, RepeaterStatus, WithMessageBody
+
+TABLE_RE = re.compile(r"^%s_(\d{4})(\d{2})$" % RepeaterActivity._meta.db_table)
+ID_BASE = 10 ** 10  # ids per shard
+
+_models = {}  # (year, month) -> model class
+_created = set()  # (db alias, table) known to exist (committed)
+
+
+def enabled():
+    return getattr(settings, "REPEATER_ACTIVITY_SHARDS", False)
+
+
+def month_start(dt):
+    """First instant (UTC) of the month containing `dt`."""
+    dt = dt.astimezone(dt_timezone.utc)
+    return datetime(dt.year, dt.month, 1, tzinfo=dt_timezone.utc)
+
+
+def next_month(month):
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+
+def shard_model(month):
+    """Model class for the shard of `month` (the table may not exist yet)."""
+    key = (month.year, month.month)
+    model = _models.get(key)
+    if model is None:
+        suffix = f"{month.year}{month.month:02d}"
+        base = RepeaterActivity._meta
+        attrs = {"__module__": RepeaterActivity.__module__, "__str__": RepeaterActivity.__str__,
+                 "ACTION_CHOICES": RepeaterActivity.ACTION_CHOICES}
+        for field in base.local_fields:
+            if field.name == "body":
+                continue  # inherited from WithMessageBody, with the `message` property and manager
+            name, path, args, kwargs = field.deconstruct()
+            if field.is_relation:
+                kwargs["related_name"] = "+"
+            attrs[name] = field.__class__(*args, **kwargs)
+        attrs["Meta"] = type("Meta", (), {
+            "app_label": base.app_label,
+            "db_table": f"{base.db_table}_{suffix}",
+            "managed": False,
+            "indexes": [models.Index(fields=ix.fields, name=f"{ix.name}_{suffix}") for ix in base.indexes],
+        })
+        model = _models[key] = type(f"RepeaterActivity{suffix}", (WithMessageBody,), attrs)
+    return model
+
+
+def months(using=None):
+    """Months that have a shard table, oldest first."""
+    using = using or router.db_for_read(RepeaterActivity)
+    found = []
+    for name in connections[using].introspection.table_names():
+        m = TABLE_RE.match(name)
+        if m:
+            found.append(datetime(int(m.group(1)), int(m.group(2)), 1, tzinfo=dt_timezone.utc))
+    return sorted(found)
+
+
+def _create(model, using):
+    connection = connections[using]
+    table = model._meta.db_table
+    month = datetime.strptime(table.rsplit("_", 1)[1], "%Y%m")
+    first_id = (month.year * 100 + month.month) * ID_BASE
+    # not used as a context manager: SQLite refuses that inside a transaction, but
+    # a plain CREATE TABLE is fine there
+    editor = connection.schema_editor(atomic=False)
+    editor.deferred_sql = []
+    editor.create_model(model)
+    for sql in editor.deferred_sql:
+        editor.execute(sql)
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, first_id - 1])
+        elif connection.vendor == "postgresql":
+            cursor.execute(f"ALTER TABLE {connection.ops.quote_name(table)} ALTER COLUMN id RESTART WITH {first_id}")
+
+
+def ensure(month, using=None):
+    """Shard model for `month`, creating its table if needed."""
+    model = shard_model(month)
+    using = using or router.db_for_write(model)
+    table = model._meta.db_table
+    if (using, table) in _created:
+        return model
+    if table not in connections[using].introspection.table_names():
+        try:
+            with transaction.atomic(using=using):
+                _create(model, using)
+        except DatabaseError:
+            # another worker created it first
+            if table not in connections[using].introspection.table_names():
+                raise
+    # remembered only once committed, so a rolled-back CREATE is not trusted
+    transaction.on_commit(lambda: _created.add((using, table)), using=using)
+    return model
+
+
+def for_write(now):
+    """Model new activity at `now` is written to."""
+    return ensure(month_start(now)) if enabled() else RepeaterActivity
+
+
+def querysets(start=None, end=None, using=None):
+    """
+    Querysets over every table that may hold activity between `start` and
+    `end` (either may be None), oldest first: the base table, then each
+    overlapping shard. Callers add their own filters, including the time range.
+    """
+    using = using or router.db_for_read(RepeaterActivity)
+    tables = [RepeaterActivity]
+    for month in months(using):
+        if (end is None or month <= end) and (start is None or next_month(month) > start):
+            tables.append(shard_model(month))
+    return [model._default_manager.using(using).all() for model in tables]
+
+
+def get(**lookup):
+    """Single activity matching `lookup` from any table, newest shard first."""
+    for qs in reversed(querysets()):
+        obj = qs.filter(**lookup).first()
+        if obj is not None:
+            return obj
+    raise RepeaterActivity.DoesNotExist(f"No activity matching {lookup}")
+
+
+def count(qs_list):
+    return sum(qs.count() for qs in qs_list)
+
+
+def page(qs_list, offset, limit):
+    """
+    `limit` rows after skipping `offset`, reading `qs_list` (each already
+    ordered newest first) from the newest table back; older tables are only
+    touched once the newer ones are exhausted.
+    """
+    rows = []
+    for qs in reversed(qs_list):
+        if len(rows) >= limit:
+            break
+        if offset:
+            n = qs.count()
+            if n <= offset:
+                offset -= n
+                continue
+        rows += qs[offset:offset + limit - len(rows)]
+        offset = 0
+    return rows
+
+
+def drop(month, using=None):
+    """Drop the shard table of `month`, uncounting its rows. Returns False if there was none."""
+    model = shard_model(month)
+    using = using or router.db_for_write(model)
+    connection = connections[using]
+    table = model._meta.db_table
+    if table not in connection.introspection.table_names():
+        return False
+    qn = connection.ops.quote_name
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        per_device = model._base_manager.using(using).order_by().values_list("device_id").annotate(n=Count("pk"))
+        for device_id, n in per_device:
+            RepeaterStatus.objects.using(using).filter(pk=device_id).update(
+                activity_count=Greatest(F("activity_count") - n, 0))
+        if connection.vendor == "sqlite":
+            # per-shard message index of shards created before message bodies
+            cursor.execute(f"DROP TABLE IF EXISTS {qn(table + '_fts')}")
+        cursor.execute(f"DROP TABLE {qn(table)}")
+    _created.discard((using, table))
+    return True
@@ -3,13 +3,27 @@ from django.test import TestCase
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework.test import APIClient
-from .models import RepeaterDevice
+from .models import RepeaterDevice, RepeaterActivity, RepeaterStatus
 
 class RepeaterAPITest(TestCase):
     def setUp(self):
         self.client = APIClient()
         self.dev = RepeaterDevice.objects.create(device="RPT001")
 
+    def activity_payload(self, **extra):
+        payload = {
+            "device": "RPT001",
+            "msg_id": 42,
+            "message": "Hello World",
+            "action": "received",
+            "voltage": "11.66",
+            "signal_strength": 85,
+            "tx_power": 95,
+            "stats": {"rx_total": 127, "tx_total": 125, "failed": 2}
+        }
+        payload.update(extra)
+        return payload
+
     def test_activity_post_and_status(self):
         payload = {
             "device": "RPT001",
@@ -26,3 +40,330 @@ class RepeaterAPITest(TestCase):
         r2 = self.client.get("/api/repeater/status/?device=RPT001")
         self.assertEqual(r2.status_code, 200)
         self.assertEqual(r2.data["repeaters"][0]["device"], "RPT001")
+
+    def test_activity_retry_is_deduplicated(self):
+        payload = self.activity_payload(device_time="123456")
+        r1 = self.client.post("/api/repeater/activity/", payload, format="json")
+        r2 = self.client.post("/api/repeater/activity/", payload, format="json")
+        self.assertEqual(r1.data, r2.data)
+        self.assertEqual(r2["Idempotent-Replayed"], "true")
+        self.assertEqual(RepeaterActivity.objects.count(), 1)
+
+        # evicted from the recent-key cache: the unique key still catches it
+        from django.core.cache import cache
+        cache.clear()
+        r3 = self.client.post("/api/repeater/activity/", payload, format="json")
+        self.assertEqual(r3.data["activity_id"], r1.data["activity_id"])
+        self.assertEqual(RepeaterActivity.objects.count(), 1)
+
+    def test_metrics_timeline_is_dense(self):
+        from datetime import timedelta
+        now = timezone.now()
+        for minutes_ago in (50, 5):
+            a = RepeaterActivity.objects.create(device=self.dev, msg_id=1, message="m", action="received",
+                                                voltage="12.00", failed=minutes_ago)
+            RepeaterActivity.objects.filter(pk=a.pk).update(timestamp=now - timedelta(minutes=minutes_ago))
+
+        r = self.client.get("/api/repeater/metrics/?device=RPT001&period=1h&bucket=5m")
+        self.assertEqual(r.status_code, 200)
+        self.assertIn(len(r.data["timeline"]), (12, 13))
+        self.assertEqual(sum(b["received"] for b in r.data["timeline"]), 2)
+        self.assertLess(r.data["metrics"]["uptime_percentage"], 20.0)
+        self.assertEqual(r.data["metrics"]["messages_failed"], 5)
+        self.assertEqual(r.data["metrics"]["avg_voltage"], 12.0)
+
+    def test_metrics_fleet_mode(self):
+        RepeaterDevice.objects.create(device="RPT002")
+        RepeaterDevice.objects.create(device="RPT003")
+        for dev, action in (("RPT001", "received"), ("RPT001", "retransmitted"), ("RPT002", "received")):
+            RepeaterActivity.objects.create(device_id=dev, msg_id=1, message="m", action=action, signal_strength=50)
+
+        r = self.client.get("/api/repeater/metrics/?devices=all&period=1h&bucket=15m")
+        self.assertEqual(r.status_code, 200)
+        fleet = {f["device"]: f for f in r.data["fleet"]}
+        self.assertEqual(list(fleet), ["RPT001", "RPT002", "RPT003"])
+        self.assertEqual(fleet["RPT001"]["metrics"]["success_rate"], 100.0)
+        self.assertEqual(fleet["RPT002"]["metrics"]["messages_received"], 1)
+        self.assertEqual(fleet["RPT003"]["metrics"]["uptime_percentage"], 0.0)
+        self.assertEqual(len(fleet["RPT003"]["timeline"]), len(fleet["RPT001"]["timeline"]))
+
+        r = self.client.get("/api/repeater/metrics/?devices=RPT002&period=1h")
+        self.assertEqual([f["device"] for f in r.data["fleet"]], ["RPT002"])
+
+    def test_alerts_from_running_health(self):
+        for i, volts in enumerate(("12.00", "10.20", "10.10", "10.00")):
+            payload = self.activity_payload(msg_id=i, voltage=volts,
+                                            stats={"rx_total": i, "tx_total": i, "failed": 0})
+            self.client.post("/api/repeater/activity/", payload, format="json")
+        status = RepeaterStatus.objects.get(device=self.dev)
+        self.assertEqual(status.health_samples, 4)
+        self.assertLess(status.voltage_ewma, 12.0)
+        self.assertGreater(status.voltage_var, 0.0)
+
+        r = self.client.get("/api/repeater/alerts/?voltage_min=11.9")
+        self.assertEqual([a["device"] for a in r.data["alerts"]], ["RPT001"])
+        self.assertEqual(r.data["alerts"][0]["reasons"], ["low_voltage"])
+        r = self.client.get("/api/repeater/alerts/")
+        self.assertEqual(r.data["alerts"], [])
+
+    def test_uptime_sessions_and_status_filters(self):
+        from datetime import timedelta
+        from .models import RepeaterSession
+        from . import uptime
+
+        status = RepeaterStatus.objects.create(device=self.dev)
+        t0 = timezone.now() - timedelta(hours=1)
+        status.last_seen = t0
+        for offset in (0, 60, 120, 1000, 1030):  # gap between 120s and 1000s closes a session
+            closed = uptime.heartbeat(status, t0 + timedelta(seconds=offset))
+            if closed:
+                RepeaterSession.objects.create(device=self.dev, started_at=closed[0], ended_at=closed[1])
+        status.save()
+        self.assertEqual(status.uptime_seconds, 150)
+        self.assertEqual(RepeaterSession.objects.get().ended_at, t0 + timedelta(seconds=120))
+
+        RepeaterDevice.objects.create(device="RPT002")
+        RepeaterStatus.objects.create(device_id="RPT002", voltage="10.50")
+        r = self.client.get("/api/repeater/status/?online=false")
+        self.assertEqual([s["device"] for s in r.data["repeaters"]], ["RPT001"])
+        r = self.client.get("/api/repeater/status/?online=true&voltage_below=11")
+        self.assertEqual([s["device"] for s in r.data["repeaters"]], ["RPT002"])
+        r = self.client.get("/api/repeater/status/?limit=1&offset=1")
+        self.assertEqual((r.data["total"], len(r.data["repeaters"])), (2, 1))
+
+    def test_ingest_upsert_matches_python_bookkeeping(self):
+        from datetime import timedelta
+        from types import SimpleNamespace
+        from .models import RepeaterSession
+        from . import health
+
+        samples = [("12.00", 80, 0), ("11.50", 60, 2), ("11.00", 70, 3)]
+        expected = SimpleNamespace(voltage_ewma=None, voltage_var=None, signal_ewma=None, signal_var=None,
+                                   fail_delta_ewma=None, fail_delta_var=None, failed=0, health_samples=0)
+        for i, (volts, sig, failed) in enumerate(samples):
+            payload = self.activity_payload(msg_id=i, voltage=volts, signal_strength=sig,
+                                            stats={"rx_total": i, "tx_total": i, "failed": failed})
+            self.assertEqual(self.client.post("/api/repeater/activity/", payload, format="json").status_code, 200)
+            health.apply_sample(expected, volts, sig, failed)
+            expected.failed = failed
+
+        status = RepeaterStatus.objects.get(device=self.dev)
+        for name in ("voltage_ewma", "voltage_var", "signal_ewma", "signal_var", "fail_delta_ewma", "fail_delta_var"):
+            self.assertAlmostEqual(getattr(status, name), getattr(expected, name), places=6, msg=name)
+        self.assertEqual((status.health_samples, status.failed, status.signal_strength), (3, 3, 70))
+
+        # silence longer than the session gap closes the session at the last heartbeat
+        last = status.last_seen - timedelta(minutes=10)
+        RepeaterStatus.objects.filter(pk=self.dev.pk).update(last_seen=last)
+        self.client.post("/api/repeater/activity/", self.activity_payload(msg_id=9), format="json")
+        session = RepeaterSession.objects.get(device=self.dev)
+        self.assertEqual((session.started_at, session.ended_at), (status.session_started_at, last))
+
+    def test_activity_message_search(self):
+        from api import search
+        for i, text in enumerate(("storm alert", "routine ping", "storm passed")):
+            RepeaterActivity.objects.create(device=self.dev, msg_id=i, message=text, action="received")
+        hits = RepeaterActivity.objects.filter(search.message_filter(RepeaterActivity, "storm"))
+        self.assertEqual(sorted(hits.values_list("body__text", flat=True)), ["storm alert", "storm passed"])
+        self.assertFalse(RepeaterActivity.objects.filter(search.message_filter(RepeaterActivity, '"OR')).exists())
+
+    def test_history_total_uses_activity_counter(self):
+        from unittest import mock
+        from . import pagination
+        for i in range(3):
+            self.client.post("/api/repeater/activity/", self.activity_payload(msg_id=i), format="json")
+        self.assertEqual(RepeaterStatus.objects.get(device=self.dev).activity_count, 3)
+
+        RepeaterStatus.objects.filter(pk=self.dev.pk).update(activity_count=1000)
+        with mock.patch.object(pagination, "EXACT_BELOW", 2):
+            r = self.client.get("/api/repeater/history/?device=RPT001")
+            self.assertEqual((r.data["total"], r.data["total_estimated"]), (1000, True))
+            r = self.client.get("/api/repeater/history/?device=RPT001&exact=1")
+            self.assertEqual((r.data["total"], r.data["total_estimated"]), (3, False))
+
+        # rows stored before the counter existed are picked up by the backfill
+        RepeaterActivity.objects.create(device=self.dev, msg_id=9, message="old", action="received")
+        self.assertEqual(pagination.recount_activity(), {"RPT001": 4})
+        self.assertEqual(RepeaterStatus.objects.get(device=self.dev).activity_count, 4)
+
+    def test_sharded_activity_reads_only_overlapping_months(self):
+        import io
+        from datetime import datetime, timezone as dt_timezone
+        from unittest import mock
+        from django.core.management import call_command
+        from django.test import override_settings
+        from . import shards
+
+        march, april, later = (datetime(2026, m, d, tzinfo=dt_timezone.utc) for m, d in ((3, 15), (4, 15), (4, 16)))
+        with override_settings(REPEATER_ACTIVITY_SHARDS=True):
+            for i, when in enumerate((march, april, later)):
+                with mock.patch("django.utils.timezone.now", return_value=when):
+                    r = self.client.post("/api/repeater/activity/", self.activity_payload(msg_id=i), format="json")
+                self.assertEqual(r.status_code, 200)
+        self.assertEqual(RepeaterActivity.objects.count(), 0)
+        self.assertEqual(shards.months(), [shards.month_start(march), shards.month_start(april)])
+        self.assertEqual(r.data["activity_id"] // shards.ID_BASE, 202604)
+
+        tables = shards.querysets(start=datetime(2026, 4, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual([qs.model._meta.db_table for qs in tables], ["repeater_activity", "repeater_activity_202604"])
+        r = self.client.get("/api/repeater/history/?device=RPT001&exact=1&limit=2&offset=1")
+        self.assertEqual(r.data["total"], 3)
+        self.assertEqual(sorted(h["msg_id"] for h in r.data["history"]), [0, 1])
+        r = self.client.get("/api/repeater/history/?device=RPT001&since=2026-04-01T00:00:00Z")
+        self.assertEqual(r.data["total"], 2)
+
+        self.assertEqual(RepeaterStatus.objects.get(device=self.dev).activity_count, 3)
+        call_command("drop_activity_shards", before="2026-04", stdout=io.StringIO())
+        self.assertEqual(shards.months(), [shards.month_start(april)])
+        self.assertEqual(RepeaterStatus.objects.get(device=self.dev).activity_count, 2)
+
+    def test_analytics_copy_serves_metrics_while_fresh(self):
+        from datetime import timedelta
+        from django.test import override_settings
+        from . import analytics
+        from .models import ActivityFact, EtlWatermark
+
+        for i in range(3):
+            self.client.post("/api/repeater/activity/", self.activity_payload(msg_id=i), format="json")
+        later = timezone.now() + timedelta(seconds=30)
+        with override_settings(REPEATER_ANALYTICS_DB="default"):
+            self.assertEqual(analytics.sync(batch_size=2, now=later), 3)
+            self.assertEqual(analytics.sync(now=later), 0)
+            self.assertEqual(EtlWatermark.objects.get().high_water, RepeaterActivity.objects.latest("id").id)
+            self.assertEqual(ActivityFact.objects.filter(device="RPT001").count(), 3)
+
+            RepeaterActivity.objects.all().delete()  # reads now only see the copy
+            r = self.client.get("/api/repeater/metrics/?device=RPT001&period=1h")
+            self.assertEqual(r.data["metrics"]["messages_received"], 3)
+            r = self.client.get("/api/repeater/history/?device=RPT001&exact=1")
+            self.assertEqual((r.data["total"], len(r.data["history"])), (3, 3))
+
+            EtlWatermark.objects.update(synced_at=later - analytics.MAX_LAG * 2)
+            r = self.client.get("/api/repeater/metrics/?device=RPT001&period=1h")
+            self.assertEqual(r.data["metrics"]["messages_received"], 0)
+
+    async def test_async_activity_view(self):
+        import json
+        from django.test import AsyncRequestFactory
+        from .async_views import repeater_activity
+
+        factory = AsyncRequestFactory()
+        body = json.dumps(self.activity_payload(device_time="42"))
+        r1 = await repeater_activity(factory.post("/api/repeater/activity/", body, content_type="application/json"))
+        r2 = await repeater_activity(factory.post("/api/repeater/activity/", body, content_type="application/json"))
+        self.assertEqual(r1.status_code, 200)
+        self.assertEqual(json.loads(r1.content), json.loads(r2.content))
+        self.assertEqual(r2["Idempotent-Replayed"], "true")
+        self.assertEqual(await RepeaterActivity.objects.acount(), 1)
+
+        bad = await repeater_activity(factory.post("/api/repeater/activity/", "{", content_type="application/json"))
+        self.assertEqual(bad.status_code, 400)
+
+    def test_config_versions_and_conditional_fetch(self):
+        from django.contrib.auth.models import User
+        r = self.client.post("/api/repeater/config/", {"device": "RPT001", "config": {"tx_power": 100}}, format="json")
+        self.assertIn(r.status_code, (401, 403))  # publishing needs a staff user
+        self.client.force_authenticate(User.objects.create_user("ops", is_staff=True))
+
+        r = self.client.post("/api/repeater/config/", {"device": "RPT001", "config": {"tx_power": 80, "ch": 3}},
+                             format="json")
+        self.assertEqual((r.status_code, r.data["version"]), (201, 1))
+        digest = r.data["hash"]
+        # same content, different key order: no new version
+        r = self.client.post("/api/repeater/config/", {"device": "RPT001", "config": {"ch": 3, "tx_power": 80}},
+                             format="json")
+        self.assertEqual((r.status_code, r.data["version"], r.data["hash"]), (200, 1, digest))
+
+        r = self.client.post("/api/repeater/activity/", self.activity_payload(), format="json")
+        self.assertEqual(r.data["config_hash"], digest)
+
+        r = self.client.get("/api/repeater/config/?device=RPT001")
+        self.assertEqual((r.status_code, r.data["config"], r["ETag"]), (200, {"tx_power": 80, "ch": 3}, f'"{digest}"'))
+        r = self.client.get("/api/repeater/config/?device=RPT001", HTTP_IF_NONE_MATCH=f'"{digest}"')
+        self.assertEqual(r.status_code, 304)
+
+        self.client.post("/api/repeater/config/", {"device": "RPT001", "config": {"tx_power": 60}}, format="json")
+        r = self.client.get("/api/repeater/config/?device=RPT001", HTTP_IF_NONE_MATCH=f'"{digest}"')
+        self.assertEqual((r.status_code, r.data["version"], r.data["config"]), (200, 2, {"tx_power": 60}))
+
+    def test_recent_buffer_serves_short_periods(self):
+        from unittest import mock
+        from django.test import override_settings
+        from api import bodies
+        from . import recent, timeline
+
+        RepeaterActivity.objects.create(device=self.dev, msg_id=1, message="m", action="received",
+                                        voltage="12.00", signal_strength=60, failed=1)
+        url = "/api/repeater/metrics/?device=RPT001&period=1h&bucket=5m"
+        from_sql = self.client.get(url).data
+        with override_settings(REPEATER_RECENT_SECONDS=86400):
+            recent.reset()
+            try:
+                self.assertEqual(self.client.get(url).data, from_sql)  # bootstrapped from the table
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.post("/api/repeater/activity/", self.activity_payload(action="retransmitted"),
+                                     format="json")
+                # a refresh pulled the row before its on-commit add ran: it is still held once
+                recent.buffer().add(RepeaterActivity.objects.latest("id"))
+                with mock.patch.object(timeline, "load_columns", side_effect=AssertionError("queried")):
+                    r = self.client.get(url)
+                self.assertEqual(r.data["metrics"]["messages_retransmitted"], 1)
+                self.assertEqual(r.data["metrics"]["messages_failed"], 2)
+
+                # beyond the window: back to SQL
+                r = self.client.get("/api/repeater/metrics/?device=RPT001&period=30d")
+                self.assertEqual(r.data["metrics"]["messages_received"], 1)
+            finally:
+                recent.reset()
+                bodies.forget()  # ids remembered by the on-commit callbacks above are rolled back
+
+    def test_change_log_tails_inserts_from_saved_offset(self):
+        from django.core.management import call_command
+        from django.test import override_settings
+        from io import StringIO
+        from api import bodies, changelog
+
+        try:
+            with override_settings(CHANGE_LOG=True), self.captureOnCommitCallbacks(execute=True):
+                for i in range(3):
+                    self.client.post("/api/repeater/activity/", self.activity_payload(msg_id=i), format="json")
+        finally:
+            bodies.forget()  # ids remembered by the on-commit callbacks above are rolled back
+        events = changelog.read(sources=["repeaters.repeateractivity"])
+        self.assertEqual([e.data["msg_id"] for e in events], [0, 1, 2])
+        self.assertEqual(events[0].data["voltage"], "11.66")
+        self.assertEqual(events[0].row_id, RepeaterActivity.objects.get(msg_id=0).id)
+
+        out = StringIO()
+        source = ["repeaters.repeateractivity"]
+        call_command("tail_changes", consumer="export", source=source, batch_size=2, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+        self.assertEqual(changelog.Consumer("export").offset, events[-1].id)
+        call_command("tail_changes", consumer="export", source=source, stdout=out)  # nothing new
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+    def test_lean_activity_validates_like_the_serializer(self):
+        from .device_views import validate_activity
+        from .serializers import RepeaterActivityCreateSerializer
+
+        good = self.activity_payload()
+        for bad in ({}, dict(good, voltage="123.456", signal_strength=101), dict(good, action="sent", msg_id="x"),
+                    dict(good, stats={"rx_total": "1", "failed": None}), dict(good, device=" ", device_time="")):
+            serializer = RepeaterActivityCreateSerializer(data=bad)
+            self.assertFalse(serializer.is_valid())
+            self.assertEqual(validate_activity(bad), (None, serializer.errors))
+        serializer = RepeaterActivityCreateSerializer(data=good)
+        self.assertTrue(serializer.is_valid())
+        self.assertEqual(validate_activity(good)[0], serializer.validated_data)
+
+        r = self.client.post("/device/repeater/activity/", good, format="json")
+        self.assertEqual((r.status_code, r.json()["status"]), (200, "success"))
+        self.assertEqual(RepeaterStatus.objects.get(device=self.dev).rx_total, 127)
+
+    def test_device_benchmark_compares_both_stacks(self):
+        from api import benchmark
+
+        report = benchmark.run_devices(repeat=2, device="RPT001")
+        for name, case in report["cases"].items():
+            self.assertEqual(case["drf"]["status"], case["lean"]["status"], name)
+            self.assertGreater(case["lean"]["median_ms"], 0)
@@ -0,0 +1,283 @@
+
+"""
+Dense, vectorized timeline engine for repeater metrics.
+
+The activity rows for a window are pulled once as raw columns, turned into
+NumPy arrays, and every bucket statistic is computed with bincount over the
+bucket index of each row. Empty buckets are kept, so callers get a gap-free
+series whose cost depends on the number of buckets rather than on per-row
+Python work.
+
+Fleet metrics over the database (`fleet_from_db`) do the (device, bucket)
+grouping in SQL instead, so only per-bucket aggregates cross the wire and
+the cost follows devices x buckets rather than the row count.
+"""
+import math
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.db.models import Count, FloatField, Func, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Floor
+from django.utils import timezone
+
+BUCKET_SECONDS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600, "1d": 86400}
+MAX_BUCKETS = 5000
+
+COLUMNS = ("timestamp", "device_id", "action", "failed", "voltage", "signal_strength", "tx_power")
+
+
+def load_columns(qs):
+    """
+    Fetch the activity columns needed for metrics, oldest first: one query,
+    or one per table when `qs` is a list of querysets (see repeaters.shards).
+    """
+    qs_list = qs if isinstance(qs, (list, tuple)) else [qs]
+    rows = []
+    for part in qs_list:
+        rows += part.order_by("timestamp").values_list(*COLUMNS)
+    if len(qs_list) > 1:
+        rows.sort(key=lambda row: row[0])
+    n = len(rows)
+    if not n:
+        empty = np.empty(0, dtype=np.float64)
+        return {
+            "ts": empty, "device": np.empty(0, dtype=str),
+            "received": np.empty(0, dtype=bool), "retransmitted": np.empty(0, dtype=bool),
+            "failed": empty, "voltage": empty, "signal_strength": empty, "tx_power": empty,
+        }
+    ts, device, action, failed, voltage, signal, txp = zip(*rows)
+    action = np.array(action)
+    return {
+        "ts": np.fromiter((t.timestamp() for t in ts), dtype=np.float64, count=n),
+        "device": np.array(device),
+        "received": action == "received",
+        "retransmitted": action == "retransmitted",
+        # None -> NaN, Decimal -> float
+        "failed": np.array(failed, dtype=np.float64),
+        "voltage": np.array(voltage, dtype=np.float64),
+        "signal_strength": np.array(signal, dtype=np.float64),
+        "tx_power": np.array(txp, dtype=np.float64),
+    }
+
+
+def _nanmean(values):
+    ok = ~np.isnan(values)
+    return float(values[ok].mean()) if ok.any() else None
+
+
+def _success_rate(received, retransmitted):
+    return round(retransmitted / received * 100, 1) if received > 0 else 0.0
+
+
+def summarize(cols):
+    """Window totals and averages from the same columns the timeline uses."""
+    received = int(cols["received"].sum())
+    retransmitted = int(cols["retransmitted"].sum())
+    # messages_failed: last 'failed' counter seen per device in the window
+    _, last_idx = np.unique(cols["device"][::-1], return_index=True)
+    last_failed = cols["failed"][::-1][last_idx]
+    return {
+        "messages_received": received,
+        "messages_retransmitted": retransmitted,
+        "messages_failed": int(np.nansum(last_failed)),
+        "success_rate": _success_rate(received, retransmitted),
+        "avg_voltage": _nanmean(cols["voltage"]),
+        "avg_signal_strength": _nanmean(cols["signal_strength"]),
+        "avg_tx_power": _nanmean(cols["tx_power"]),
+    }
+
+
+def bucket_grid(start, end, width):
+    """
+    Bucket origin (epoch seconds, aligned to local wall-clock boundaries of
+    `width`) and number of buckets covering [start, end].
+    """
+    offset = timezone.localtime(start).utcoffset().total_seconds()
+    origin = math.floor((start.timestamp() + offset) / width) * width - offset
+    count = max(int(math.ceil((end.timestamp() - origin) / width)), 1)
+    return origin, count
+
+
+def _group_sum(idx, weights, size):
+    return np.bincount(idx, weights=weights, minlength=size)
+
+
+def _group_mean(idx, values, size):
+    ok = ~np.isnan(values)
+    sums = np.bincount(idx[ok], weights=values[ok], minlength=size)
+    hits = np.bincount(idx[ok], minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / hits  # NaN for groups without samples
+
+
+def _grouped(cols, group, groups, start, end, width):
+    """
+    Bucket statistics grouped by (group, bucket) in a single pass: each row's
+    flat index is group * buckets + bucket, and every statistic is one bincount
+    reshaped to (groups, buckets).
+    """
+    origin, count = bucket_grid(start, end, width)
+    bucket = np.clip(((cols["ts"] - origin) // width).astype(np.int64), 0, count - 1)
+    flat = group * count + bucket
+    size = groups * count
+    shape = (groups, count)
+    stats = {
+        "received": _group_sum(flat, cols["received"], size).reshape(shape),
+        "retransmitted": _group_sum(flat, cols["retransmitted"], size).reshape(shape),
+        "failed": _group_mean(flat, cols["failed"], size).reshape(shape),
+        "voltage": _group_mean(flat, cols["voltage"], size).reshape(shape),
+        "signal_strength": _group_mean(flat, cols["signal_strength"], size).reshape(shape),
+    }
+    return origin, count, stats
+
+
+def _series(origin, count, width, stats, row):
+    tz = timezone.get_current_timezone()
+    received, retransmitted = stats["received"][row], stats["retransmitted"][row]
+    failed, voltage, signal = stats["failed"][row], stats["voltage"][row], stats["signal_strength"][row]
+    timeline = []
+    for i in range(count):
+        at = datetime.fromtimestamp(origin + i * width, tz=dt_timezone.utc).astimezone(tz)
+        timeline.append({
+            "timestamp": at.isoformat(),
+            "received": int(received[i]),
+            "retransmitted": int(retransmitted[i]),
+            "failed": 0 if np.isnan(failed[i]) else int(failed[i]),
+            "voltage": None if np.isnan(voltage[i]) else float(voltage[i]),
+            "signal_strength": None if np.isnan(signal[i]) else int(signal[i]),
+        })
+    return timeline
+
+
+def dense_timeline(cols, start, end, width):
+    """One entry per bucket between start and end, including empty buckets."""
+    group = np.zeros(len(cols["ts"]), dtype=np.int64)
+    origin, count, stats = _grouped(cols, group, 1, start, end, width)
+    return _series(origin, count, width, stats, 0)
+
+
+def fleet_metrics(cols, devices, start, end, width):
+    """
+    Per-device metrics and dense timelines for `devices` (rows for other
+    devices are ignored), from one (device, bucket) grouping of the columns.
+    Returns a list in the order of `devices`.
+    """
+    devices = list(devices)
+    position = {d: i for i, d in enumerate(devices)}
+    # map each distinct device in the rows to its output slot (-1 = not requested)
+    uniq, inverse = np.unique(cols["device"], return_inverse=True)
+    slot = np.array([position.get(d, -1) for d in uniq], dtype=np.int64)[inverse]
+    keep = slot >= 0
+    cols = {k: v[keep] for k, v in cols.items()}
+    group = slot[keep]
+
+    n = len(devices)
+    origin, count, stats = _grouped(cols, group, n, start, end, width)
+
+    # last 'failed' counter per device: rows are oldest first, so take the first hit scanning backwards
+    _, last_idx = np.unique(group[::-1], return_index=True)
+    last_failed = np.zeros(n)
+    last_failed[group[::-1][last_idx]] = np.nan_to_num(cols["failed"][::-1][last_idx])
+    totals = {
+        "received": _group_sum(group, cols["received"], n),
+        "retransmitted": _group_sum(group, cols["retransmitted"], n),
+        "failed": last_failed,
+        "voltage": _group_mean(group, cols["voltage"], n),
+        "signal_strength": _group_mean(group, cols["signal_strength"], n),
+        "tx_power": _group_mean(group, cols["tx_power"], n),
+    }
+    return _fleet(devices, origin, count, width, stats, totals)
+
+
+class Epoch(Func):
+    """Seconds since the epoch of a datetime expression."""
+    output_field = FloatField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="CAST(strftime('%%%%s', %(expressions)s) AS REAL)",
+                           **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="EXTRACT(EPOCH FROM %(expressions)s)", **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="UNIX_TIMESTAMP(%(expressions)s)", **extra_context)
+
+
+MEANS = ("failed", "voltage", "signal_strength", "tx_power")
+
+
+def fleet_from_db(qs, devices, start, end, width):
+    """
+    fleet_metrics for `devices`, grouped by (device, bucket) in the database:
+    one aggregate query per table in `qs` (a queryset or a list of them, see
+    repeaters.shards), plus one for each device's last 'failed' counter.
+    """
+    devices = list(devices)
+    position = {d: i for i, d in enumerate(devices)}
+    n = len(devices)
+    origin, count = bucket_grid(start, end, width)
+    sums = {name: np.zeros((n, count)) for name in ("received", "retransmitted", *(f"{m}_sum" for m in MEANS),
+                                                     *(f"{m}_n" for m in MEANS))}
+    last = {}  # device -> (timestamp, failed) of its newest row
+
+    for part in (qs if isinstance(qs, (list, tuple)) else [qs]):
+        part = part.order_by()
+        buckets = (part.annotate(bucket=Floor((Epoch("timestamp") - Value(origin)) / Value(width)))
+                   .values("device_id", "bucket")
+                   .annotate(received=Count("pk", filter=Q(action="received")),
+                             retransmitted=Count("pk", filter=Q(action="retransmitted")),
+                             **{f"{m}_sum": Sum(m) for m in MEANS}, **{f"{m}_n": Count(m) for m in MEANS}))
+        for row in buckets:
+            i = position.get(row["device_id"])
+            if i is None:
+                continue
+            b = min(max(int(row["bucket"]), 0), count - 1)
+            for name, grid in sums.items():
+                grid[i, b] += float(row[name] or 0)
+
+        newest = part.filter(device_id=OuterRef("device_id")).order_by("-timestamp").values("failed")[:1]
+        for row in part.values("device_id").annotate(at=Max("timestamp"), last_failed=Subquery(newest)):
+            seen = last.get(row["device_id"])
+            if seen is None or row["at"] > seen[0]:
+                last[row["device_id"]] = (row["at"], row["last_failed"])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stats = {"received": sums["received"], "retransmitted": sums["retransmitted"]}
+        stats.update((m, sums[f"{m}_sum"] / sums[f"{m}_n"]) for m in MEANS)  # NaN for buckets without samples
+        totals = {"received": sums["received"].sum(axis=1), "retransmitted": sums["retransmitted"].sum(axis=1)}
+        totals.update((m, sums[f"{m}_sum"].sum(axis=1) / sums[f"{m}_n"].sum(axis=1)) for m in MEANS)
+    totals["failed"] = np.array([(last.get(d) or (None, 0))[1] or 0 for d in devices], dtype=np.float64)
+    return _fleet(devices, origin, count, width, stats, totals)
+
+
+def _fleet(devices, origin, count, width, stats, totals):
+    """Output rows for fleet mode from (devices, buckets) `stats` and per-device `totals`."""
+    received, retransmitted = totals["received"], totals["retransmitted"]
+    voltage, signal, txp = totals["voltage"], totals["signal_strength"], totals["tx_power"]
+    fleet = []
+    for i, device in enumerate(devices):
+        series = _series(origin, count, width, stats, i)
+        fleet.append({
+            "device": device,
+            "metrics": {
+                "messages_received": int(received[i]),
+                "messages_retransmitted": int(retransmitted[i]),
+                "messages_failed": int(totals["failed"][i]),
+                "success_rate": _success_rate(int(received[i]), int(retransmitted[i])),
+                "avg_voltage": None if np.isnan(voltage[i]) else float(voltage[i]),
+                "avg_signal_strength": None if np.isnan(signal[i]) else float(signal[i]),
+                "avg_tx_power": None if np.isnan(txp[i]) else float(txp[i]),
+                "uptime_percentage": uptime_percentage(series),
+            },
+            "timeline": series,
+        })
+    return fleet
+
+
+def uptime_percentage(timeline):
+    """Share of buckets in the window that saw any activity."""
+    if not timeline:
+        return 0.0
+    active = sum(1 for r in timeline if r["received"] or r["retransmitted"])
+    return round(active / len(timeline) * 100.0, 1)
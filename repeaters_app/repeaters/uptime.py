@@ -0,0 +1,34 @@
+
+"""
+Heartbeat-based uptime sessions.
+
+Every activity is a heartbeat. A session opens on the first heartbeat and
+stays open while heartbeats keep arriving within SESSION_GAP of each other;
+a longer silence closes it at the last heartbeat seen. uptime_seconds on
+RepeaterStatus accumulates time spent inside sessions, and closed sessions
+are kept as RepeaterSession rows (one insert per session, not per event).
+"""
+from datetime import timedelta
+from django.conf import settings
+
+SESSION_GAP = timedelta(seconds=getattr(settings, "REPEATER_SESSION_GAP_SECONDS", 120))
+
+
+def heartbeat(status, now):
+    """
+    Advance the session state on `status` to `now`. Returns the closed
+    (started_at, ended_at) interval when this heartbeat started a new
+    session after a gap, else None. Caller saves status.
+    """
+    closed = None
+    previous = status.last_seen
+    if status.session_started_at is None:
+        status.session_started_at = now
+    elif now - previous > SESSION_GAP:
+        closed = (status.session_started_at, previous)
+        status.last_session_started_at, status.last_session_ended_at = closed
+        status.session_started_at = now
+    else:
+        status.uptime_seconds = (status.uptime_seconds or 0) + int((now - previous).total_seconds())
+    status.last_seen = now
+    return closed
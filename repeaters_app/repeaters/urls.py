@@ -5,6 +5,8 @@ from .views import (
     RepeaterStatusView,
     RepeaterHistoryView,
     RepeaterMetricsView,
+    RepeaterAlertsView,
+    RepeaterConfigView,
 )
 
 urlpatterns = [
@@ -12,4 +14,6 @@ urlpatterns = [
     path("api/repeater/status/", RepeaterStatusView.as_view(), name="repeater_status"),
     path("api/repeater/history/", RepeaterHistoryView.as_view(), name="repeater_history"),
     path("api/repeater/metrics/", RepeaterMetricsView.as_view(), name="repeater_metrics"),
+    path("api/repeater/alerts/", RepeaterAlertsView.as_view(), name="repeater_alerts"),
+    path("api/repeater/config/", RepeaterConfigView.as_view(), name="repeater_config"),
 ]
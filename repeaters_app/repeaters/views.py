@@ -1,15 +1,19 @@
 
 from datetime import timedelta
-from django.db.models.functions import TruncHour, TruncMinute
-from django.db.models import Avg, Count, Q, F
+from decimal import Decimal, InvalidOperation
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.db import IntegrityError
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny  # swap to IsAuthenticated if using JWT
+from rest_framework.permissions import AllowAny, IsAdminUser  # swap to IsAuthenticated if using JWT
 from rest_framework.exceptions import ValidationError, NotFound
-from .models import RepeaterActivity, RepeaterStatus, RepeaterDevice
+from .models import RepeaterStatus, RepeaterDevice
 from .serializers import RepeaterActivityCreateSerializer, RepeaterStatusSerializer
 from .auth import require_device_key
+from api.idempotency import idempotency_key, replay, remember
+from api.pagination import wants_exact
+from . import timeline, health, uptime, ingest, pagination, shards, analytics, config, recent
 
 class RepeaterActivityView(APIView):
     permission_classes = [AllowAny]
@@ -17,95 +21,198 @@ class RepeaterActivityView(APIView):
     def post(self, request):
         serializer = RepeaterActivityCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        data = serializer.validated_data
-        device_id = data["device"]
-        # Optional device key check (POC-friendly: only checks if present in DB)
-        device = require_device_key(request, device_id)
+        payload, status, replayed = record(request, serializer.validated_data)
+        return Response(payload, status=status, headers={"Idempotent-Replayed": "true"} if replayed else None)
 
-        # Create activity
-        activity = RepeaterActivity.objects.create(
-            device=device,
-            msg_id=data["msg_id"],
-            message=data["message"],
-            action=data["action"],
-            voltage=data.get("voltage"),
-            signal_strength=data.get("signal_strength"),
-            tx_power=data.get("tx_power"),
-            rx_total=data["stats"]["rx_total"],
-            tx_total=data["stats"]["tx_total"],
-            failed=data["stats"]["failed"],
-        )
-
-        # Update status
-        status, _ = RepeaterStatus.objects.get_or_create(device=device)
-        status.last_seen = timezone.now()
-        if data.get("voltage") is not None:
-            status.voltage = data.get("voltage")
-        if data.get("signal_strength") is not None:
-            status.signal_strength = data.get("signal_strength")
-        if data.get("tx_power") is not None:
-            status.tx_power = data.get("tx_power")
-        status.rx_total = data["stats"]["rx_total"]
-        status.tx_total = data["stats"]["tx_total"]
-        status.failed = data["stats"]["failed"]
-        # naive uptime bump: assume 2 seconds per activity if online
-        status.uptime_seconds = (status.uptime_seconds or 0) + 2
-        status.save()
 
-        return Response({
-            "status": "success",
-            "activity_id": activity.id,
-            "timestamp": activity.timestamp.isoformat()
-        })
+def record(request, data):
+    """
+    The POST work of RepeaterActivityView for validated `data`. Returns
+    (payload, status, replayed); shared with the lean device view
+    (repeaters.device_views) and, through repeaters.async_views, the async
+    view and the WebSocket gateway. Raises AuthenticationFailed for a bad
+    device key.
+    """
+    device_id = data["device"]
+    # Optional device key check (POC-friendly: only checks if present in DB)
+    device = require_device_key(request, device_id)
+
+    # A retried POST (lost HTTP response) replays the original answer
+    key = idempotency_key(request, device_id, data["msg_id"], data["action"], data.get("device_time"))
+    hit = replay("activity", key)
+    if hit:
+        return hit[0], hit[1], True
+
+    # Activity insert + status upsert in one short transaction (see repeaters.ingest)
+    replayed = False
+    try:
+        activity = ingest.record_activity(device, data, idempotency_key=key)
+    except IntegrityError:
+        if not key:
+            raise
+        # Duplicate that missed the cache: status was already updated by the original
+        activity = shards.get(idempotency_key=key)
+        replayed = True
+
+    payload = {
+        "status": "success",
+        "activity_id": activity.id,
+        "timestamp": activity.timestamp.isoformat(),
+        "config_hash": device.config_hash,  # fetch /api/repeater/config/ when this changes
+    }
+    remember("activity", key, payload, 200)
+    return payload, 200, replayed
+
+
+def _status_payload(s, online):
+    return {
+        "device": s.device_id,
+        "online": online,
+        "last_seen": s.last_seen.isoformat(),
+        "voltage": float(s.voltage) if s.voltage is not None else None,
+        "signal_strength": s.signal_strength,
+        "tx_power": s.tx_power,
+        "stats": {
+            "rx_total": s.rx_total,
+            "tx_total": s.tx_total,
+            "failed": s.failed,
+            "success_rate": round((s.tx_total / s.rx_total * 100), 1) if s.rx_total > 0 else 0.0
+        },
+        "uptime_seconds": s.uptime_seconds or 0,
+        "session_started_at": s.session_started_at.isoformat() if online and s.session_started_at else None,
+    }
 
 
 class RepeaterStatusView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
+        """
+        GET /api/repeater/status/?device=RPT001
+        GET /api/repeater/status/?online=true|false&offline_since=<ISO>&voltage_below=11.0&limit=100&offset=0
+
+        Filters run in SQL: online/offline are range predicates on last_seen
+        (idx_status_last_seen) against one cutoff computed per request.
+        """
+        now = timezone.now()
+        cutoff = now - uptime.SESSION_GAP
+        qs = RepeaterStatus.objects.all()
+
         device_id = request.GET.get("device")
         if device_id:
+            qs = qs.filter(device_id=device_id)
+
+        online = request.GET.get("online")
+        if online is not None:
+            if online.lower() in ("1", "true", "yes"):
+                qs = qs.filter(last_seen__gte=cutoff)
+            elif online.lower() in ("0", "false", "no"):
+                qs = qs.filter(last_seen__lt=cutoff)
+            else:
+                raise ValidationError("Invalid 'online'; use true or false")
+
+        offline_since = request.GET.get("offline_since")
+        if offline_since:
+            since = parse_datetime(offline_since)
+            if since is None:
+                raise ValidationError("Invalid 'offline_since'; use an ISO 8601 datetime")
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            qs = qs.filter(last_seen__lt=since)
+
+        voltage_below = request.GET.get("voltage_below")
+        if voltage_below:
             try:
-                s = RepeaterStatus.objects.select_related("device").get(device__device=device_id)
-            except RepeaterStatus.DoesNotExist:
-                return Response({"repeaters": []})
-            online = (timezone.now() - s.last_seen).total_seconds() < 120
-            payload = {
-                "device": s.device.device,
-                "online": online,
-                "last_seen": s.last_seen.isoformat(),
-                "voltage": float(s.voltage) if s.voltage is not None else None,
-                "signal_strength": s.signal_strength,
-                "tx_power": s.tx_power,
-                "stats": {
-                    "rx_total": s.rx_total,
-                    "tx_total": s.tx_total,
-                    "failed": s.failed,
-                    "success_rate": round((s.tx_total / s.rx_total * 100), 1) if s.rx_total > 0 else 0.0
-                },
-                "uptime_seconds": s.uptime_seconds or 0,
-            }
-            return Response({"repeaters": [payload]})
-        else:
-            items = []
-            for s in RepeaterStatus.objects.select_related("device").all():
-                online = (timezone.now() - s.last_seen).total_seconds() < 120
-                items.append({
-                    "device": s.device.device,
-                    "online": online,
-                    "last_seen": s.last_seen.isoformat(),
-                    "voltage": float(s.voltage) if s.voltage is not None else None,
-                    "signal_strength": s.signal_strength,
-                    "tx_power": s.tx_power,
-                    "stats": {
-                        "rx_total": s.rx_total,
-                        "tx_total": s.tx_total,
-                        "failed": s.failed,
-                        "success_rate": round((s.tx_total / s.rx_total * 100), 1) if s.rx_total > 0 else 0.0
-                    },
-                    "uptime_seconds": s.uptime_seconds or 0,
-                })
-            return Response({"repeaters": items})
+                qs = qs.filter(voltage__lt=Decimal(voltage_below))
+            except InvalidOperation:
+                raise ValidationError("Invalid 'voltage_below'")
+
+        try:
+            limit = max(1, min(int(request.GET.get("limit", 100)), 1000))
+            offset = max(0, int(request.GET.get("offset", 0)))
+        except ValueError:
+            raise ValidationError("Invalid 'limit' or 'offset'")
+
+        total = qs.count()
+        page = qs.order_by("-last_seen", "device_id")[offset:offset + limit]
+        return Response({
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "repeaters": [_status_payload(s, s.last_seen >= cutoff) for s in page],
+        })
+
+
+class RepeaterConfigView(APIView):
+    """
+    GET  ?device=RPT001 (device key auth): current config; 304 when If-None-Match
+         (or ?hash=) already names its hash.
+    POST {"device": ..., "config": {...}} (staff only): publish a new version (see repeaters.config).
+    """
+
+    def get_permissions(self):
+        # devices read their own config with their key (checked in get); publishing is for operators
+        return [IsAdminUser()] if self.request.method == "POST" else [AllowAny()]
+
+    def get(self, request):
+        device_id = request.GET.get("device")
+        if not device_id:
+            raise ValidationError("Missing required 'device' parameter")
+        device = require_device_key(request, device_id)
+        if not device.config_hash:
+            raise NotFound("No config published for this device")
+        headers = {"ETag": config.etag(device.config_hash)}
+        known = request.headers.get("If-None-Match") or request.GET.get("hash")
+        if config.matches(known, device.config_hash):
+            return Response(status=304, headers=headers)
+        current = config.current(device)
+        if current is None or current.hash != device.config_hash:
+            # cached device row is behind a publish from another process
+            device = RepeaterDevice.objects.get(pk=device_id)
+            current = config.current(device)
+            if current is None:
+                raise NotFound("No config published for this device")
+            headers = {"ETag": config.etag(current.hash)}
+        return Response({
+            "device": device_id,
+            "version": current.version,
+            "hash": current.hash,
+            "config": current.config,
+        }, headers=headers)
+
+    def post(self, request):
+        device_id = request.data.get("device")
+        cfg = request.data.get("config")
+        if not device_id:
+            raise ValidationError("Missing 'device'")
+        if not isinstance(cfg, dict):
+            raise ValidationError("Missing or invalid 'config' (object)")
+        try:
+            before = RepeaterDevice.objects.values_list("config_version", flat=True).get(pk=device_id)
+        except RepeaterDevice.DoesNotExist:
+            raise NotFound("Device not found")
+        current = config.publish(device_id, cfg)
+        return Response({"device": device_id, "version": current.version, "hash": current.hash},
+                        status=201 if current.version != before else 200)
+
+
+class RepeaterAlertsView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        # thresholds default to settings; any can be overridden per request, e.g. ?voltage_min=11.5
+        thresholds = dict(health.THRESHOLDS)
+        for name in thresholds:
+            if name in request.GET:
+                try:
+                    thresholds[name] = float(request.GET[name])
+                except ValueError:
+                    raise ValidationError(f"Invalid '{name}'")
+        statuses = RepeaterStatus.objects.filter(health.alert_filter(thresholds)).order_by("device")
+        return Response({
+            "thresholds": thresholds,
+            "alerts": [health.describe(s, thresholds) for s in statuses],
+        })
 
 
 class RepeaterHistoryView(APIView):
@@ -118,13 +225,29 @@ class RepeaterHistoryView(APIView):
         limit = min(int(request.GET.get("limit", 50)), 200)
         offset = int(request.GET.get("offset", 0))
         try:
-            device = RepeaterDevice.objects.get(pk=device_id)
+            device = RepeaterDevice.objects.select_related("status").get(pk=device_id)
         except RepeaterDevice.DoesNotExist:
             raise NotFound("Device not found")
 
-        qs = RepeaterActivity.objects.filter(device=device).order_by("-timestamp")
-        total = qs.count()
-        items = list(qs[offset:offset+limit])
+        # optional ?since=&until= window; only the shards it overlaps are read
+        window = {}
+        for name, lookup in (("since", "timestamp__gte"), ("until", "timestamp__lte")):
+            value = request.GET.get(name)
+            if value:
+                parsed = parse_datetime(value)
+                if parsed is None:
+                    raise ValidationError(f"Invalid '{name}'; use an ISO 8601 datetime")
+                window[lookup] = parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+        # the analytics copy when fresh, else the primary tables (see repeaters.analytics)
+        since, until = window.get("timestamp__gte"), window.get("timestamp__lte")
+        tables = [qs.filter(device=device, **window).order_by("-timestamp")
+                  for qs in analytics.activity_querysets(since, until)]
+        if window or wants_exact(request):
+            total, estimated = shards.count(tables), False
+        else:
+            # maintained counter instead of COUNT(*) on busy devices; ?exact=1 forces the count
+            total, estimated = pagination.device_activity_count(device)
+        items = shards.page(tables, offset, limit)
 
         # Pair received/retransmitted by msg_id to compute relay_time_ms
         # We'll build a map of first 'received' and first subsequent 'retransmitted'
@@ -178,6 +301,7 @@ class RepeaterHistoryView(APIView):
         return Response({
             "device": device_id,
             "total": total,
+            "total_estimated": estimated,
             "history": history,
         })
 
@@ -193,72 +317,66 @@ class RepeaterMetricsView(APIView):
         delta = mapping.get(period, timedelta(hours=24))
         start = now - delta
 
-        qs = RepeaterActivity.objects.filter(timestamp__gte=start, timestamp__lte=now)
+        # bucket width: explicit ?bucket=1m|5m|15m|1h|1d, else per minute up to 6h, per hour beyond
+        bucket = request.GET.get("bucket") or ("1m" if delta <= timedelta(hours=6) else "1h")
+        if bucket not in timeline.BUCKET_SECONDS:
+            raise ValidationError(f"Invalid 'bucket'; use one of {', '.join(timeline.BUCKET_SECONDS)}")
+        width = timeline.BUCKET_SECONDS[bucket]
+        if delta.total_seconds() / width > timeline.MAX_BUCKETS:
+            raise ValidationError(f"Too many buckets for period {period} at {bucket}")
+
+        # one queryset per table holding the window (see repeaters.shards), or the analytics
+        # copy when it is fresh (repeaters.analytics); filters apply to each
+        tables = [qs.filter(timestamp__gte=start, timestamp__lte=now) for qs in analytics.activity_querysets(start, now)]
+
+        # fleet mode: ?devices=RPT001,RPT002 or ?devices=all -> per-device metrics grouped by (device, bucket),
+        # from the ring buffer when it covers the window, else in SQL (only the aggregates are fetched)
+        devices_param = request.GET.get("devices")
+        if devices_param:
+            if devices_param == "all":
+                devices = list(RepeaterDevice.objects.order_by("device").values_list("device", flat=True))
+            else:
+                devices = list(dict.fromkeys(d.strip() for d in devices_param.split(",") if d.strip()))
+                tables = [qs.filter(device__in=devices) for qs in tables]
+            cols = recent.load_columns(start, now, None if devices_param == "all" else devices)
+            if cols is None:
+                fleet = timeline.fleet_from_db(tables, devices, start, now, width)
+            else:
+                fleet = timeline.fleet_metrics(cols, devices, start, now, width)
+            return Response({
+                "devices": devices,
+                "period": period if period in ["1h", "24h", "7d", "30d"] else "24h",
+                "bucket": bucket,
+                "fleet": fleet,
+            })
+
         if device_id:
-            qs = qs.filter(device__device=device_id)
-
-        messages_received = qs.filter(action="received").count()
-        messages_retransmitted = qs.filter(action="retransmitted").count()
-        # failed is tricky; we approximate as sum of 'failed' deltas on any activity rows
-        # or simply average failed and multiply by unique device count; for POC, sum of last 'failed' seen per device in period
-        failed_by_device = (
-            qs.order_by("device", "-timestamp")
-              .distinct("device")
-              .values("device", "failed")
-        )
-        messages_failed = sum(d.get("failed", 0) or 0 for d in failed_by_device)
-
-        # averages
-        agg = qs.aggregate(
-            avg_voltage=Avg("voltage"),
-            avg_signal_strength=Avg("signal_strength"),
-            avg_tx_power=Avg("tx_power"),
-        )
-        success_rate = round((messages_retransmitted / messages_received * 100), 1) if messages_received > 0 else 0.0
-
-        # compute timeline buckets
-        bucket = TruncMinute if delta <= timedelta(hours=6) else TruncHour
-        tl = (
-            qs.annotate(ts=bucket("timestamp"))
-              .values("ts")
-              .annotate(
-                  received=Count("id", filter=Q(action="received")),
-                  retransmitted=Count("id", filter=Q(action="retransmitted")),
-                  failed_avg=Avg("failed"),
-                  voltage=Avg("voltage"),
-                  signal_strength=Avg("signal_strength"),
-              )
-              .order_by("ts")
-        )
-        timeline = [{
-            "timestamp": row["ts"].isoformat() if row["ts"] else None,
-            "received": row["received"],
-            "retransmitted": row["retransmitted"],
-            "failed": int(row["failed_avg"] or 0),
-            "voltage": float(row["voltage"]) if row["voltage"] is not None else None,
-            "signal_strength": int(row["signal_strength"]) if row["signal_strength"] is not None else None,
-        } for row in tl]
-
-        # uptime percentage: approximate as percentage of buckets with any activity
-        total_buckets = len(timeline) or 1
-        active_buckets = sum(1 for r in timeline if (r["received"] or r["retransmitted"]))
-        uptime_percentage = round(active_buckets / total_buckets * 100.0, 1) if total_buckets > 0 else 0.0
+            tables = [qs.filter(device__device=device_id) for qs in tables]
+
+        # recent windows come from this process's ring buffer (repeaters.recent); otherwise one query per
+        # table for the raw columns. Totals, averages and the dense timeline come from the arrays
+        cols = recent.load_columns(start, now, [device_id] if device_id else None)
+        if cols is None:
+            cols = timeline.load_columns(tables)
+        summary = timeline.summarize(cols)
+        series = timeline.dense_timeline(cols, start, now, width)
 
         device_field = device_id if device_id else None
 
         return Response({
             "device": device_field,
             "period": period if period in ["1h", "24h", "7d", "30d"] else "24h",
+            "bucket": bucket,
             "metrics": {
-                "messages_received": messages_received,
-                "messages_retransmitted": messages_retransmitted,
-                "messages_failed": messages_failed,
-                "success_rate": success_rate,
+                "messages_received": summary["messages_received"],
+                "messages_retransmitted": summary["messages_retransmitted"],
+                "messages_failed": summary["messages_failed"],
+                "success_rate": summary["success_rate"],
                 "avg_relay_time_ms": None,  # not tracked directly; could be derived in future
-                "avg_voltage": float(agg["avg_voltage"]) if agg["avg_voltage"] is not None else None,
-                "avg_signal_strength": float(agg["avg_signal_strength"]) if agg["avg_signal_strength"] is not None else None,
-                "avg_tx_power": float(agg["avg_tx_power"]) if agg["avg_tx_power"] is not None else None,
-                "uptime_percentage": uptime_percentage,
+                "avg_voltage": summary["avg_voltage"],
+                "avg_signal_strength": summary["avg_signal_strength"],
+                "avg_tx_power": summary["avg_tx_power"],
+                "uptime_percentage": timeline.uptime_percentage(series),
             },
-            "timeline": timeline
+            "timeline": series
         })
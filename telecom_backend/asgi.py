@@ -1,4 +1,14 @@
 import os
 from django.core.asgi import get_asgi_application
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'telecom_backend.settings')
-application = get_asgi_application()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'telecom_backend.settings_asgi')
+django_application = get_asgi_application()
+
+from telecom_backend import gateway  # noqa: E402  (needs the app registry)
+
+
+async def application(scope, receive, send):
+    # WebSocket device gateway on /ws/gateway/; everything else is Django
+    if scope['type'] == 'websocket':
+        await gateway.application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,22 @@
+"""
+Device URL namespace (DEVICE_URL_PREFIX, /device/ by default): the lean,
+DRF-free views for ESP32 polls and posts. Mounted in telecom_backend.urls,
+and answered ahead of the browser middleware by
+telecom_backend.devices.DeviceRouteMiddleware.
+"""
+from django.apps import apps
+from django.urls import path
+
+from api import device_views
+
+urlpatterns = [
+    path("tx/pending/", device_views.tx_pending, name="device_tx_pending"),
+    path("rx/", device_views.rx_message, name="device_rx"),
+]
+
+if apps.is_installed("repeaters"):
+    from repeaters import device_views as repeater_device_views
+    urlpatterns.append(path("repeater/activity/", repeater_device_views.repeater_activity,
+                            name="device_repeater_activity"))
+else:
+    urlpatterns.append(path("repeater/activity/", device_views.repeater_activity, name="device_repeater_activity"))
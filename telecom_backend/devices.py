@@ -0,0 +1,54 @@
+"""
+Short middleware chain for device requests.
+
+Django runs every request through the whole MIDDLEWARE list, but ESP32
+devices never use sessions, cookies, CSRF tokens, CORS or the auth/messages
+machinery. DeviceRouteMiddleware sits right after SecurityMiddleware and the
+ingest rate limiter: a request under DEVICE_URL_PREFIX that matches
+telecom_backend.device_urls is handed straight to its view, and the
+middleware below it is skipped. Anything else under the prefix (an unknown
+path) continues down the normal chain and gets the usual 404.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.urls import Resolver404, get_resolver
+
+PREFIX = getattr(settings, "DEVICE_URL_PREFIX", "/device/")
+URLCONF = "telecom_backend.device_urls"
+
+
+class DeviceRouteMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.resolver = get_resolver(URLCONF)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _match(self, request):
+        """The device view's ResolverMatch, or None to pass the request down the chain."""
+        if not request.path_info.startswith(PREFIX):
+            return None
+        try:
+            match = self.resolver.resolve("/" + request.path_info[len(PREFIX):])
+        except Resolver404:
+            return None
+        request.resolver_match = match
+        return match
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        match = self._match(request)
+        if match is None:
+            return self.get_response(request)
+        return match.func(request, *match.args, **match.kwargs)
+
+    async def __acall__(self, request):
+        match = self._match(request)
+        if match is None:
+            return await self.get_response(request)
+        view = match.func if iscoroutinefunction(match.func) else sync_to_async(match.func)
+        return await view(request, *match.args, **match.kwargs)
@@ -0,0 +1,219 @@
+"""
+WebSocket gateway for ESP32 devices (ASGI only, see asgi.py).
+
+One socket replaces polling tx/pending and posting rx / repeater activity:
+
+    ws://host/ws/gateway/?gateway=GW01&groups=north,coast
+    headers X-Device / X-Device-Key (or ?device=&key=) when the repeaters app is installed
+
+Server -> device:
+    {"type": "tx", ...same fields as GET /api/tx/pending/...}
+    {"type": "rx_ok" | "activity_ok" | "error", "ref": <echoed>, ...}
+    rx / activity over the ingest rate limits (api.ratelimit) get an error
+    with "status": 429 and "retry_after" seconds
+
+Device -> server (JSON text frames; optional "ref" is echoed back and
+"idempotency_key" plays the Idempotency-Key header):
+    {"type": "ready", "credit": 1}     ask for up to `credit` more TX pushes
+    {"type": "rx", ...rx body...}      same body as POST /api/rx/
+    {"type": "activity", ...}          same body as POST /api/repeater/activity/
+
+TX messages are claimed as INFLIGHT exactly as a poll would claim them (the
+sweeper still retries unacknowledged ones) and only pushed while the device
+has credit, so a gateway is never sent more than it asked for. One
+dispatcher per process looks for due messages on the queues of connected
+devices every GATEWAY_TICK_SECONDS, and immediately when this process
+enqueues TX (api.signals.tx_enqueued). Enqueues from other processes wait
+for the next tick. A failed pass (e.g. a database error) is logged and
+retried on the next tick rather than stopping the dispatcher.
+"""
+import asyncio
+import json
+import logging
+from types import SimpleNamespace
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+
+from api import ratelimit
+from api.async_views import claim, record_rx
+from api.models import Transmission
+from api.signals import tx_enqueued
+from api.views import _poll_queues, _pending_payload
+
+logger = logging.getLogger(__name__)
+
+PATH = "/ws/gateway/"
+TICK = getattr(settings, "GATEWAY_TICK_SECONDS", 1.0)
+BATCH = 200  # due messages looked at per dispatch pass
+MAX_CREDIT = 16
+
+
+class Connection:
+    def __init__(self, send, device, key, queues, client=""):
+        self.send = send
+        self.device = device
+        self.client = client  # rate-limit identity when the socket has no device (None: global bucket only)
+        self.key = key
+        self.queues = queues
+        self.credit = 0
+
+    def request(self, message):
+        """Stands in for the HTTP request in the shared rx/activity handlers."""
+        headers = {"X-Device-Key": self.key, "Idempotency-Key": str(message.get("idempotency_key") or "")}
+        return SimpleNamespace(headers=headers, META={})
+
+    async def send_json(self, data):
+        await self.send({"type": "websocket.send", "text": json.dumps(data, default=str)})
+
+
+class Hub:
+    """Connected devices of this process and the dispatcher that pushes TX to them."""
+
+    def __init__(self):
+        self.connections = set()
+        self.loop = None
+        self.wake = None
+        self.task = None
+
+    def add(self, conn):
+        self.connections.add(conn)
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.loop is not loop:
+            self.loop, self.wake = loop, asyncio.Event()
+            self.task = loop.create_task(self.run())
+
+    def remove(self, conn):
+        self.connections.discard(conn)
+
+    def notify(self, **kwargs):
+        # called from request threads; wake the dispatcher on its own loop
+        if self.loop is not None and self.wake is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.wake.set)
+
+    async def run(self):
+        while self.connections:
+            try:
+                await asyncio.wait_for(self.wake.wait(), TICK)
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+            try:
+                await self.dispatch()
+            except Exception:
+                logger.exception("gateway TX dispatch failed")
+
+    async def dispatch(self):
+        ready = [c for c in self.connections if c.credit > 0]
+        if not ready:
+            return
+        now = timezone.now()
+        targets = set().union(*(c.queues for c in ready))
+        due = (Transmission.objects
+               .filter(role="TX", status="PENDING", target__in=targets)
+               .filter(Q(not_before__isnull=True) | Q(not_before__lte=now))
+               .order_by("-priority", "timestamp")[:BATCH])
+        async for pending in due:
+            # a device's own queue before its groups before the shared queue, then most credit
+            takers = [c for c in ready if c.credit > 0 and pending.target in c.queues]
+            if not takers:
+                continue
+            conn = min(takers, key=lambda c: (c.queues.index(pending.target), -c.credit))
+            if not await claim(pending, now):
+                continue
+            conn.credit -= 1
+            await conn.send_json({"type": "tx", **_pending_payload(pending)})
+
+
+hub = Hub()
+tx_enqueued.connect(hub.notify, dispatch_uid="telecom_backend.gateway")
+
+
+def _authenticate(device, key):
+    if not device or not apps.is_installed("repeaters"):
+        return
+    from repeaters.auth import require_device_key
+    require_device_key(SimpleNamespace(headers={"X-Device-Key": key}, META={}), device)
+
+
+async def _handle(conn, message):
+    kind = message.get("type")
+    if kind == "ready":
+        try:
+            conn.credit = min(conn.credit + max(int(message.get("credit", 1)), 0), MAX_CREDIT)
+        except (TypeError, ValueError):
+            return {"type": "error", "error": "Invalid credit"}
+        hub.notify()
+        return None
+    if kind in ("rx", "activity"):
+        allowed, wait, scope = await ratelimit.acheck(ratelimit.key_id(conn.key) if conn.key
+                                                      else conn.device or conn.client)
+        if not allowed:
+            return {"type": "error", "status": 429, "error": "Rate limit exceeded", "scope": scope,
+                    "retry_after": round(wait, 3)}
+    if kind == "rx":
+        if conn.device:
+            message.setdefault("device", conn.device)
+        body, status, replayed = await record_rx(conn.request(message), message)
+        return {"type": "rx_ok" if status < 400 else "error", "status": status, "replayed": replayed, **body}
+    if kind == "activity":
+        if not apps.is_installed("repeaters"):
+            return {"type": "error", "error": "Repeater telemetry is not enabled"}
+        if conn.device and message.get("device") != conn.device:
+            return {"type": "error", "error": "Activity must be for the connected device"}
+        from repeaters.async_views import record
+        body, status, replayed = await record(conn.request(message), message)
+        return {"type": "activity_ok" if status < 400 else "error", "status": status, "replayed": replayed, **body}
+    return {"type": "error", "error": f"Unknown message type {kind!r}"}
+
+
+async def application(scope, receive, send):
+    """ASGI app for the gateway socket."""
+    if (await receive())["type"] != "websocket.connect":
+        return
+    if scope["path"] != PATH:
+        await send({"type": "websocket.close", "code": 4404})
+        return
+    headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+    params = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode()).items()}
+    device = headers.get("x-device") or params.get("device", "")
+    key = headers.get("x-device-key") or params.get("key", "")
+    try:
+        await sync_to_async(_authenticate)(device, key)
+    except AuthenticationFailed:
+        await send({"type": "websocket.close", "code": 4401})
+        return
+    await send({"type": "websocket.accept"})
+
+    params.setdefault("gateway", device)
+    address = (scope.get("client") or [None])[0] if ratelimit.BY_ADDRESS else None
+    client = params["gateway"] or address
+    conn = Connection(send, device, key, _poll_queues(params), client)
+    hub.add(conn)
+    try:
+        while True:
+            event = await receive()
+            if event["type"] == "websocket.disconnect":
+                break
+            if event["type"] != "websocket.receive":
+                continue
+            try:
+                message = json.loads(event.get("text") or event.get("bytes") or b"")
+            except ValueError:
+                await conn.send_json({"type": "error", "error": "Invalid JSON"})
+                continue
+            if not isinstance(message, dict):
+                await conn.send_json({"type": "error", "error": "Expected a JSON object"})
+                continue
+            reply = await _handle(conn, message)
+            if reply is not None:
+                if "ref" in message:
+                    reply["ref"] = message["ref"]
+                await conn.send_json(reply)
+    finally:
+        hub.remove(conn)
@@ -18,6 +18,10 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # device ingest rate limits, before sessions/CSRF and body parsing (see api.ratelimit)
+    'api.ratelimit.RateLimitMiddleware',
+    # device URLs (DEVICE_URL_PREFIX) skip everything below (see telecom_backend.devices)
+    'telecom_backend.devices.DeviceRouteMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -43,7 +47,18 @@ TEMPLATES = [{
 
 WSGI_APPLICATION = 'telecom_backend.wsgi.application'
 
-DATABASES = {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'db.sqlite3'}}
+DATABASES = {'default': {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': BASE_DIR / 'db.sqlite3',
+    # keep connections across requests; checked before reuse
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'timeout': 20,
+        # WAL lets dashboard reads run alongside ingest writes
+        'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+    },
+}}
 
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'Africa/Harare'
@@ -56,3 +71,41 @@ CORS_ALLOW_ALL_ORIGINS = True
 REST_FRAMEWORK = {'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer']}
 
 ALLOWED_HOSTS = ["*",]  # dev only
+
+# The ingest rate limits (api.ratelimit) must see every gunicorn worker's
+# requests, so they keep their buckets in a cache the workers share: files on
+# this host. With several ingest hosts, point 'ratelimit' at Redis or Memcached.
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'ratelimit': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'var' / 'ratelimit',
+        'OPTIONS': {'MAX_ENTRIES': 100000},  # one per device; culling scans the directory
+    },
+}
+INGEST_RATE_LIMIT_CACHE = 'ratelimit'
+# devices that send no key or name count against the global bucket only; set
+# this when REMOTE_ADDR is the device's own address (no proxy or NAT in front)
+INGEST_RATE_LIMIT_BY_ADDRESS = False
+
+# Request-path events (api.eventlog): JSON lines written from a background
+# thread, so a slow stdout never holds up a request. DEBUG adds the RX-miss
+# diagnostics (and their extra query).
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'api.eventlog.JsonFormatter'},
+    },
+    'handlers': {
+        'events': {'()': 'api.eventlog.NonBlockingHandler', 'formatter': 'json'},
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.events': {'handlers': ['events'], 'level': 'INFO', 'propagate': False},
+        # worker warm-up timings (telecom_backend.warmup), gateway errors
+        'telecom_backend': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+# per-event sampling, e.g. {'rx.received': 0.1, 'tx.queued': 0.1}; unlisted events are always logged
+EVENT_LOG_SAMPLING = {}
@@ -0,0 +1,17 @@
+"""
+ASGI deployment profile:
+
+    DJANGO_SETTINGS_MODULE=telecom_backend.settings_asgi \
+        uvicorn telecom_backend.asgi:application --workers 4 --timeout-keep-alive 30
+
+Device endpoints are served by async views (urls_asgi), so one worker can
+hold many slow device connections.
+"""
+from .settings import *  # noqa: F401,F403
+
+ROOT_URLCONF = 'telecom_backend.urls_asgi'
+ASGI_APPLICATION = 'telecom_backend.asgi.application'
+
+# Persistent connections are per thread and are not closed between async
+# requests; let each request open and close its own.
+DATABASES['default']['CONN_MAX_AGE'] = 0
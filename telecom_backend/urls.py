@@ -1,7 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from . import devices
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),  # mounts the app here
+    path(devices.PREFIX.lstrip('/'), include(devices.URLCONF)),  # lean ESP32 endpoints
 ]
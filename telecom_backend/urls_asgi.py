@@ -0,0 +1,9 @@
+from django.urls import path
+from api import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+# Async device endpoints first; everything else is served by the regular views
+urlpatterns = [
+    path('api/tx/pending/', async_views.tx_pending, name='tx_pending_async'),
+    path('api/rx/', async_views.rx_message, name='rx_message_async'),
+] + sync_urlpatterns
@@ -0,0 +1,84 @@
+"""
+Worker warm-up.
+
+Does the work the first requests to a fresh worker would otherwise pay for:
+compiling every URL pattern and importing the views and DRF classes they use
+("imports"), opening each database connection so it is reused under
+CONN_MAX_AGE ("database"), and filling the per-process device, search and
+recent-activity caches ("caches"). `run()` returns and logs how long each
+step took, at INFO on the telecom_backend logger (configured in settings).
+
+wsgi.py runs the import step, which gunicorn --preload (gunicorn.conf.py)
+shares across forked workers. The database and cache steps run in each
+worker after the fork, from the post_worker_init hook.
+"""
+import logging
+import time
+
+from django.apps import apps
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+WARM_DEVICES = 1000  # most recently updated devices put in the device cache
+
+
+def _walk(patterns):
+    for p in patterns:
+        yield p
+        if hasattr(p, "url_patterns"):
+            yield from _walk(p.url_patterns)
+
+
+def warm_imports():
+    from django.urls import get_resolver
+    from rest_framework.settings import api_settings
+
+    resolver = get_resolver()
+    resolver.reverse_dict  # builds the reverse lookup tables
+    for p in _walk(resolver.url_patterns):
+        p.pattern.regex  # compiled lazily on first match otherwise
+    # DRF imports these classes on first use
+    for name in ("DEFAULT_RENDERER_CLASSES", "DEFAULT_PARSER_CLASSES", "DEFAULT_AUTHENTICATION_CLASSES",
+                 "DEFAULT_PERMISSION_CLASSES", "DEFAULT_THROTTLE_CLASSES", "DEFAULT_CONTENT_NEGOTIATION_CLASS"):
+        getattr(api_settings, name)
+
+
+def warm_database():
+    for alias in connections:
+        connection = connections[alias]
+        connection.ensure_connection()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+
+def warm_caches():
+    from api import search
+    from api.models import MessageBody
+    search._has_index(MessageBody, "default")
+    if apps.is_installed("repeaters"):
+        from repeaters import auth, recent
+        from repeaters.models import MessageBody as RepeaterMessageBody
+        auth.warm_devices(WARM_DEVICES)
+        search._has_index(RepeaterMessageBody, "default")
+        recent.warm()  # loads the recent-activity buffer when enabled
+
+
+IMPORT_STEPS = (("imports", warm_imports),)
+WORKER_STEPS = (("database", warm_database), ("caches", warm_caches))
+
+
+def run(steps=IMPORT_STEPS + WORKER_STEPS):
+    """Run warm-up `steps` ((name, callable) pairs). Returns {name: milliseconds}."""
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            # a cold cache is not worth refusing to start over
+            logger.exception("warmup step %s failed", name)
+            continue
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("warmup %s: %.1f ms", name, timings[name])
+    return timings
@@ -2,3 +2,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'telecom_backend.settings')
 application = get_wsgi_application()
+
+# URL patterns, views and DRF classes; gunicorn --preload shares this with its workers
+from telecom_backend import warmup
+warmup.run(warmup.IMPORT_STEPS)